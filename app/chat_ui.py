@@ -1,6 +1,7 @@
 import streamlit as st
 import requests
 import uuid
+import json
 import os
 import sys, os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -12,6 +13,29 @@ settings = get_settings()
 
 API_URL = settings.API_URL
 
+
+def iter_sse(response):
+    """Yield (event, data) pairs from a server-sent events response."""
+    event, data = "message", []
+    for line in response.iter_lines(decode_unicode=True):
+        if line is None:
+            continue
+        if line == "":
+            if data:
+                yield event, json.loads("\n".join(data))
+            event, data = "message", []
+        elif line.startswith("event:"):
+            event = line[len("event:"):].strip()
+        elif line.startswith("data:"):
+            data.append(line[len("data:"):].strip())
+
+
+def fetch_messages(session_id, **params):
+    """Fetch one page of a session's history (see GET /messages/{session_id})."""
+    res = requests.get(f"{API_URL.replace('/chat', '')}/messages/{session_id}", params=params)
+    res.raise_for_status()
+    return res.json()
+
 st.set_page_config(page_title="📚 Library Desk Agent", page_icon="📖", layout="wide")
 st.markdown(
     """
@@ -31,6 +55,8 @@ if "session_id" not in st.session_state:
     st.session_state.session_id = str(uuid.uuid4())
 if "messages" not in st.session_state:
     st.session_state.messages = []
+if "older_cursor" not in st.session_state:
+    st.session_state.older_cursor = None
 
 # Sidebar – session control
 st.sidebar.header("🧠 Chat Sessions")
@@ -38,13 +64,16 @@ st.sidebar.header("🧠 Chat Sessions")
 if st.sidebar.button("🆕 New Session"):
     st.session_state.session_id = str(uuid.uuid4())
     st.session_state.messages = []
+    st.session_state.older_cursor = None
     st.sidebar.success("Started a new chat!")
 
 # Load sessions (optional: from DB API)
 try:
-    sessions = requests.get(f"{API_URL.replace('/chat', '')}/sessions").json()
+    # Only the most recently active sessions; served from the sessions table
+    sessions = requests.get(f"{API_URL.replace('/chat', '')}/sessions/").json()["sessions"]
     session_list = [
     f"{s['session_id']} — 🕒 {s['last_activity'].split('T')[1][:5]} on {s['last_activity'].split('T')[0]}"
+    + (f" · {s['title'][:40]}" if s.get("title") else "")
     for s in sessions
 ]
 except Exception:
@@ -57,12 +86,13 @@ if session_list:
 
     if st.sidebar.button("Load"):
         try:
-            logs = requests.get(f"{API_URL.replace('/chat', '')}/messages/{selected_id}").json()
-            # Ensure we only keep valid message dicts
-            messages = [m for m in logs if isinstance(m, dict) and "role" in m and "content" in m]
+            # Only the newest page; older messages are fetched on demand
+            page = fetch_messages(selected_id)
+            messages = page["messages"]
 
             st.session_state.session_id = selected_id
             st.session_state.messages = messages
+            st.session_state.older_cursor = page.get("prev_cursor")
 
             if messages:
                 st.sidebar.success("Session loaded successfully.")
@@ -81,6 +111,16 @@ st.caption("Your assistant for managing books, orders, and customers.")
 chat_container = st.container()
 
 with chat_container:
+    if st.session_state.older_cursor and st.button("⬆️ Load older messages"):
+        try:
+            page = fetch_messages(st.session_state.session_id, before=st.session_state.older_cursor)
+            st.session_state.messages = page["messages"] + st.session_state.messages
+            st.session_state.older_cursor = page.get("prev_cursor")
+        except Exception as e:
+            st.error(f"Failed to load older messages: {e}")
+        else:
+            st.rerun()
+
     for msg in st.session_state.messages:
         if not isinstance(msg, dict):
             continue
@@ -103,19 +143,41 @@ if user_query:
         "session_id": st.session_state.session_id
     }
 
-    with st.spinner("Thinking..."):
-        try:
-            res = requests.post(API_URL, json=payload)
-            res.raise_for_status()
-            data = res.json()
+    with st.chat_message("user"):
+        st.markdown(f"**🧑‍💻 You:** {user_query}", unsafe_allow_html=True)
 
-            response_text = data.get("summary") or data.get("response") or "No response."
-            if isinstance(response_text, dict):
-                response_text = str(response_text)
+    with st.chat_message("assistant"):
+        status = st.status("Thinking...", expanded=False)
+        answer_box = st.empty()
+        answer = ""
+        response_text = None
 
+        try:
+            with requests.post(f"{API_URL}/stream", json=payload, stream=True) as res:
+                res.raise_for_status()
+                for event, data in iter_sse(res):
+                    if event == "tool_start":
+                        status.update(label=f"Running {data.get('name')}...")
+                        status.write(f"🔧 `{data.get('name')}` ← {data.get('input')}")
+                    elif event == "tool_end":
+                        status.write(f"✅ {data.get('output')}")
+                    elif event == "token":
+                        answer += data.get("text", "")
+                        answer_box.markdown(f"**🤖 Assistant:** {answer}▌")
+                    elif event == "summary":
+                        response_text = data.get("summary")
+                        answer_box.markdown(f"**🤖 Assistant:** {response_text}")
+                    elif event == "error":
+                        response_text = f"⚠️ Error: {data.get('error')}"
+                    elif event == "done":
+                        break
+
+            status.update(label="Done", state="complete")
+            response_text = response_text or answer or "No response."
             st.session_state.messages.append({"role": "assistant", "content": response_text})
 
         except Exception as e:
+            status.update(label="Failed", state="error")
             st.session_state.messages.append(
                 {"role": "assistant", "content": f"⚠️ Error: {e}"}
             )
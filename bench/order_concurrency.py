@@ -0,0 +1,73 @@
+"""
+Fire many parallel orders at a single low-stock book and check for overselling.
+
+A throwaway customer and book are created, `--orders` threads each try to buy
+`--qty` copies through CreateOrderTool, and the script verifies that exactly
+stock // qty orders succeeded and that stock never went negative. Everything it
+created is deleted afterwards. Exits non-zero on failure.
+
+    python -m bench.order_concurrency --stock 5 --orders 50
+"""
+import argparse
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+import sys, os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import delete
+from server.db import SessionLocal
+from server.models import Book, Customer, Order, OrderItem
+from server.agent.tools.create_order_tool import CreateOrderTool
+
+
+def run(stock: int, orders: int, qty: int, workers: int) -> bool:
+    isbn = f"BENCH-{uuid.uuid4().hex[:12]}"
+    db = SessionLocal()
+    customer = Customer(name="Concurrency Bench", email=f"{isbn.lower()}@bench.invalid")
+    db.add_all([customer, Book(isbn=isbn, title="Concurrency Bench", author="Bench", price=1.0, stock=stock)])
+    db.commit()
+    customer_id = customer.id
+    db.close()
+
+    tool = CreateOrderTool()
+    started = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(
+                lambda _: tool._run(customer_id=customer_id, items=[{"isbn": isbn, "qty": qty}]),
+                range(orders),
+            ))
+        elapsed = time.perf_counter() - started
+
+        db = SessionLocal()
+        final_stock = db.get(Book, isbn).stock
+        db.close()
+
+        succeeded = sum(1 for r in results if "order_id" in r)
+        expected = min(stock // qty, orders)
+        ok = succeeded == expected and final_stock == stock - succeeded * qty and final_stock >= 0
+
+        print(f"{orders} orders × {qty} against stock {stock} in {elapsed:.2f}s")
+        print(f"succeeded={succeeded} expected={expected} final_stock={final_stock}")
+        print("OK" if ok else "FAILED: stock was oversold or orders were lost")
+        return ok
+    finally:
+        db = SessionLocal()
+        order_ids = [o.id for o in db.query(Order.id).filter(Order.customer_id == customer_id)]
+        db.execute(delete(OrderItem).where(OrderItem.order_id.in_(order_ids)))
+        db.execute(delete(Order).where(Order.customer_id == customer_id))
+        db.execute(delete(Book).where(Book.isbn == isbn))
+        db.execute(delete(Customer).where(Customer.id == customer_id))
+        db.commit()
+        db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--stock", type=int, default=5)
+    parser.add_argument("--orders", type=int, default=50)
+    parser.add_argument("--qty", type=int, default=1)
+    parser.add_argument("--workers", type=int, default=10)
+    args = parser.parse_args()
+    sys.exit(0 if run(args.stock, args.orders, args.qty, args.workers) else 1)
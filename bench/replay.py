@@ -0,0 +1,375 @@
+"""
+Replay a query corpus through the full agent pipeline with a scripted stand-in LLM.
+
+Every query of the corpus (bench/replay_corpus.json) carries the tool calls the
+model would make, turn by turn, and its final answer. A local chat model replays
+them after `--latency-ms`, so run_agent_query, the executor, the tools, the
+database and the audit log all do their real work without any network call.
+The local database is created, migrated and seeded on first use.
+
+Reported per request: p50/p95/p99 of agent build, history, each LLM call, each
+tool, logging and summary, plus the number of SQL statements sent to the
+database. Results are written as JSON; pass an earlier file to `--compare` to
+see what changed between two commits.
+
+Scenarios that restock, order or reprice write to the seeded data; the corpus
+keeps those changes balanced so repeated runs see the same catalog.
+
+    python -m bench.replay --mode tools --latency-ms 300 --repeat 5
+    python -m bench.replay --mode tools --compare bench/results/replay-abc1234.json
+"""
+import argparse
+import functools
+import json
+import subprocess
+import threading
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Any
+import sys, os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Deterministic pipeline: no fast path, no cached answers, no LLM summaries,
+# and audit log writes on the request path so their round-trips are counted
+os.environ.setdefault("ROUTER_ENABLED", "false")
+os.environ.setdefault("RESPONSE_CACHE_ENABLED", "false")
+os.environ.setdefault("SUMMARY_MODE", "template")
+os.environ.setdefault("LOG_WRITE_MODE", "sync")
+
+from langchain.callbacks.base import BaseCallbackHandler
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from sqlalchemy import event, func, select
+from server.db import Base, engine, SessionLocal
+from server.models import Book
+from server.migrations import run_migrations
+from server.agent import runner
+from server.agent.chains import library_agent
+from server.agent.registry import AgentRegistry
+from server.agent.memory import count_tokens
+from db.seed import seed_database
+
+CORPUS_PATH = "bench/replay_corpus.json"
+RESULTS_DIR = "bench/results"
+
+# Per-request stages, in pipeline order
+STAGES = ["agent_build", "history", "llm", "tools", "logging", "summary", "total"]
+
+
+# --- Scripted LLM ---
+
+class ScriptPlayer:
+    """Hands out the scripted turns of the query being replayed, one per LLM call."""
+
+    def __init__(self):
+        self._turns = []
+        self._answer = ""
+
+    def load(self, scenario: dict, mode: str):
+        turns = scenario.get("turns", [])
+        if mode == "react":
+            # The ReAct loop takes one action per model turn
+            turns = [[call] for turn in turns for call in turn]
+        self._turns = list(turns)
+        self._answer = scenario["answer"]
+
+    def next_message(self, mode: str) -> AIMessage:
+        if not self._turns:
+            if mode == "react":
+                return AIMessage(content=f"Thought: I now know the final answer\nFinal Answer: {self._answer}")
+            return AIMessage(content=self._answer)
+
+        turn = self._turns.pop(0)
+        if mode == "react":
+            call = turn[0]
+            return AIMessage(content=(
+                f"Thought: I should use {call['tool']}.\n"
+                f"Action: {call['tool']}\n"
+                f"Action Input: {json.dumps(call['args'])}"
+            ))
+        return AIMessage(content="", tool_calls=[
+            {"name": call["tool"], "args": call["args"], "id": f"call_{uuid.uuid4().hex[:12]}"}
+            for call in turn
+        ])
+
+
+class ScriptedChatModel(BaseChatModel):
+    """Chat model stand-in that sleeps `latency_ms` and returns the next scripted turn."""
+
+    mode: str = "react"
+    latency_ms: float = 0.0
+    script: Any = None
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted"
+
+    def bind_tools(self, tools, **kwargs):
+        # The script already names the tools; there is no schema to send anywhere
+        return self
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        time.sleep(self.latency_ms / 1000)
+        message = self.script.next_message(self.mode)
+        # Token counts as the real model would report them, for the stats it feeds
+        input_tokens = sum(count_tokens(str(m.content)) for m in messages)
+        output_tokens = count_tokens(message.content) + count_tokens(json.dumps(message.tool_calls))
+        message.usage_metadata = {
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "total_tokens": input_tokens + output_tokens,
+        }
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+# --- Measurement ---
+
+class RequestStats:
+    """Stage timings (ms) and SQL round-trips of one replayed request."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stages = defaultdict(float)
+        self.calls = defaultdict(list)  # "llm_call" / "tool:<name>" -> ms of each call
+        self.round_trips = 0
+
+    def add(self, stage: str, ms: float, call: str = None):
+        with self._lock:
+            self.stages[stage] += ms
+            if call:
+                self.calls[call].append(ms)
+
+    def count_round_trip(self):
+        with self._lock:
+            self.round_trips += 1
+
+
+_current = RequestStats()
+
+
+def _elapsed_ms(started: float) -> float:
+    return (time.perf_counter() - started) * 1000
+
+
+class StageTimer(BaseCallbackHandler):
+    """Time every LLM call and tool call of a request by run id."""
+
+    def __init__(self):
+        self._started = {}
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        self._started[run_id] = ("llm_call", time.perf_counter())
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        self._stop(run_id, "llm")
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._stop(run_id, "llm")
+
+    def on_tool_start(self, serialized, input_str, *, run_id, **kwargs):
+        self._started[run_id] = (f"tool:{serialized.get('name', 'unknown')}", time.perf_counter())
+
+    def on_tool_end(self, output, *, run_id, **kwargs):
+        self._stop(run_id, "tools")
+
+    def on_tool_error(self, error, *, run_id, **kwargs):
+        self._stop(run_id, "tools")
+
+    def _stop(self, run_id, stage: str):
+        call, started = self._started.pop(run_id, (None, None))
+        if started is not None:
+            _current.add(stage, _elapsed_ms(started), call)
+
+
+def _instrument(module, name: str, stage: str):
+    """Wrap `module.name` so the time spent in it is added to `stage`."""
+    original = getattr(module, name)
+
+    @functools.wraps(original)
+    def timed(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return original(*args, **kwargs)
+        finally:
+            _current.add(stage, _elapsed_ms(started))
+
+    setattr(module, name, timed)
+
+
+def _count_round_trip(conn, cursor, statement, parameters, context, executemany):
+    _current.count_round_trip()
+
+
+def _percentiles(samples) -> dict:
+    if not samples:
+        return {"count": 0}
+    ordered = sorted(samples)
+
+    def rank(p):
+        return round(ordered[min(max(int(len(ordered) * p + 0.5) - 1, 0), len(ordered) - 1)], 2)
+
+    return {
+        "count": len(ordered),
+        "mean": round(sum(ordered) / len(ordered), 2),
+        "p50": rank(0.50),
+        "p95": rank(0.95),
+        "p99": rank(0.99),
+        "max": round(ordered[-1], 2),
+    }
+
+
+# --- Replay ---
+
+def prepare_database():
+    """Create, migrate and (if the catalog is empty) seed the local database."""
+    Base.metadata.create_all(bind=engine)
+    run_migrations()
+    db = SessionLocal()
+    try:
+        empty = db.execute(select(func.count()).select_from(Book)).scalar_one() == 0
+    finally:
+        db.close()
+    if empty:
+        seed_database()
+
+
+def _commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def run(corpus_path: str, mode: str, latency_ms: float, repeat: int, cold: bool) -> dict:
+    global _current
+    with open(corpus_path, "r", encoding="utf-8") as f:
+        corpus = json.load(f)
+
+    prepare_database()
+
+    player = ScriptPlayer()
+    model = ScriptedChatModel(mode=mode, latency_ms=latency_ms, script=player)
+    # Same builder and registry as production, with the scripted model in place of OpenAI
+    library_agent.agent_registry = AgentRegistry(functools.partial(library_agent.build_library_agent, llm=model))
+
+    _instrument(runner, "get_library_agent", "agent_build")
+    _instrument(runner, "load_history", "history")
+    _instrument(runner, "log_message", "logging")
+    _instrument(runner, "log_tool_call", "logging")
+    _instrument(runner, "local_summary", "summary")
+    _instrument(runner, "llm_summary", "summary")
+    event.listen(engine, "before_cursor_execute", _count_round_trip)
+
+    requests, errors = [], 0
+    try:
+        for _ in range(repeat):
+            for scenario in corpus:
+                if cold:
+                    library_agent.agent_registry.invalidate()
+                player.load(scenario, mode)
+                _current = RequestStats()
+
+                started = time.perf_counter()
+                result = runner.run_agent_query(
+                    scenario["query"], session_id=f"replay-{uuid.uuid4()}", callbacks=[StageTimer()]
+                )
+                _current.add("total", _elapsed_ms(started))
+
+                if "error" in result:
+                    errors += 1
+                    print(f"[ERROR] {scenario['query']!r}: {result['error']}")
+                requests.append((scenario["query"], _current))
+    finally:
+        event.remove(engine, "before_cursor_execute", _count_round_trip)
+
+    calls = defaultdict(list)
+    for _query, stats in requests:
+        for name, samples in stats.calls.items():
+            calls[name].extend(samples)
+
+    return {
+        "commit": _commit(),
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "config": {
+            "corpus": corpus_path,
+            "mode": mode,
+            "latency_ms": latency_ms,
+            "repeat": repeat,
+            "cold": cold,
+            "log_write_mode": os.environ["LOG_WRITE_MODE"],
+        },
+        "requests": len(requests),
+        "errors": errors,
+        "stages_ms": {s: _percentiles([stats.stages.get(s, 0.0) for _, stats in requests]) for s in STAGES},
+        "calls_ms": {name: _percentiles(samples) for name, samples in sorted(calls.items())},
+        "db_round_trips": _percentiles([stats.round_trips for _, stats in requests]),
+        "queries": [
+            {
+                "query": query,
+                "total_ms": round(stats.stages["total"], 2),
+                "llm_calls": len(stats.calls.get("llm_call", [])),
+                "db_round_trips": stats.round_trips,
+            }
+            for query, stats in requests
+        ],
+    }
+
+
+def _print_table(title: str, rows: dict):
+    print(f"\n{title:<28} {'n':>5} {'p50':>9} {'p95':>9} {'p99':>9}")
+    for name, p in rows.items():
+        if p["count"]:
+            print(f"{name:<28} {p['count']:>5} {p['p50']:>9.2f} {p['p95']:>9.2f} {p['p99']:>9.2f}")
+
+
+def _print_comparison(previous: dict, current: dict):
+    print(f"\nvs {previous['commit']} ({previous['config']['mode']}, {previous['config']['latency_ms']} ms LLM)")
+    print(f"{'':<28} {'p50 before':>11} {'after':>9} {'p95 before':>11} {'after':>9}")
+    sections = [("stages_ms", current["stages_ms"]), ("calls_ms", current["calls_ms"])]
+    rows = [(name, section, p) for section, values in sections for name, p in values.items()]
+    rows.append(("db_round_trips", None, current["db_round_trips"]))
+    for name, section, p in rows:
+        old = previous.get(section, {}).get(name) if section else previous.get("db_round_trips")
+        if not old or not old.get("count") or not p.get("count"):
+            continue
+        change = (p["p50"] - old["p50"]) / old["p50"] * 100 if old["p50"] else 0.0
+        print(
+            f"{name:<28} {old['p50']:>11.2f} {p['p50']:>9.2f} "
+            f"{old['p95']:>11.2f} {p['p95']:>9.2f}  ({change:+.1f}% p50)"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--corpus", default=CORPUS_PATH)
+    parser.add_argument("--mode", choices=library_agent.AGENT_MODES, default="tools")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Simulated time per LLM call")
+    parser.add_argument("--repeat", type=int, default=3, help="Passes over the corpus")
+    parser.add_argument("--cold", action="store_true", help="Rebuild the agent before every request")
+    parser.add_argument("--out", help=f"Results file (default {RESULTS_DIR}/replay-<commit>-<mode>.json)")
+    parser.add_argument("--compare", help="Earlier results file to compare against")
+    args = parser.parse_args()
+
+    # The runner reads the agent mode from settings at request time
+    os.environ["AGENT_MODE"] = args.mode
+    results = run(args.corpus, args.mode, args.latency_ms, args.repeat, args.cold)
+
+    _print_table("stage (ms per request)", results["stages_ms"])
+    _print_table("call (ms per call)", results["calls_ms"])
+    _print_table("db round-trips per request", {"statements": results["db_round_trips"]})
+    print(f"\n{results['requests']} requests, {results['errors']} errors")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            _print_comparison(json.load(f), results)
+
+    out = args.out or os.path.join(RESULTS_DIR, f"replay-{results['commit']}-{args.mode}.json")
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2, ensure_ascii=False)
+    print(f"Results written to {out}")
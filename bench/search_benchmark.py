@@ -0,0 +1,97 @@
+"""
+Measure find_books query latency against catalog size.
+
+Synthetic books are inserted inside a single transaction that is rolled back
+at the end, so the benchmark never changes the real catalog. For each size it
+times the indexed, ranked search next to the old unindexed `lower(col) ILIKE`
+filter.
+
+    python -m bench.search_benchmark --sizes 1000 10000 100000 300000
+"""
+import argparse
+import statistics
+import time
+import sys, os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text, func, select
+from sqlalchemy.orm import Session
+from server.db import engine
+from server.models import Book
+from server.migrations import run_migrations
+from server.services.search import build_search_query
+
+WORDS = [
+    "clean", "code", "dragon", "garden", "silent", "river", "empire", "shadow", "café",
+    "crème", "night", "journey", "pattern", "design", "ocean", "winter", "glass", "city",
+    "forgotten", "house", "machine", "learning", "history", "moon", "secret", "war",
+]
+AUTHORS = ["Martin", "Orwell", "Tolkien", "García Márquez", "Brontë", "Dostoyevsky", "Le Guin", "Knuth"]
+
+QUERIES = [("dragon", "title"), ("creme", "title"), ("orwell", "author"), ("marquez", "author"), ("code", "any")]
+
+INSERT_SQL = text("""
+    INSERT INTO books (isbn, title, author, price, stock)
+    SELECT
+        'BENCH-' || g,
+        initcap((:words)[1 + (g * 7) % cardinality(:words)] || ' ' ||
+                (:words)[1 + (g * 13) % cardinality(:words)] || ' ' ||
+                (:words)[1 + (g / 5) % cardinality(:words)]),
+        (:authors)[1 + (g * 3) % cardinality(:authors)],
+        5 + (g % 60),
+        g % 40
+    FROM generate_series(:start, :stop) AS g
+""")
+
+
+def _time(session, stmt, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        session.execute(stmt).all()
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return statistics.median(samples), samples[max(int(len(samples) * 0.95) - 1, 0)]
+
+
+def _legacy_query(q, by):
+    if by == "author":
+        condition = func.lower(Book.author).ilike(f"%{q}%")
+    else:
+        condition = func.lower(Book.title).ilike(f"%{q}%")
+    return select(Book).where(condition)
+
+
+def run(sizes, repeat, limit):
+    run_migrations()
+    print(f"{'size':>9} {'query':>10} {'by':>7} {'ranked p50':>11} {'p95':>8} {'legacy p50':>11} {'p95':>8}")
+
+    with engine.connect() as conn:
+        trans = conn.begin()
+        session = Session(bind=conn)
+        try:
+            inserted = 0
+            for size in sorted(sizes):
+                conn.execute(INSERT_SQL, {"words": WORDS, "authors": AUTHORS, "start": inserted + 1, "stop": size})
+                inserted = size
+                conn.execute(text("ANALYZE books"))
+
+                for q, by in QUERIES:
+                    ranked = _time(session, build_search_query(q, by, limit), repeat)
+                    legacy = _time(session, _legacy_query(q, by), repeat)
+                    print(
+                        f"{size:>9} {q:>10} {by:>7} "
+                        f"{ranked[0]:>9.2f}ms {ranked[1]:>6.2f}ms {legacy[0]:>9.2f}ms {legacy[1]:>6.2f}ms"
+                    )
+        finally:
+            session.close()
+            trans.rollback()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--limit", type=int, default=10)
+    args = parser.parse_args()
+    run(args.sizes, args.repeat, args.limit)
@@ -0,0 +1,260 @@
+"""
+Stream a book catalog (JSON, NDJSON or CSV, optionally gzipped) into the books table.
+
+Records are read one at a time, so file size does not matter. Each batch is
+COPY'd into a temporary staging table and merged with one
+INSERT ... ON CONFLICT (isbn) statement. Loading is therefore idempotent:
+re-running a file changes nothing, and a newer feed updates title, author and
+price in place. Stock is only set for new titles unless --update-stock is
+given. Rows without an ISBN, title, author or valid price are counted as
+rejected and skipped.
+
+    python -m db.load_catalog feed.ndjson
+    python -m db.load_catalog publisher.csv.gz --batch-size 50000 --update-stock
+    python -m db.load_catalog catalog.json --on-conflict skip
+"""
+import argparse
+import csv
+import gzip
+import io
+import json
+import math
+import re
+import time
+import sys, os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from server.db import maintenance_engine
+
+DEFAULT_BATCH_SIZE = 10000
+READ_CHUNK = 1 << 20
+FORMATS = ("json", "ndjson", "csv")
+
+_STAGE_TABLE = """
+    CREATE TEMP TABLE IF NOT EXISTS books_stage (
+        n bigint, isbn text, title text, author text, price double precision, stock integer
+    ) ON COMMIT DELETE ROWS
+"""
+
+# Later rows of a batch win over earlier ones with the same ISBN; unchanged
+# books are not rewritten, so re-loading a file produces no dead tuples
+_MERGE = """
+    WITH merged AS (
+        INSERT INTO books (isbn, title, author, price, stock)
+        SELECT DISTINCT ON (isbn) isbn, title, author, price, coalesce(stock, 0)
+        FROM books_stage
+        ORDER BY isbn, n DESC
+        {on_conflict}
+        RETURNING (xmax = 0) AS inserted
+    )
+    SELECT count(*) FILTER (WHERE inserted), count(*) FILTER (WHERE NOT inserted) FROM merged
+"""
+
+_UPDATE = """
+    ON CONFLICT (isbn) DO UPDATE
+    SET title = EXCLUDED.title, author = EXCLUDED.author, price = EXCLUDED.price{stock_set}
+    WHERE (books.title, books.author, books.price{stock_old})
+        IS DISTINCT FROM (EXCLUDED.title, EXCLUDED.author, EXCLUDED.price{stock_new})
+"""
+
+
+# --- Reading ---
+
+def _open(path: str):
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8", newline="")
+    return open(path, "r", encoding="utf-8", newline="")
+
+
+def detect_format(path: str) -> str:
+    name = path[:-3] if path.endswith(".gz") else path
+    ext = os.path.splitext(name)[1].lower().lstrip(".")
+    if ext in ("jsonl", "ndjson"):
+        return "ndjson"
+    if ext in FORMATS:
+        return ext
+    raise ValueError(f"Cannot tell the format of {path}; pass --format")
+
+
+def _iter_ndjson(f):
+    for line in f:
+        line = line.strip()
+        if line:
+            yield json.loads(line)
+
+
+def _iter_json(f):
+    """
+    Yield the books of a JSON document without loading a top-level array whole.
+
+    A top-level array is decoded element by element from fixed-size chunks. An
+    object (like db/seed_data.json) is small by nature and read whole; its
+    "books" list is used.
+    """
+    decoder = json.JSONDecoder()
+    buf = f.read(READ_CHUNK).lstrip()
+    if buf.startswith("{"):
+        yield from json.loads(buf + f.read()).get("books", [])
+        return
+    if not buf.startswith("["):
+        raise ValueError("Expected a JSON array of books or an object with a 'books' list")
+
+    pos = 1
+    while True:
+        # Skip separators, refilling the buffer when it runs dry
+        while True:
+            while pos < len(buf) and buf[pos] in " \t\r\n,":
+                pos += 1
+            if pos < len(buf):
+                break
+            chunk = f.read(READ_CHUNK)
+            if not chunk:
+                raise ValueError("Unterminated JSON array")
+            buf, pos = chunk, 0
+
+        if buf[pos] == "]":
+            return
+        try:
+            record, end = decoder.raw_decode(buf, pos)
+        except json.JSONDecodeError:
+            chunk = f.read(READ_CHUNK)
+            if not chunk:
+                raise
+            buf, pos = buf[pos:] + chunk, 0
+            continue
+        yield record
+        pos = end
+        if pos > READ_CHUNK:
+            buf, pos = buf[pos:], 0
+
+
+def iter_records(path: str, fmt: str = None):
+    """Yield one dict per catalog record of `path`."""
+    fmt = fmt or detect_format(path)
+    with _open(path) as f:
+        if fmt == "csv":
+            yield from csv.DictReader(f)
+        elif fmt == "ndjson":
+            yield from _iter_ndjson(f)
+        else:
+            yield from _iter_json(f)
+
+
+def normalize_book(record: dict):
+    """(isbn, title, author, price, stock) ready for COPY, or None if the record is unusable."""
+    if not isinstance(record, dict):
+        return None
+    isbn = re.sub(r"[-\s]", "", str(record.get("isbn") or "")).upper()
+    title = str(record.get("title") or "").strip()
+    author = str(record.get("author") or "").strip()
+    try:
+        price = float(record.get("price"))
+    except (TypeError, ValueError):
+        return None
+    stock = record.get("stock")
+    try:
+        stock = int(stock) if stock not in (None, "") else None
+    except (TypeError, ValueError):
+        stock = None
+    if not isbn or not title or not author or not math.isfinite(price) or price < 0:
+        return None
+    return isbn, title, author, price, stock
+
+
+# --- Loading ---
+
+def _merge_sql(on_conflict: str, update_stock: bool) -> str:
+    if on_conflict == "skip":
+        clause = "ON CONFLICT (isbn) DO NOTHING"
+    else:
+        clause = _UPDATE.format(
+            stock_set=", stock = EXCLUDED.stock" if update_stock else "",
+            stock_old=", books.stock" if update_stock else "",
+            stock_new=", EXCLUDED.stock" if update_stock else "",
+        )
+    return _MERGE.format(on_conflict=clause)
+
+
+def _copy_batch(cursor, batch):
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    for n, (isbn, title, author, price, stock) in batch:
+        # An empty unquoted CSV field is NULL to COPY
+        writer.writerow((n, isbn, title, author, repr(price), "" if stock is None else stock))
+    buf.seek(0)
+    cursor.copy_expert("COPY books_stage (n, isbn, title, author, price, stock) FROM STDIN WITH (FORMAT csv)", buf)
+
+
+def load_books(records, batch_size: int = DEFAULT_BATCH_SIZE, on_conflict: str = "update",
+               update_stock: bool = False, progress=print) -> dict:
+    """
+    Upsert catalog `records` (any iterable of dicts) into books, one committed batch at a time.
+
+    Returns read/inserted/updated/rejected counts, elapsed seconds and rows per
+    second. `progress` is called with a status line after every batch.
+    """
+    merge = _merge_sql(on_conflict, update_stock)
+    stats = {"read": 0, "inserted": 0, "updated": 0, "rejected": 0}
+    started = time.perf_counter()
+
+    raw = maintenance_engine.raw_connection()
+    try:
+        cursor = raw.cursor()
+        cursor.execute(_STAGE_TABLE)
+
+        def flush(batch):
+            _copy_batch(cursor, batch)
+            cursor.execute(merge)
+            inserted, updated = cursor.fetchone()
+            raw.commit()  # also empties the staging table
+            stats["inserted"] += inserted
+            stats["updated"] += updated
+            if progress:
+                rate = stats["read"] / max(time.perf_counter() - started, 1e-9)
+                progress(f"{stats['read']:>12,} read {stats['inserted']:>12,} new "
+                         f"{stats['updated']:>10,} updated {rate:>12,.0f} rows/s")
+
+        batch = []
+        for record in records:
+            stats["read"] += 1
+            book = normalize_book(record)
+            if book is None:
+                stats["rejected"] += 1
+                continue
+            batch.append((stats["read"], book))
+            if len(batch) >= batch_size:
+                flush(batch)
+                batch = []
+        if batch:
+            flush(batch)
+
+        # Fresh statistics for the planner after a large load
+        cursor.execute("ANALYZE books")
+        raw.commit()
+    except Exception:
+        raw.rollback()
+        raise
+    finally:
+        raw.close()
+
+    stats["seconds"] = round(time.perf_counter() - started, 3)
+    stats["rows_per_second"] = round(stats["read"] / stats["seconds"]) if stats["seconds"] else stats["read"]
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("path")
+    parser.add_argument("--format", choices=FORMATS, help="Default: from the file extension")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--on-conflict", choices=("update", "skip"), default="update",
+                        help="Existing ISBNs: update title/author/price, or leave them alone")
+    parser.add_argument("--update-stock", action="store_true", help="Also overwrite stock of existing books")
+    args = parser.parse_args()
+
+    result = load_books(iter_records(args.path, args.format), args.batch_size, args.on_conflict, args.update_stock)
+    print(
+        f"Loaded {args.path}: {result['read']:,} read, {result['inserted']:,} new, "
+        f"{result['updated']:,} updated, {result['rejected']:,} rejected "
+        f"in {result['seconds']}s ({result['rows_per_second']:,} rows/s)"
+    )
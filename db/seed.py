@@ -2,37 +2,48 @@ import json
 import sys, os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from server.db import SessionLocal
-from server.models import Book, Customer, Order, OrderItem
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+from server.db import engine
+from server.models import Customer, Order, OrderItem
+from db.load_catalog import load_books
 
-def seed_database():
-    db = SessionLocal()
-    with open("db/seed_data.json", "r") as f:
-        data = json.load(f)
-
-    # Seed Books
-    for b in data["books"]:
-        if not db.query(Book).filter_by(isbn=b["isbn"]).first():
-            db.add(Book(**b))
+SEED_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "seed_data.json")
 
-    # Seed Customers
-    for c in data["customers"]:
-        if not db.query(Customer).filter_by(email=c["email"]).first():
-            db.add(Customer(**c))
 
-    db.commit()
+def seed_database(path: str = SEED_PATH):
+    """
+    Load the sample data; safe to run any number of times.
 
-    # Seed Orders
-    for o in data["orders"]:
-        db.add(Order(**o))
-    db.commit()
+    Books go through the catalog loader (existing ISBNs are left alone),
+    customers are inserted unless their email exists, and the sample orders
+    are only added to an empty orders table so re-running never duplicates them.
+    """
+    with open(path, "r") as f:
+        data = json.load(f)
 
-    # Seed Order Items
-    for oi in data["order_items"]:
-        db.add(OrderItem(**oi))
-    db.commit()
+    # Seed Books
+    load_books(data["books"], on_conflict="skip", progress=None)
+
+    with engine.begin() as conn:
+        # Seed Customers
+        conn.execute(insert(Customer).values(data["customers"]).on_conflict_do_nothing(index_elements=["email"]))
+        emails = [c["email"] for c in data["customers"]]
+        ids = dict(conn.execute(select(Customer.email, Customer.id).where(Customer.email.in_(emails))).all())
+
+        # Seed Orders: customer_id / order_id in the file are 1-based positions in its lists
+        if conn.execute(select(Order.id).limit(1)).first() is None and data["orders"]:
+            order_ids = conn.execute(
+                insert(Order).returning(Order.id, sort_by_parameter_order=True),
+                [{"customer_id": ids[emails[o["customer_id"] - 1]]} for o in data["orders"]],
+            ).scalars().all()
+
+            # Seed Order Items
+            conn.execute(insert(OrderItem), [
+                {"order_id": order_ids[oi["order_id"] - 1], "isbn": oi["isbn"], "qty": oi["qty"]}
+                for oi in data["order_items"]
+            ])
 
-    db.close()
     print("Database seeded successfully!")
 
 if __name__ == "__main__":
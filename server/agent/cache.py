@@ -0,0 +1,221 @@
+import copy
+import re
+import threading
+import time
+from collections import OrderedDict
+from sqlalchemy import select
+from server.models import Book
+from server.config import get_settings
+from server.services.search import normalize_text
+
+_MISSING = object()
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries also expire after `ttl` seconds."""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        # Bumped on every invalidation so in-flight reads can't store stale values
+        self.generation = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is not _MISSING and entry[0] > time.monotonic():
+                self._data.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not _MISSING:
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value, generation=None):
+        """Store `value`, unless `generation` is given and an invalidation happened since."""
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock:
+            self.generation += 1
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self.generation += 1
+            self._data.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            }
+
+
+_settings = get_settings()
+# ISBN -> book snapshot dict
+book_cache = TTLCache(_settings.BOOK_CACHE_SIZE, _settings.BOOK_CACHE_TTL_SECONDS)
+# (q, by, limit, cursor) -> find_books result
+search_cache = TTLCache(_settings.SEARCH_CACHE_SIZE, _settings.BOOK_CACHE_TTL_SECONDS)
+# (normalized query, catalog version) -> agent response and summary
+response_cache = TTLCache(_settings.RESPONSE_CACHE_SIZE, _settings.RESPONSE_CACHE_TTL_SECONDS)
+
+# Tools whose results may be replayed from response_cache
+READ_ONLY_TOOLS = frozenset({"find_books", "inventory_summary", "order_status"})
+# Queries that lean on earlier turns ("restock that one", "same again") are never cached
+_REFERENTIAL = re.compile(r"\b(?:it|its|them|these|those|same|again|above|previous|(?:that|this|the last) (?:one|book|order))\b")
+
+# Bumped by every catalog or order write, so cached responses from before it are unreachable
+_catalog_version = 0
+_version_lock = threading.Lock()
+
+
+def catalog_version() -> int:
+    return _catalog_version
+
+
+def bump_catalog_version():
+    global _catalog_version
+    with _version_lock:
+        _catalog_version += 1
+
+
+def book_snapshot(book: Book) -> dict:
+    """Detached, plain copy of a Book row that is safe to share across threads."""
+    return {
+        "isbn": book.isbn,
+        "title": book.title,
+        "author": book.author,
+        "price": book.price,
+        "stock": book.stock,
+    }
+
+
+def book_cache_store(book: Book, generation: int) -> dict:
+    snapshot = book_snapshot(book)
+    book_cache.set(book.isbn, snapshot, generation)
+    return snapshot
+
+
+def get_books(db, isbns) -> dict:
+    """
+    Read-through lookup of several books: cached ones are returned directly and
+    the rest are fetched with a single query. Unknown ISBNs are left out.
+
+    Never use the returned stock for order decisions; lock the rows instead.
+    """
+    generation = book_cache.generation
+    found, missing = {}, []
+    for isbn in dict.fromkeys(isbns):
+        snapshot = book_cache.get(isbn)
+        if snapshot is None:
+            missing.append(isbn)
+        else:
+            found[isbn] = snapshot
+
+    if missing:
+        for book in db.execute(select(Book).where(Book.isbn.in_(missing))).scalars():
+            found[book.isbn] = book_cache_store(book, generation)
+    return found
+
+
+async def aget_books(db, isbns) -> dict:
+    """Async variant of get_books."""
+    generation = book_cache.generation
+    found, missing = {}, []
+    for isbn in dict.fromkeys(isbns):
+        snapshot = book_cache.get(isbn)
+        if snapshot is None:
+            missing.append(isbn)
+        else:
+            found[isbn] = snapshot
+
+    if missing:
+        for book in (await db.execute(select(Book).where(Book.isbn.in_(missing)))).scalars():
+            found[book.isbn] = book_cache_store(book, generation)
+    return found
+
+
+def cached_search(key):
+    """Return (result or None, generation); pass the generation to store_search."""
+    generation = (search_cache.generation, book_cache.generation)
+    result = search_cache.get(key)
+    return (copy.deepcopy(result) if result is not None else None), generation
+
+
+def store_search(key, result, generation):
+    """Cache a find_books result and warm the book cache with its rows."""
+    search_generation, book_generation = generation
+    search_cache.set(key, copy.deepcopy(result), search_generation)
+    for book in result.get("results", []):
+        book_cache.set(book["isbn"], dict(book), book_generation)
+
+
+def invalidate_books(isbns):
+    """Forget the given books after a write; any search page may include them."""
+    for isbn in isbns:
+        book_cache.pop(isbn)
+    search_cache.clear()
+    bump_catalog_version()
+
+
+def invalidate_all_books():
+    """Forget everything, e.g. after a set-based update touching unknown ISBNs."""
+    book_cache.clear()
+    search_cache.clear()
+    bump_catalog_version()
+
+
+def response_key(query: str, has_history: bool = False):
+    """
+    Cache key for an agent response, or None when the query must not be cached.
+
+    The agent reads the session's chat history, so an answer given with any
+    history ("what about cheaper ones?") is neither cached nor served from cache.
+    """
+    normalized = re.sub(r"\s+", " ", normalize_text(query)).strip(" .!?")
+    if has_history or not normalized or _REFERENTIAL.search(normalized):
+        return None
+    # Read the version before the run: a write during the run makes this key stale
+    return normalized, catalog_version()
+
+
+def cached_response(key):
+    result = response_cache.get(key)
+    return copy.deepcopy(result) if result is not None else None
+
+
+def store_response(key, result: dict, tools_used):
+    """Cache {"response", "summary"} of a run if it only used read-only tools."""
+    tools_used = set(tools_used)
+    if not tools_used or not tools_used <= READ_ONLY_TOOLS:
+        return
+    response = result.get("response")
+    if isinstance(response, dict) and "error" in response:
+        return
+    response_cache.set(key, copy.deepcopy(result))
+
+
+def cache_stats() -> dict:
+    return {
+        "books": book_cache.stats(),
+        "search": search_cache.stats(),
+        "responses": {**response_cache.stats(), "catalog_version": catalog_version()},
+    }
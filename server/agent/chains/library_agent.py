@@ -1,42 +1,58 @@
-from langchain.agents import AgentExecutor, create_react_agent
+from langchain.agents import AgentExecutor, create_react_agent, create_tool_calling_agent
 from langchain.prompts import PromptTemplate
+from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_openai import ChatOpenAI
 from server.agent.tools.find_books_tool import FindBooksTool
 from server.agent.tools.restock_book_tool import RestockBookTool
+from server.agent.tools.bulk_restock_tool import BulkRestockTool
 from server.agent.tools.create_order_tool import CreateOrderTool
 from server.agent.tools.order_status_tool import OrderStatusTool
 from server.agent.tools.update_price_tool import UpdatePriceTool
+from server.agent.tools.bulk_update_price_tool import BulkUpdatePriceTool
 from server.agent.tools.inventory_summary_tool import InventorySummaryTool
+from server.agent.chains.parallel_executor import ParallelAgentExecutor
+from server.agent.registry import AgentRegistry, PROMPT_PATH
 from server.config import get_settings
 
 
 def load_system_prompt() -> str:
     """Load system prompt text safely."""
     try:
-        with open("prompts/system_prompt.txt", "r", encoding="utf-8") as f:
+        with open(PROMPT_PATH, "r", encoding="utf-8") as f:
             return f.read().strip()
     except FileNotFoundError:
         return "You are a helpful AI Library Assistant that manages books, customers, and orders."
 
 
-def build_library_agent(verbose: bool = True):
-    settings = get_settings()
+AGENT_MODES = ("react", "tools")
+
+TOOL_CALLING_SYSTEM = """You are the Library Desk Agent: you manage books, customers and orders
+by calling the tools you are given.
+
+- Confirm ISBNs with find_books when the user names a title instead of an ISBN.
+- When several lookups or actions do not depend on each other, call all of
+  those tools in the same turn; they run in parallel.
+- Use bulk_restock / bulk_update_price for many books instead of repeated single calls.
+- Answer briefly once you have what you need.
+
+Conversation so far (use it to resolve follow-ups like "that one" without searching again):
+{chat_history}"""
 
-    llm = ChatOpenAI(
-        model="gpt-4-turbo",
-        temperature=0,
-        openai_api_key=settings.OPENAI_API_KEY,
-    )
 
-    tools = [
+def build_tools():
+    return [
         FindBooksTool(),
         RestockBookTool(),
+        BulkRestockTool(),
         CreateOrderTool(),
         OrderStatusTool(),
         UpdatePriceTool(),
+        BulkUpdatePriceTool(),
         InventorySummaryTool(),
     ]
 
+
+def _build_react_agent(llm, tools, verbose: bool):
     # --- ✅ Manual ReAct-compatible prompt template ---
     react_template = """Answer the following questions as best you can.
     You have access to the following tools:
@@ -56,12 +72,15 @@ def build_library_agent(verbose: bool = True):
 
     Begin!
 
+    Conversation so far (use it to resolve follow-ups like "that one" without searching again):
+    {chat_history}
+
     Question: {input}
     {agent_scratchpad}
     """
 
     prompt = PromptTemplate(
-        input_variables=["input", "tools", "tool_names", "agent_scratchpad"],
+        input_variables=["input", "chat_history", "tools", "tool_names", "agent_scratchpad"],
         template=react_template,
     )
 
@@ -74,6 +93,54 @@ def build_library_agent(verbose: bool = True):
         tools=tools,
         verbose=verbose,
         handle_parsing_errors=True,
+        return_intermediate_steps=True,
         max_iterations=5,
         early_stopping_method="force",
     )
+
+
+def _build_tool_calling_agent(llm, tools, verbose: bool):
+    # Arguments arrive as JSON validated against each tool's args_schema: no text parsing
+    prompt = ChatPromptTemplate.from_messages([
+        ("system", TOOL_CALLING_SYSTEM),
+        ("human", "{input}"),
+        MessagesPlaceholder("agent_scratchpad"),
+    ])
+    agent = create_tool_calling_agent(llm, tools, prompt)
+
+    return ParallelAgentExecutor.from_agent_and_tools(
+        agent=agent,
+        tools=tools,
+        verbose=verbose,
+        return_intermediate_steps=True,
+        max_iterations=5,
+        early_stopping_method="force",
+    )
+
+
+def build_library_agent(verbose: bool = True, streaming: bool = False, mode: str = "react", llm=None):
+    """
+    Build the agent: "react" (text ReAct loop) or "tools" (structured, parallel tool calls).
+
+    `llm` replaces the OpenAI chat model, e.g. with the scripted model of bench/replay.py.
+    """
+    if llm is None:
+        llm = ChatOpenAI(
+            model="gpt-4-turbo",
+            temperature=0,
+            openai_api_key=get_settings().OPENAI_API_KEY,
+            streaming=streaming,
+        )
+
+    if mode == "tools":
+        return _build_tool_calling_agent(llm, build_tools(), verbose)
+    return _build_react_agent(llm, build_tools(), verbose)
+
+
+# Shared across all requests; rebuilt only when .env changes
+agent_registry = AgentRegistry(build_library_agent)
+
+
+def get_library_agent(verbose: bool = True, streaming: bool = False, mode: str = "react"):
+    """Return the process-wide library agent for `mode`, building it on first use."""
+    return agent_registry.get(verbose=verbose, streaming=streaming, mode=mode)
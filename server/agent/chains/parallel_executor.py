@@ -0,0 +1,96 @@
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from langchain.agents import AgentExecutor
+from langchain.agents.agent import ExceptionTool
+from langchain_core.agents import AgentAction, AgentFinish, AgentStep
+from langchain_core.exceptions import OutputParserException
+from server.config import get_settings
+
+# Shared by all runs; a turn with N tool calls uses up to N of these threads
+_tool_executor = ThreadPoolExecutor(
+    max_workers=get_settings().AGENT_PARALLEL_TOOLS, thread_name_prefix="agent-tool"
+)
+
+
+class ParallelAgentExecutor(AgentExecutor):
+    """
+    AgentExecutor that runs the tool calls of one model turn concurrently.
+
+    The stock executor performs the actions of a multi-action turn one after
+    another in `_iter_next_step` (its async variant already gathers them).
+    Here every action of the turn is submitted to a thread pool and the steps
+    are yielded in the order the model emitted them. Each action runs in a copy
+    of the caller's context, so tools see the request session (one of them
+    uses it, the others open their own) and their spans nest under the trace.
+
+    `_iter_next_step` and `_parsing_error_step` follow the private
+    AgentExecutor code of the langchain version pinned in requirements.txt;
+    re-check them when upgrading it.
+    """
+
+    def _iter_next_step(self, name_to_tool_map, color_mapping, inputs, intermediate_steps, run_manager=None):
+        try:
+            output = self._action_agent.plan(
+                self._prepare_intermediate_steps(intermediate_steps),
+                callbacks=run_manager.get_child() if run_manager else None,
+                **inputs,
+            )
+        except OutputParserException as e:
+            # Rare with structured tool calls; answered without planning again
+            yield self._parsing_error_step(e, run_manager)
+            return
+
+        if isinstance(output, AgentFinish):
+            yield output
+            return
+
+        actions = [output] if isinstance(output, AgentAction) else list(output)
+        for action in actions:
+            yield action
+
+        if len(actions) == 1:
+            yield self._perform_agent_action(name_to_tool_map, color_mapping, actions[0], run_manager)
+            return
+
+        futures = [
+            _tool_executor.submit(
+                contextvars.copy_context().run,
+                self._perform_agent_action, name_to_tool_map, color_mapping, action, run_manager,
+            )
+            for action in actions
+        ]
+        for future in futures:
+            yield future.result()
+
+    def _parsing_error_step(self, error: OutputParserException, run_manager=None) -> AgentStep:
+        """The `_Exception` step the stock executor builds from `handle_parsing_errors`."""
+        if self.handle_parsing_errors is False:
+            raise ValueError(
+                "An output parsing error occurred. In order to pass this error back to the agent "
+                f"and have it try again, pass `handle_parsing_errors=True`. This is the error: {error}"
+            )
+        text = str(error)
+        if self.handle_parsing_errors is True:
+            if error.send_to_llm:
+                observation = str(error.observation)
+                text = str(error.llm_output)
+            else:
+                observation = "Invalid or incomplete response"
+        elif isinstance(self.handle_parsing_errors, str):
+            observation = self.handle_parsing_errors
+        elif callable(self.handle_parsing_errors):
+            observation = self.handle_parsing_errors(error)
+        else:
+            raise ValueError("Got unexpected type of `handle_parsing_errors`")
+
+        action = AgentAction("_Exception", observation, text)
+        if run_manager:
+            run_manager.on_agent_action(action, color="green")
+        observation = ExceptionTool().run(
+            action.tool_input,
+            verbose=self.verbose,
+            color=None,
+            callbacks=run_manager.get_child() if run_manager else None,
+            **self._action_agent.tool_run_logging_kwargs(),
+        )
+        return AgentStep(action=action, observation=observation)
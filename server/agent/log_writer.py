@@ -0,0 +1,151 @@
+import atexit
+import logging
+import queue
+import threading
+import time
+from sqlalchemy import insert
+from server.db import session_scope
+from server.config import get_settings
+from server.models.message import Message
+from server.services.sessions import session_rollup_statement
+
+_STOP = object()
+
+logger = logging.getLogger(__name__)
+
+
+class LogWriter:
+    """
+    Write-behind queue for audit rows (messages and tool calls).
+
+    Rows are queued by the request thread and inserted by a background thread
+    in multi-row INSERTs, either once `batch_size` rows are waiting or after
+    `flush_interval` seconds, whichever comes first. `submit` blocks when
+    `max_queue` rows are pending so a slow database pushes back on producers
+    instead of growing memory without bound.
+
+    In "sync" mode rows are written immediately in the caller's thread, which
+    keeps tests and scripts deterministic.
+
+    `rollups` maps a model to a function that turns that model's rows of a
+    batch into one extra statement (e.g. an upsert of summary rows), executed
+    in the same transaction as the insert.
+    """
+
+    def __init__(self, mode: str = "async", batch_size: int = 100,
+                 flush_interval: float = 0.2, max_queue: int = 10000, rollups: dict = None):
+        self.mode = mode
+        self.rollups = rollups or {}
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = None
+        self._lock = threading.Lock()
+        self.rows_written = 0
+        self.batches_written = 0
+
+    def submit(self, model, row: dict):
+        """Queue one row for `model`; blocks while the queue is full."""
+        if self.mode == "sync":
+            self._write([(model, row)])
+            return
+        self._ensure_started()
+        self._queue.put((model, row))
+
+    def _ensure_started(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._worker, name="log-writer", daemon=True)
+                self._thread.start()
+
+    def _worker(self):
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is _STOP:
+                self._queue.task_done()
+                break
+
+            batch = [item]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    self._queue.task_done()
+                    break
+                batch.append(item)
+
+            try:
+                self._write(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _write(self, batch):
+        # Group rows per model so each table gets one multi-row INSERT
+        grouped = {}
+        for model, row in batch:
+            grouped.setdefault(model, []).append(row)
+
+        # In sync mode this is the caller's request session, if it has one
+        with session_scope() as db:
+            try:
+                for model, rows in grouped.items():
+                    db.execute(insert(model), rows)
+                    rollup = self.rollups.get(model)
+                    stmt = rollup(rows) if rollup else None
+                    if stmt is not None:
+                        db.execute(stmt)
+                db.commit()
+                self.rows_written += len(batch)
+                self.batches_written += 1
+            except Exception as e:
+                db.rollback()
+                logger.error("Failed to write %d log rows: %s", len(batch), e)
+
+    def flush(self):
+        """Block until every queued row has been written."""
+        if self.mode != "sync" and self._thread is not None:
+            self._queue.join()
+
+    def close(self):
+        """Flush pending rows and stop the background thread."""
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._queue.join()
+            self._thread.join()
+        self._thread = None
+
+    def stats(self) -> dict:
+        return {
+            "mode": self.mode,
+            "pending": self._queue.qsize(),
+            "rows_written": self.rows_written,
+            "batches_written": self.batches_written,
+        }
+
+
+def _build_log_writer() -> LogWriter:
+    settings = get_settings()
+    return LogWriter(
+        mode=settings.LOG_WRITE_MODE,
+        batch_size=settings.LOG_BATCH_SIZE,
+        flush_interval=settings.LOG_FLUSH_INTERVAL_MS / 1000,
+        max_queue=settings.LOG_QUEUE_MAX,
+        # Keep the sessions table current as messages are written
+        rollups={Message: session_rollup_statement},
+    )
+
+
+log_writer = _build_log_writer()
+# Scripts that never run the FastAPI shutdown hook still get their rows written
+atexit.register(log_writer.close)
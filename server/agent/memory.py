@@ -0,0 +1,203 @@
+import logging
+import threading
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import List, Optional, Tuple
+import tiktoken
+from sqlalchemy import select, update, func
+from server.db import session_scope, async_session_scope
+from server.models.message import Message
+from server.models.chat_session import ChatSession
+from server.agent.summarizer import summary_clients
+
+# Rough per-message overhead of role labels and separators
+MESSAGE_OVERHEAD_TOKENS = 4
+# Upper bound on the older turns folded into the summary in one refresh
+SUMMARY_INPUT_TOKENS = 3000
+
+logger = logging.getLogger(__name__)
+
+_refreshing = set()
+_refreshing_lock = threading.Lock()
+
+
+@lru_cache(maxsize=1)
+def _encoding():
+    return tiktoken.encoding_for_model("gpt-4-turbo")
+
+
+def count_tokens(text: Optional[str]) -> int:
+    return len(_encoding().encode(text)) if text else 0
+
+
+def truncate_tokens(text: str, max_tokens: int) -> str:
+    tokens = _encoding().encode(text)
+    if len(tokens) <= max_tokens:
+        return text
+    return _encoding().decode(tokens[:max_tokens]) + " …"
+
+
+@dataclass
+class History:
+    """What the agent sees of a session before the current question."""
+    summary: Optional[str] = None
+    turns: List[Tuple[str, str]] = field(default_factory=list)  # (role, text), oldest first
+    # Newest message id that fell out of the window but is not in the summary yet
+    pending_until_id: Optional[int] = None
+    tokens: int = 0
+
+
+def _window_statement(session_id: str, summarized_until_id: Optional[int], max_messages: int):
+    """Newest messages after the summary, newest first (ix_messages_session_created_id)."""
+    stmt = select(Message.id, Message.role, Message.content).where(
+        Message.session_id == session_id,
+        Message.role.in_(("user", "assistant")),
+    )
+    if summarized_until_id:
+        stmt = stmt.where(Message.id > summarized_until_id)
+    return stmt.order_by(Message.created_at.desc(), Message.id.desc()).limit(max_messages)
+
+
+def pack_history(summary: Optional[str], rows, budget: int, message_tokens: int) -> History:
+    """
+    Keep the newest turns that fit in `budget` tokens next to the summary.
+
+    `rows` are newest first. Anything older than the last turn that fits is
+    left for the next summary refresh.
+    """
+    history = History(summary=summary, tokens=count_tokens(summary))
+    kept = []
+    for row in rows:
+        text = truncate_tokens(row.content, message_tokens)
+        cost = count_tokens(text) + MESSAGE_OVERHEAD_TOKENS
+        if history.tokens + cost > budget:
+            history.pending_until_id = row.id
+            break
+        kept.append((row.role, text))
+        history.tokens += cost
+    history.turns = list(reversed(kept))
+    return history
+
+
+def load_history(session_id: str, settings) -> History:
+    """Load the session's summary and newest turns within HISTORY_TOKEN_BUDGET."""
+    if settings.HISTORY_TOKEN_BUDGET <= 0:
+        return History()
+    with session_scope() as db:
+        session = db.get(ChatSession, session_id)
+        until = session.summarized_until_id if session else None
+        rows = db.execute(_window_statement(session_id, until, settings.HISTORY_MAX_MESSAGES)).all()
+        return pack_history(
+            session.summary if session else None, rows,
+            settings.HISTORY_TOKEN_BUDGET, settings.HISTORY_MESSAGE_MAX_TOKENS,
+        )
+
+
+async def aload_history(session_id: str, settings) -> History:
+    """Async variant of load_history."""
+    if settings.HISTORY_TOKEN_BUDGET <= 0:
+        return History()
+    async with async_session_scope() as db:
+        session = await db.get(ChatSession, session_id)
+        until = session.summarized_until_id if session else None
+        rows = (await db.execute(_window_statement(session_id, until, settings.HISTORY_MAX_MESSAGES))).all()
+        return pack_history(
+            session.summary if session else None, rows,
+            settings.HISTORY_TOKEN_BUDGET, settings.HISTORY_MESSAGE_MAX_TOKENS,
+        )
+
+
+def format_history(history: History) -> str:
+    """Render history as plain text for the ReAct prompt."""
+    lines = []
+    if history.summary:
+        lines.append(f"Summary of earlier conversation: {history.summary}")
+    for role, text in history.turns:
+        lines.append(f"{'User' if role == 'user' else 'Assistant'}: {text}")
+    return "\n".join(lines) or "(no previous messages)"
+
+
+def summarize_turns(previous: Optional[str], turns, max_tokens: int) -> str:
+    """Fold `turns` into the previous rolling summary with one short LLM call."""
+    transcript = "\n".join(f"{role}: {text}" for role, text in turns)
+    prompt = f"""
+    Current summary: {previous or "(none)"}
+
+    New conversation turns:
+    {transcript}
+
+    Update the summary so it keeps the facts needed for follow-up questions:
+    books, ISBNs, customers, order ids, quantities and prices mentioned, and
+    what the user was trying to do. Reply with the summary only.
+    """
+    completion = summary_clients.get().chat.completions.create(
+        model="gpt-4-turbo",
+        max_tokens=max_tokens,
+        messages=[
+            {"role": "system", "content": "You maintain a compact running summary of a library desk chat."},
+            {"role": "user", "content": prompt},
+        ],
+    )
+    return completion.choices[0].message.content.strip()
+
+
+def refresh_summary(session_id: str, until_id: int, settings):
+    """
+    Fold messages up to `until_id` that are not yet summarized into the session summary.
+
+    Only the turns since the previous refresh are sent to the LLM. The update is
+    conditional on the summary not having moved meanwhile, so concurrent
+    refreshes of one session cannot overwrite each other.
+    """
+    with _refreshing_lock:
+        if session_id in _refreshing:
+            return
+        _refreshing.add(session_id)
+
+    try:
+        with session_scope() as db:
+            session = db.get(ChatSession, session_id)
+            if session is None:
+                return
+            previous, since = session.summary, session.summarized_until_id or 0
+            if until_id <= since:
+                return
+
+            rows = db.execute(
+                select(Message.id, Message.role, Message.content)
+                .where(
+                    Message.session_id == session_id,
+                    Message.role.in_(("user", "assistant")),
+                    Message.id > since,
+                    Message.id <= until_id,
+                )
+                .order_by(Message.created_at.desc(), Message.id.desc())
+            ).all()
+
+        # Newest turns first until the input cap, then back to chronological order
+        turns, used = [], 0
+        for row in rows:
+            text = truncate_tokens(row.content, settings.HISTORY_MESSAGE_MAX_TOKENS)
+            used += count_tokens(text)
+            if used > SUMMARY_INPUT_TOKENS:
+                break
+            turns.append(("User" if row.role == "user" else "Assistant", text))
+        turns.reverse()
+
+        # No connection is held while the LLM call runs
+        summary = summarize_turns(previous, turns, settings.HISTORY_SUMMARY_MAX_TOKENS)
+        with session_scope() as db:
+            db.execute(
+                update(ChatSession)
+                .where(
+                    ChatSession.id == session_id,
+                    func.coalesce(ChatSession.summarized_until_id, 0) == since,
+                )
+                .values(summary=summary, summarized_until_id=until_id)
+            )
+            db.commit()
+    except Exception as e:
+        logger.error("Failed to refresh summary of session %s: %s", session_id, e)
+    finally:
+        with _refreshing_lock:
+            _refreshing.discard(session_id)
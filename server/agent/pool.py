@@ -0,0 +1,166 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from server.config import get_settings
+
+
+class PoolSaturated(Exception):
+    """Raised when both the worker pool and its wait queue are full."""
+
+    def __init__(self, retry_after: int):
+        super().__init__("Agent pool is saturated")
+        self.retry_after = retry_after
+
+
+class AgentPool:
+    """
+    Bounded thread pool for agent runs.
+
+    At most `max_workers` runs execute at once and at most `queue_size` more may
+    wait for a free worker. Anything beyond that is rejected immediately so the
+    caller can answer with 503 + Retry-After instead of piling up requests.
+    """
+
+    def __init__(self, max_workers: int, queue_size: int, retry_after: int):
+        self.max_workers = max_workers
+        self.queue_size = queue_size
+        self.retry_after = retry_after
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="agent")
+        # Concurrency limit for runs awaited directly on the event loop (AGENT_ASYNC)
+        self._slots = asyncio.Semaphore(max_workers)
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._queued = 0
+        self._completed = 0
+        self._rejected = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+
+    def _admit(self):
+        with self._lock:
+            if self._in_flight + self._queued >= self.max_workers + self.queue_size:
+                self._rejected += 1
+                raise PoolSaturated(self.retry_after)
+            self._queued += 1
+
+    def _started(self, submitted_at: float):
+        waited = time.monotonic() - submitted_at
+        with self._lock:
+            self._queued -= 1
+            self._in_flight += 1
+            self._total_wait += waited
+            self._max_wait = max(self._max_wait, waited)
+
+    def _abandoned(self):
+        """Give back the queue slot of a run that was cancelled before it started."""
+        with self._lock:
+            self._queued -= 1
+
+    def _finished(self):
+        with self._lock:
+            self._in_flight -= 1
+            self._completed += 1
+
+    def _claim(self, ticket: list) -> bool:
+        # Either the job starts or the cancellation releases its slot, never both
+        with self._lock:
+            if ticket[0]:
+                return False
+            ticket[0] = True
+            return True
+
+    def _wrap(self, fn, args, kwargs, submitted_at: float, ticket: list):
+        def job():
+            if not self._claim(ticket):
+                return None
+            self._started(submitted_at)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self._finished()
+        return job
+
+    def submit(self, fn, *args, **kwargs) -> asyncio.Future:
+        """Admit `fn` and schedule it, raising PoolSaturated right away if full."""
+        self._admit()
+        ticket = [False]
+        job = self._wrap(fn, args, kwargs, time.monotonic(), ticket)
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self._executor, job)
+
+        def release_if_cancelled(f):
+            # A caller that goes away (client disconnect, shutdown) cancels the
+            # future; a job that never started must not keep its queue slot
+            if f.cancelled() and self._claim(ticket):
+                self._abandoned()
+
+        future.add_done_callback(release_if_cancelled)
+        return future
+
+    async def run(self, fn, *args, **kwargs):
+        """Run `fn` on the pool without blocking the event loop."""
+        return await self.submit(fn, *args, **kwargs)
+
+    async def run_async(self, fn, *args, **kwargs):
+        """Await coroutine function `fn` on the event loop under the same limits."""
+        self._admit()
+        submitted_at = time.monotonic()
+        try:
+            await self._slots.acquire()
+        except BaseException:
+            # Cancelled while waiting for a slot
+            self._abandoned()
+            raise
+        try:
+            self._started(submitted_at)
+            try:
+                return await fn(*args, **kwargs)
+            finally:
+                self._finished()
+        finally:
+            self._slots.release()
+
+    def stats(self) -> dict:
+        with self._lock:
+            started = self._completed + self._in_flight
+            return {
+                "max_workers": self.max_workers,
+                "queue_size": self.queue_size,
+                "in_flight": self._in_flight,
+                "queued": self._queued,
+                "completed": self._completed,
+                "rejected": self._rejected,
+                "avg_wait_ms": round(self._total_wait / started * 1000, 2) if started else 0.0,
+                "max_wait_ms": round(self._max_wait * 1000, 2),
+            }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_agent_pool() -> AgentPool:
+    """Return the process-wide agent pool, creating it from settings on first use."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                settings = get_settings()
+                _pool = AgentPool(
+                    max_workers=settings.AGENT_MAX_WORKERS,
+                    queue_size=settings.AGENT_QUEUE_SIZE,
+                    retry_after=settings.AGENT_RETRY_AFTER_SECONDS,
+                )
+    return _pool
+
+
+def shutdown_agent_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown()
+            _pool = None
@@ -0,0 +1,70 @@
+import os
+import threading
+from server.config import get_settings
+
+PROMPT_PATH = "prompts/system_prompt.txt"
+ENV_PATH = ".env"
+
+
+def _mtime(path: str):
+    """Return the modification time of a file, or None if it does not exist."""
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+class AgentRegistry:
+    """
+    Process-wide cache of built agents.
+
+    Building an agent constructs the LLM client, every tool, the prompt template
+    and the executor, so it is done once per configuration and shared across
+    threads. Entries are rebuilt only when a watched file (by default `.env`)
+    changes on disk. The prompts are built into the agent code, so editing
+    prompts/system_prompt.txt does not trigger a rebuild. Per-request callbacks
+    are passed at invoke time, never here.
+    """
+
+    def __init__(self, builder, watched_paths=(ENV_PATH,)):
+        self._builder = builder
+        self._watched_paths = tuple(watched_paths)
+        self._lock = threading.Lock()
+        self._entries = {}  # key -> (fingerprint, agent)
+        self.builds = 0
+
+    def _fingerprint(self):
+        return tuple(_mtime(p) for p in self._watched_paths)
+
+    def get(self, **options):
+        key = tuple(sorted(options.items()))
+        fingerprint = self._fingerprint()
+
+        entry = self._entries.get(key)
+        if entry and entry[0] == fingerprint:
+            return entry[1]
+
+        with self._lock:
+            # Another thread may have rebuilt it while we waited for the lock
+            entry = self._entries.get(key)
+            if entry and entry[0] == fingerprint:
+                return entry[1]
+
+            agent = self._builder(**options)
+            self._entries[key] = (fingerprint, agent)
+            self.builds += 1
+            return agent
+
+    def invalidate(self):
+        """Drop every cached agent so the next call rebuilds it."""
+        with self._lock:
+            self._entries.clear()
+
+
+# Settings re-read only when .env changes, for per-request lookups
+settings_registry = AgentRegistry(get_settings, watched_paths=(ENV_PATH,))
+
+
+def current_settings():
+    """Return the current settings without re-parsing .env on every call."""
+    return settings_registry.get()
@@ -0,0 +1,112 @@
+import re
+import threading
+from dataclasses import dataclass
+from typing import Any, Optional
+from server.agent.tools.order_status_tool import OrderStatusTool
+from server.agent.tools.restock_book_tool import RestockBookTool
+from server.agent.tools.update_price_tool import UpdatePriceTool
+from server.agent.tools.inventory_summary_tool import InventorySummaryTool
+
+# An ISBN-10/13 as users type it: optional "ISBN" prefix, digits with dashes or spaces
+ISBN = r"(?:isbn[:\s]*)?(?P<isbn>(?:97[89][-\s]?)?\d(?:[-\s]?\d){8}[-\s]?[\dxX])"
+QTY = r"(?P<qty>\d{1,6})"
+PRICE = r"\$?(?P<price>\d{1,6}(?:\.\d{1,2})?)"
+
+
+def _command(pattern: str):
+    """Compile a rule that must match the whole query, allowing polite filler around it."""
+    return re.compile(
+        rf"^\s*(?:please\s+)?(?:can you\s+|could you\s+)?{pattern}(?:\s+please)?\s*[.!?]*\s*$",
+        re.IGNORECASE,
+    )
+
+
+def _isbn(m) -> str:
+    return re.sub(r"[-\s]", "", m.group("isbn")).upper()
+
+
+def _threshold(m) -> int:
+    # "under 3" / "below 3" mean stock < 3; the tool's threshold is inclusive
+    if not m.group("n"):
+        return 5
+    n = int(m.group("n"))
+    return n if m.group("op") in ("<=", "at most") else n - 1
+
+
+@dataclass
+class Route:
+    name: str
+    tool: Any
+    tool_input: Any
+
+
+# (route name, tool, patterns, build tool input from the match)
+RULES = [
+    ("order_status", OrderStatusTool(), [
+        _command(r"(?:order\s+status|(?:what(?:'s|\s+is)\s+the\s+)?status\s+of\s+order|where\s+is\s+order|show\s+order)\s*(?:#|no\.?\s*)?(?P<id>\d+)"),
+        _command(r"order\s*#?\s*(?P<id>\d+)\s+status"),
+    ], lambda m: {"order_id": int(m.group("id"))}),
+
+    ("restock_book", RestockBookTool(), [
+        _command(rf"(?:restock|add\s+stock\s+(?:to|for))\s+{ISBN}\s+(?:by|with|x)?\s*{QTY}(?:\s+(?:copies|units|books))?"),
+        _command(rf"(?:restock|add)\s+{QTY}\s+(?:copies|units|books)?\s*(?:of|to|for)\s+{ISBN}"),
+    ], lambda m: {"isbn": _isbn(m), "qty": int(m.group("qty"))}),
+
+    ("update_price", UpdatePriceTool(), [
+        _command(rf"(?:set|change|update)\s+(?:the\s+)?price\s+(?:of|for)\s+{ISBN}\s+to\s+{PRICE}"),
+        _command(rf"(?:set|change|update)\s+{ISBN}\s+price\s+to\s+{PRICE}"),
+    ], lambda m: {"isbn": _isbn(m), "price": float(m.group("price"))}),
+
+    ("inventory_summary", InventorySummaryTool(), [
+        _command(
+            r"(?:(?:show|list)\s+(?:me\s+)?)?(?:all\s+)?(?:the\s+)?(?:books?\s+)?(?:that\s+are\s+)?"
+            r"(?:low|running\s+low)(?:\s+on)?\s+stock(?:\s+books?)?"
+            r"(?:\s+(?P<op>under|below|<=|<|at\s+most)\s*(?P<n>\d{1,6}))?"
+        ),
+        _command(r"(?:show\s+(?:me\s+)?)?(?:the\s+)?inventory\s+summary(?P<op>)(?P<n>)"),
+    ], lambda m: {"threshold": _threshold(m)}),
+]
+
+
+class FastPathRouter:
+    """
+    Deterministic intent router for fully structured desk commands.
+
+    Every rule must match the whole query, so anything with extra intent
+    ("restock 9780132350884 by 5 and order 2 for customer 3") falls through to
+    the agent. Hits run the existing tool directly; no LLM call is made.
+    """
+
+    def __init__(self, rules=RULES):
+        self._rules = rules
+        self._lock = threading.Lock()
+        self.queries = 0
+        self.hits = {name: 0 for name, *_ in rules}
+
+    def match(self, query: str) -> Optional[Route]:
+        route = None
+        for name, tool, patterns, build in self._rules:
+            m = next((m for m in (p.match(query or "") for p in patterns) if m), None)
+            if m:
+                route = Route(name=name, tool=tool, tool_input=build(m))
+                break
+
+        with self._lock:
+            self.queries += 1
+            if route:
+                self.hits[route.name] += 1
+        return route
+
+    def stats(self) -> dict:
+        with self._lock:
+            total_hits = sum(self.hits.values())
+            return {
+                "queries": self.queries,
+                "hits": total_hits,
+                "misses": self.queries - total_hits,
+                "hit_rate": round(total_hits / self.queries, 3) if self.queries else 0.0,
+                "hits_by_route": dict(self.hits),
+            }
+
+
+fast_path_router = FastPathRouter()
@@ -1,14 +1,29 @@
+import asyncio
 import json
+import logging
+import threading
+import time
 import uuid
-from datetime import datetime
-from server.agent.chains.library_agent import build_library_agent
-from server.db import SessionLocal
+from datetime import datetime, timezone
+from server.agent.chains.library_agent import get_library_agent, AGENT_MODES
+from server.agent.summarizer import local_summary, llm_summary
+from server.agent.router import fast_path_router
+from server.agent.cache import response_key, cached_response, store_response
+from server.agent.memory import load_history, aload_history, format_history, refresh_summary
+from server.agent.log_writer import log_writer
 from server.models.message import Message
 from server.models.tool_call import ToolCall
-from server.config import get_settings
-from openai import OpenAI
+from server.agent.registry import current_settings
+from server.db import request_session, async_request_session
+from server.tracing import trace_request, TraceHandler, token_usage
+from concurrent.futures import ThreadPoolExecutor
 from langchain.callbacks.base import BaseCallbackHandler
 
+# LLM summaries run here so they overlap with logging the agent response;
+# rolling history summaries run here too, after the response is returned
+_summary_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="summary")
+
+logger = logging.getLogger(__name__)
 
 
 def safe_json_dumps(obj):
@@ -22,68 +37,135 @@ def safe_json_dumps(obj):
 
 
 def log_message(session_id: str, role: str, content: str):
-    """Store user or assistant messages."""
-    db = SessionLocal()
-    try:
-        msg = Message(session_id=session_id, role=role, content=content)
-        db.add(msg)
-        db.commit()
-    finally:
-        db.close()
+    """Queue a user or assistant message for the audit log."""
+    log_writer.submit(Message, {
+        "session_id": session_id,
+        "role": role,
+        "content": content,
+        # Stamp now so batching does not reorder the conversation
+        "created_at": datetime.now(timezone.utc),
+    })
+
+
+# Timing and token columns of a ToolCall row; every row carries all of them so
+# the log writer can insert a batch with one multi-row statement
+TOOL_CALL_DETAILS = (
+    "run_id", "parent_run_id", "request_id", "started_at", "ended_at",
+    "duration_ms", "llm_step", "prompt_tokens", "completion_tokens",
+)
 
 
-def log_tool_call(session_id: str, name: str, args: dict, result: dict):
-    """Store tool execution info in the database."""
-    db = SessionLocal()
+def to_jsonable(obj):
+    """Snapshot `obj` as plain JSON types (datetimes and other objects become strings)."""
+    return json.loads(safe_json_dumps(obj))
+
+
+def tool_args(input_str: str, inputs=None) -> dict:
+    """Tool arguments as an object, so their keys (isbn, order_id, ...) are queryable."""
+    if isinstance(inputs, dict):
+        return inputs
     try:
-        db.add(
-            ToolCall(
-                session_id=session_id,
-                name=name,
-                args_json=safe_json_dumps(args),
-                result_json=safe_json_dumps(result),
-                created_at=datetime.utcnow(),
-            )
-        )
-        db.commit()
-    except Exception as e:
-        db.rollback()
-        print(f"[ERROR] Failed to log tool call: {e}")
-    finally:
-        db.close()
+        parsed = json.loads(input_str)
+    except (TypeError, ValueError):
+        parsed = None
+    return parsed if isinstance(parsed, dict) else {"input": input_str}
 
 
-def run_agent_query(user_query: str, session_id: str = None):
-    """Run the agent, record all tool invocations, and generate a summary."""
-    if not session_id:
-        session_id = str(uuid.uuid4())
+def log_tool_call(session_id: str, name: str, args: dict, result: dict, is_error: bool = False, **details):
+    """Queue tool execution info for the audit log."""
+    log_writer.submit(ToolCall, {
+        "session_id": session_id,
+        "name": name,
+        "args": to_jsonable(args),
+        "result": to_jsonable(result),
+        "created_at": datetime.now(timezone.utc),
+        "is_error": is_error,
+        **{key: details.get(key) for key in TOOL_CALL_DETAILS},
+    })
 
-    log_message(session_id, "user", user_query)
-    agent = build_library_agent(verbose=True)
 
+class ToolLogger(BaseCallbackHandler):
+    """
+    Record every tool invocation of one chat request as one ToolCall row.
 
-    class ToolLogger(BaseCallbackHandler):
-        def on_tool_start(self, serialized, input_str, **kwargs):
-            name = serialized.get("name", "unknown")
-            print(f"[TOOL START] {name} → {input_str}")
-            log_tool_call(session_id, name, {"input": input_str}, {"status": "started"})
+    The row is written when the tool ends (or fails), keyed by its LangChain
+    run id, with start/end times, duration, the error flag and the token usage
+    of the LLM step that asked for it. Parallel tool calls end on worker
+    threads, hence the lock.
+    """
 
-        def on_tool_end(self, output, **kwargs):
-            print(f"[TOOL END] → {output}")
-            log_tool_call(session_id, "tool_result", {}, {"output": output})
+    def __init__(self, session_id: str, request_id: str = None):
+        self.session_id = session_id
+        self.request_id = request_id
+        self.llm_calls = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self._step_tokens = {}  # llm step -> (prompt, completion)
+        self._open = {}  # run_id -> in-flight tool call
+        self._lock = threading.Lock()
 
-    #Instead of agent.callback_manager, pass callbacks directly
-    callbacks = [ToolLogger()]
+    def on_llm_start(self, serialized, prompts, **kwargs):
+        # Chat models fall back to this hook too; one call per agent iteration
+        with self._lock:
+            self.llm_calls += 1
 
-    try:
-        response_dict = agent.invoke(
-            {"input": user_query, "chat_history": []},
-            config={"callbacks": callbacks}
+    def on_llm_end(self, response, **kwargs):
+        prompt, completion = token_usage(response)
+        with self._lock:
+            self._step_tokens[self.llm_calls] = (prompt, completion)
+            self.prompt_tokens += prompt or 0
+            self.completion_tokens += completion or 0
+
+    def on_tool_start(self, serialized, input_str, *, run_id, parent_run_id=None, inputs=None, **kwargs):
+        name = serialized.get("name", "unknown")
+        logger.debug("Tool start %s → %s", name, input_str)
+        with self._lock:
+            self._open[run_id] = {
+                "name": name,
+                "args": tool_args(input_str, inputs),
+                "parent_run_id": parent_run_id,
+                "llm_step": self.llm_calls,
+                "started_at": datetime.now(timezone.utc),
+                "started": time.perf_counter(),
+            }
+
+    def on_tool_end(self, output, *, run_id, **kwargs):
+        logger.debug("Tool end → %s", output)
+        # Tools report failures as {"error": ...} results rather than raising
+        content = getattr(output, "content", output)
+        if isinstance(content, dict):
+            self._log(run_id, content, "error" in content)
+        else:
+            self._log(run_id, {"output": content}, False)
+
+    def on_tool_error(self, error, *, run_id, **kwargs):
+        logger.debug("Tool error → %s", error)
+        self._log(run_id, {"error": str(error)}, True)
+
+    def _log(self, run_id, result: dict, is_error: bool):
+        with self._lock:
+            call = self._open.pop(run_id, None)
+            if call is None:
+                return
+            prompt, completion = self._step_tokens.get(call["llm_step"], (None, None))
+        log_tool_call(
+            self.session_id, call["name"], call["args"], result, is_error,
+            run_id=str(run_id),
+            parent_run_id=str(call["parent_run_id"]) if call["parent_run_id"] else None,
+            request_id=self.request_id,
+            started_at=call["started_at"],
+            ended_at=datetime.now(timezone.utc),
+            duration_ms=round((time.perf_counter() - call["started"]) * 1000, 3),
+            llm_step=call["llm_step"] or None,
+            prompt_tokens=prompt,
+            completion_tokens=completion,
         )
-        response = response_dict.get("output", response_dict)
-    except Exception as e:
-        log_message(session_id, "assistant", f"Error: {e}")
-        return {"session_id": session_id, "error": str(e)}
+
+
+def _parse_response(response_dict):
+    """Return (parsed, intermediate_steps) from the executor output."""
+    response = response_dict.get("output", response_dict)
+    steps = response_dict.get("intermediate_steps", [])
 
     # Parse structured response
     if isinstance(response, str):
@@ -93,40 +175,224 @@ def run_agent_query(user_query: str, session_id: str = None):
             parsed = {"text": response}
     else:
         parsed = response
+    return parsed, steps
 
-    # Summarize the output for the chat UI
-    settings = get_settings()
-    client = OpenAI(api_key=settings.OPENAI_API_KEY)
-
-    summary_prompt = f"""
-    User query: "{user_query}"
-    Structured response: {safe_json_dumps(parsed)}
-
-    Summarize the result in 1–2 clear sentences for the chat interface.
-    """
-
-    try:
-        summary_completion = client.chat.completions.create(
-            model="gpt-4-turbo",
-            messages=[
-                {"role": "system", "content": "You are a concise assistant summarizing the AI agent's output."},
-                {"role": "user", "content": summary_prompt},
-            ],
-        )
-        summary_text = summary_completion.choices[0].message.content.strip()
-    except Exception as e:
-        summary_text = f"Summary unavailable: {e}"
 
-    # Log assistant response + summary
-    log_message(session_id, "assistant", safe_json_dumps(parsed))
+def _finish(session_id: str, user_query: str, parsed, summary_text: str,
+            run_stats: dict = None, request_id: str = None):
+    stats = run_stats or {}
     log_tool_call(session_id, "agent_summary",
-                  {"query": user_query},
-                  {"result": parsed, "summary": summary_text})
+                  {"query": user_query, **stats},
+                  {"result": parsed, "summary": summary_text},
+                  request_id=request_id,
+                  duration_ms=stats.get("elapsed_ms"),
+                  prompt_tokens=stats.get("prompt_tokens"),
+                  completion_tokens=stats.get("completion_tokens"))
 
-    return {
+    result = {
         "session_id": session_id,
         "tool": "multi_tool_chain",
         "args": {},
         "response": parsed,
         "summary": summary_text
     }
+    if run_stats:
+        result["run_stats"] = run_stats
+    return result
+
+
+def _run_stats(mode: str, tool_logger: "ToolLogger", steps, started: float) -> dict:
+    """How much work the agent did, to compare the react and tools modes."""
+    return {
+        "agent_mode": mode,
+        "llm_calls": tool_logger.llm_calls,
+        "tool_calls": len(steps),
+        "prompt_tokens": tool_logger.prompt_tokens,
+        "completion_tokens": tool_logger.completion_tokens,
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+    }
+
+
+def _finish_routed(session_id: str, user_query: str, route, result, request_id: str = None):
+    """Reply to a fast-path hit: templated summary, same Message/ToolCall rows as the agent."""
+    summary_text = local_summary(result, [(route.name, result)], "template")
+    log_message(session_id, "assistant", safe_json_dumps(result))
+    return _finish(session_id, user_query, result, summary_text, request_id=request_id)
+
+
+def _cache_key(user_query: str, history, settings):
+    if not settings.RESPONSE_CACHE_ENABLED:
+        return None
+    return response_key(user_query, has_history=bool(history.summary or history.turns))
+
+
+def _finish_cached(session_id: str, user_query: str, cached: dict, request_id: str = None):
+    """Reply from the response cache, logging the same rows as a fresh run."""
+    log_message(session_id, "assistant", safe_json_dumps(cached["response"]))
+    return _finish(session_id, user_query, cached["response"], cached["summary"], request_id=request_id)
+
+
+def run_agent_query(user_query: str, session_id: str = None, callbacks=None, streaming: bool = False):
+    """
+    Run the agent, record all tool invocations, and generate a summary.
+
+    Structured commands matched by the fast-path router skip the agent and call
+    their tool directly. Extra `callbacks` (e.g. a streaming handler) are added
+    to the per-request ToolLogger; `streaming` selects the agent variant that
+    emits LLM tokens.
+    """
+    if not session_id:
+        session_id = str(uuid.uuid4())
+
+    # Tools and sync-mode log writes of this run share one session and connection
+    with request_session(), trace_request(session_id, user_query) as trace:
+        settings = current_settings()
+        route = fast_path_router.match(user_query) if settings.ROUTER_ENABLED else None
+        if route is not None:
+            trace.set(path="routed", route=route.name)
+            log_message(session_id, "user", user_query)
+            try:
+                result = route.tool.invoke(
+                    route.tool_input,
+                    config={"callbacks": [ToolLogger(session_id, trace.trace_id), TraceHandler(trace), *(callbacks or [])]},
+                )
+            except Exception as e:
+                trace.set(outcome="error")
+                log_message(session_id, "assistant", f"Error: {e}")
+                return {"session_id": session_id, "error": str(e)}
+            return _finish_routed(session_id, user_query, route, result, trace.trace_id)
+
+        # Read history before logging this question so it is not included twice
+        history = load_history(session_id, settings)
+
+        # Read-only questions asked before are replayed without the LLM
+        cache_key = _cache_key(user_query, history, settings)
+        cached = cached_response(cache_key) if cache_key else None
+        if cached is not None:
+            trace.set(path="cached")
+            log_message(session_id, "user", user_query)
+            return _finish_cached(session_id, user_query, cached, trace.trace_id)
+
+        log_message(session_id, "user", user_query)
+        mode = settings.AGENT_MODE if settings.AGENT_MODE in AGENT_MODES else "react"
+        trace.set(path="agent", agent_mode=mode)
+        agent = get_library_agent(verbose=logger.isEnabledFor(logging.DEBUG), streaming=streaming, mode=mode)
+
+        #Instead of agent.callback_manager, pass callbacks directly
+        tool_logger = ToolLogger(session_id, trace.trace_id)
+        callbacks = [tool_logger, TraceHandler(trace), *(callbacks or [])]
+        started = time.perf_counter()
+
+        try:
+            response_dict = agent.invoke(
+                {"input": user_query, "chat_history": format_history(history)},
+                config={"callbacks": callbacks}
+            )
+        except Exception as e:
+            trace.set(outcome="error")
+            log_message(session_id, "assistant", f"Error: {e}")
+            return {"session_id": session_id, "error": str(e)}
+
+        parsed, steps = _parse_response(response_dict)
+        run_stats = _run_stats(mode, tool_logger, steps, started)
+
+        # Summarize the output for the chat UI, locally when the result shape is known
+        summary_text = local_summary(parsed, steps, settings.SUMMARY_MODE)
+        summary_future = None
+        if summary_text is None:
+            summary_future = _summary_executor.submit(llm_summary, user_query, safe_json_dumps(parsed))
+
+        # Log assistant response + summary
+        log_message(session_id, "assistant", safe_json_dumps(parsed))
+        if summary_future is not None:
+            summary_text = summary_future.result()
+
+        # Fold turns that fell out of the window into the rolling summary, off the request path
+        if history.pending_until_id is not None:
+            _summary_executor.submit(refresh_summary, session_id, history.pending_until_id, settings)
+
+        result = _finish(session_id, user_query, parsed, summary_text, run_stats, trace.trace_id)
+        if cache_key:
+            store_response(cache_key, {"response": parsed, "summary": summary_text},
+                           (action.tool for action, _ in steps))
+        return result
+
+
+async def arun_agent_query(user_query: str, session_id: str = None, callbacks=None):
+    """
+    Async variant of run_agent_query built on agent.ainvoke and the tools' _arun.
+
+    Log writes block (a database write in sync mode, a full queue otherwise),
+    so they run in a thread rather than on the event loop.
+    """
+    if not session_id:
+        session_id = str(uuid.uuid4())
+
+    async with async_request_session():
+        with trace_request(session_id, user_query) as trace:
+            settings = current_settings()
+            route = fast_path_router.match(user_query) if settings.ROUTER_ENABLED else None
+            if route is not None:
+                trace.set(path="routed", route=route.name)
+                await asyncio.to_thread(log_message, session_id, "user", user_query)
+                try:
+                    result = await route.tool.ainvoke(
+                        route.tool_input,
+                        config={"callbacks": [ToolLogger(session_id, trace.trace_id), TraceHandler(trace), *(callbacks or [])]},
+                    )
+                except Exception as e:
+                    trace.set(outcome="error")
+                    await asyncio.to_thread(log_message, session_id, "assistant", f"Error: {e}")
+                    return {"session_id": session_id, "error": str(e)}
+                return await asyncio.to_thread(_finish_routed, session_id, user_query, route, result, trace.trace_id)
+
+            history = await aload_history(session_id, settings)
+
+            cache_key = _cache_key(user_query, history, settings)
+            cached = cached_response(cache_key) if cache_key else None
+            if cached is not None:
+                trace.set(path="cached")
+                await asyncio.to_thread(log_message, session_id, "user", user_query)
+                return await asyncio.to_thread(_finish_cached, session_id, user_query, cached, trace.trace_id)
+
+            await asyncio.to_thread(log_message, session_id, "user", user_query)
+            mode = settings.AGENT_MODE if settings.AGENT_MODE in AGENT_MODES else "react"
+            trace.set(path="agent", agent_mode=mode)
+            agent = get_library_agent(verbose=logger.isEnabledFor(logging.DEBUG), mode=mode)
+            tool_logger = ToolLogger(session_id, trace.trace_id)
+            callbacks = [tool_logger, TraceHandler(trace), *(callbacks or [])]
+            started = time.perf_counter()
+
+            try:
+                response_dict = await agent.ainvoke(
+                    {"input": user_query, "chat_history": format_history(history)},
+                    config={"callbacks": callbacks}
+                )
+            except Exception as e:
+                trace.set(outcome="error")
+                await asyncio.to_thread(log_message, session_id, "assistant", f"Error: {e}")
+                return {"session_id": session_id, "error": str(e)}
+
+            parsed, steps = _parse_response(response_dict)
+            run_stats = _run_stats(mode, tool_logger, steps, started)
+
+            summary_text = local_summary(parsed, steps, settings.SUMMARY_MODE)
+            summary_future = None
+            if summary_text is None:
+                loop = asyncio.get_running_loop()
+                summary_future = loop.run_in_executor(
+                    _summary_executor, llm_summary, user_query, safe_json_dumps(parsed)
+                )
+
+            await asyncio.to_thread(log_message, session_id, "assistant", safe_json_dumps(parsed))
+            if summary_future is not None:
+                summary_text = await summary_future
+
+            if history.pending_until_id is not None:
+                _summary_executor.submit(refresh_summary, session_id, history.pending_until_id, settings)
+
+            result = await asyncio.to_thread(_finish, session_id, user_query, parsed, summary_text, run_stats, trace.trace_id)
+            if cache_key:
+                store_response(cache_key, {"response": parsed, "summary": summary_text},
+                               (action.tool for action, _ in steps))
+            return result
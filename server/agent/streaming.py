@@ -0,0 +1,75 @@
+import json
+import threading
+from langchain.callbacks.base import BaseCallbackHandler
+
+FINAL_ANSWER_MARKER = "Final Answer:"
+
+
+class ChatCancelled(Exception):
+    """Raised inside the agent run when the streaming client went away."""
+
+
+class StreamEventHandler(BaseCallbackHandler):
+    """
+    Forward agent progress to a streaming client.
+
+    `emit(event, data)` is called from the agent's worker thread for every tool
+    start/end and for each token of the answer: the text after `answer_marker`
+    (the ReAct "Final Answer:"), or every content token when it is None, as in
+    tool-calling mode where tool calls carry no content. Setting `cancelled`
+    aborts the chain at the next LLM token, LLM call or tool call.
+    """
+
+    # Let ChatCancelled propagate instead of being logged and swallowed
+    raise_error = True
+
+    def __init__(self, emit, cancelled: threading.Event, answer_marker: str = FINAL_ANSWER_MARKER):
+        self.emit = emit
+        self.cancelled = cancelled
+        self.answer_marker = answer_marker
+        self._buffer = ""
+        self._answering = answer_marker is None
+
+    def _check_cancelled(self):
+        if self.cancelled.is_set():
+            raise ChatCancelled("Client disconnected")
+
+    def on_llm_start(self, serialized, prompts, **kwargs):
+        self._check_cancelled()
+        self._buffer = ""
+        self._answering = self.answer_marker is None
+
+    def on_chat_model_start(self, serialized, messages, **kwargs):
+        self.on_llm_start(serialized, messages, **kwargs)
+
+    def on_llm_new_token(self, token: str, **kwargs):
+        self._check_cancelled()
+        if self._answering:
+            if token:
+                self.emit("token", {"text": token})
+            return
+
+        # Only the text after "Final Answer:" is meant for the user
+        self._buffer += token
+        idx = self._buffer.find(self.answer_marker)
+        if idx != -1:
+            self._answering = True
+            rest = self._buffer[idx + len(self.answer_marker):].lstrip()
+            if rest:
+                self.emit("token", {"text": rest})
+
+    def on_tool_start(self, serialized, input_str, **kwargs):
+        self._check_cancelled()
+        self.emit("tool_start", {"name": serialized.get("name", "unknown"), "input": input_str})
+
+    def on_tool_end(self, output, **kwargs):
+        self.emit("tool_end", {"name": kwargs.get("name"), "output": output})
+
+    def on_tool_error(self, error, **kwargs):
+        self.emit("tool_error", {"name": kwargs.get("name"), "error": str(error)})
+
+
+def format_sse(event: str, data) -> str:
+    """Encode one server-sent event."""
+    payload = json.dumps(data, ensure_ascii=False, default=str)
+    return f"event: {event}\ndata: {payload}\n\n"
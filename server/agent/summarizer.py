@@ -0,0 +1,200 @@
+from openai import OpenAI
+from server.agent.registry import AgentRegistry, ENV_PATH
+from server.config import get_settings
+
+# Summary modes:
+#   "template" - always use templates, fall back to the agent's own answer text
+#   "hybrid"   - use templates, call the LLM only for unrecognized result shapes
+#   "llm"      - always ask the LLM
+SUMMARY_MODES = ("template", "hybrid", "llm")
+
+# OpenAI client used for summaries, cached like the agent and rebuilt on .env changes
+summary_clients = AgentRegistry(
+    lambda: OpenAI(api_key=get_settings().OPENAI_API_KEY),
+    watched_paths=(ENV_PATH,),
+)
+
+_templates = []
+
+
+def template(matches):
+    """Register a formatter for tool results where `matches(result)` is true."""
+    def register(fn):
+        _templates.append((matches, fn))
+        return fn
+    return register
+
+
+def _is_dict_with(*keys):
+    return lambda r: isinstance(r, dict) and all(k in r for k in keys)
+
+
+def _money(value) -> str:
+    try:
+        return f"${float(value):.2f}"
+    except (TypeError, ValueError):
+        return str(value)
+
+
+def _join(parts, limit: int = 5) -> str:
+    shown = ", ".join(parts[:limit])
+    if len(parts) > limit:
+        shown += f" and {len(parts) - limit} more"
+    return shown
+
+
+@template(_is_dict_with("error"))
+def _error(r):
+    text = f"Sorry, that didn't work: {r['error']}"
+    if r.get("warnings"):
+        text += f" {' '.join(r['warnings'])}"
+    return text
+
+
+@template(_is_dict_with("order_id", "items", "warnings"))
+def _order_created(r):
+    items = [f"{i['ordered_qty']} × {i['title']} ({i['remaining_stock']} left)" for i in r["items"]]
+    text = f"Order #{r['order_id']} was created"
+    text += f" with {_join(items)}." if items else " but no items could be added."
+    if r["warnings"]:
+        text += f" Note: {' '.join(r['warnings'])}"
+    return text
+
+
+@template(_is_dict_with("order_id", "customer_id", "items"))
+def _order_status(r):
+    items = [f"{i['qty']} × {i['title']}" for i in r["items"]]
+    placed = str(r.get("created_at", ""))[:10]
+    text = f"Order #{r['order_id']} for customer {r['customer_id']}"
+    if placed:
+        text += f" was placed on {placed}"
+    return text + (f" and contains {_join(items)}." if items else " and has no items.")
+
+
+@template(_is_dict_with("isbn", "new_stock"))
+def _restocked(r):
+    return f"Restocked ISBN {r['isbn']}; it now has {r['new_stock']} copies in stock."
+
+
+@template(_is_dict_with("restocked", "not_found", "total_units"))
+def _bulk_restocked(r):
+    text = f"Restocked {len(r['restocked'])} title(s) with {r['total_units']} units in total."
+    if r["not_found"]:
+        text += f" Not found: {_join(r['not_found'])}."
+    return text
+
+
+@template(_is_dict_with("isbn", "updated_price"))
+def _price_updated(r):
+    return f"The price of ISBN {r['isbn']} is now {_money(r['updated_price'])}."
+
+
+@template(_is_dict_with("dry_run", "affected", "new_price_range"))
+def _bulk_price(r):
+    low, high = r["new_price_range"]
+    if not r["affected"]:
+        return "No books matched that filter, so no prices changed."
+    verb = "would change" if r["dry_run"] else "changed"
+    return (
+        f"{r['affected']} book price(s) {verb}; new prices range from {_money(low)} to {_money(high)} "
+        f"(total change {_money(r['total_change'])})."
+    )
+
+
+@template(_is_dict_with("threshold", "low_stock_books"))
+def _low_stock(r):
+    books = [f"{b['title']} ({b['stock']})" for b in r["low_stock_books"]]
+    totals = r.get("totals") or {}
+    count = totals.get("low_stock_titles", len(books))
+    text = f"{count} book(s) are at or below a stock of {r['threshold']}: {_join(books)}"
+    if len(books) < count:
+        text += f" (first {len(books)} shown)"
+    text += "."
+    if totals:
+        text += (
+            f" That is {totals['low_stock_units']} unit(s) worth {_money(totals['low_stock_value'])}; "
+            f"{totals['out_of_stock_titles']} title(s) are out of stock."
+        )
+    return text
+
+
+@template(_is_dict_with("message"))
+def _message(r):
+    return str(r["message"])
+
+
+@template(_is_dict_with("results", "next_cursor"))
+def _books_found(r):
+    if not r["results"]:
+        return "No matching books were found."
+    books = [
+        f"{b.get('title')} by {b.get('author')} (ISBN {b['isbn']}, {_money(b.get('price'))}, {b.get('stock')} in stock)"
+        for b in r["results"]
+    ]
+    text = f"Found {len(books)} book(s): {_join(books, limit=3)}."
+    if r["next_cursor"]:
+        text += " More matches are available."
+    return text
+
+
+def template_summary(result):
+    """Return a templated summary for a known tool result shape, or None."""
+    for matches, fn in _templates:
+        try:
+            if matches(result):
+                return fn(result)
+        except (KeyError, TypeError):
+            # Shape looked right but a field was off; let the caller fall back
+            return None
+    return None
+
+
+def last_observation(intermediate_steps):
+    """Return the output of the last tool the agent ran, if any."""
+    for _action, observation in reversed(intermediate_steps or []):
+        if observation is not None:
+            return observation
+    return None
+
+
+def llm_summary(user_query: str, structured: str) -> str:
+    """Ask the LLM for a 1–2 sentence summary of the structured response."""
+    summary_prompt = f"""
+    User query: "{user_query}"
+    Structured response: {structured}
+
+    Summarize the result in 1–2 clear sentences for the chat interface.
+    """
+
+    try:
+        summary_completion = summary_clients.get().chat.completions.create(
+            model="gpt-4-turbo",
+            messages=[
+                {"role": "system", "content": "You are a concise assistant summarizing the AI agent's output."},
+                {"role": "user", "content": summary_prompt},
+            ],
+        )
+        return summary_completion.choices[0].message.content.strip()
+    except Exception as e:
+        return f"Summary unavailable: {e}"
+
+
+def local_summary(parsed, intermediate_steps, mode: str):
+    """
+    Try to summarize without the LLM.
+
+    Returns the summary text, or None when `mode` requires an LLM call.
+    """
+    if mode == "llm":
+        return None
+
+    text = template_summary(last_observation(intermediate_steps))
+    if text is None:
+        text = template_summary(parsed)
+    if text is not None or mode == "hybrid":
+        return text
+
+    # "template" mode: the agent's final answer is the best we have
+    if isinstance(parsed, dict) and "text" in parsed:
+        return str(parsed["text"])
+    return str(parsed)
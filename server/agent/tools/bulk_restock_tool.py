@@ -0,0 +1,70 @@
+from langchain.tools import BaseTool
+from pydantic import BaseModel, Field
+from typing import Any, Type
+from server.db import session_scope, async_session_scope
+from server.agent.cache import invalidate_books
+from server.services.stock import merge_quantities, parse_restock_lines, restock_statement
+
+
+class BulkRestockInput(BaseModel):
+    """A whole delivery: list of {isbn, qty} or CSV text with 'isbn,qty' lines."""
+    items: Any = Field(..., description="List of {isbn, qty} objects, or CSV text with one 'isbn,qty' per line")
+
+
+class BulkRestockTool(BaseTool):
+    name: str = "bulk_restock"
+    description: str = (
+        "Restock many books at once in a single transaction: a delivery, a list, or CSV lines. "
+        "Args: { items: [{ isbn, qty }, ...] } or CSV text 'isbn,qty' per line. "
+        "One call handles the whole list; do not call restock_book once per title."
+    )
+    args_schema: Type[BaseModel] = BulkRestockInput
+
+    def _quantities(self, items: Any):
+        warnings = []
+        quantities = merge_quantities(parse_restock_lines(items, warnings))
+        return quantities, warnings
+
+    def _format(self, quantities: dict, rows, warnings):
+        updated = {row.isbn: row.stock for row in rows}
+        return {
+            "restocked": [
+                {"isbn": isbn, "added": qty, "new_stock": updated[isbn]}
+                for isbn, qty in quantities.items()
+                if isbn in updated
+            ],
+            "not_found": [isbn for isbn in quantities if isbn not in updated],
+            "total_units": sum(qty for isbn, qty in quantities.items() if isbn in updated),
+            "warnings": warnings,
+        }
+
+    def _run(self, items: Any):
+        quantities, warnings = self._quantities(items)
+        if not quantities:
+            return {"error": "No valid restock lines found.", "warnings": warnings}
+
+        with session_scope() as db:
+            try:
+                # One statement, one transaction for the whole delivery
+                rows = db.execute(restock_statement(quantities)).all()
+                db.commit()
+                invalidate_books([row.isbn for row in rows])
+                return self._format(quantities, rows, warnings)
+            except Exception as e:
+                db.rollback()
+                return {"error": str(e)}
+
+    async def _arun(self, items: Any):
+        quantities, warnings = self._quantities(items)
+        if not quantities:
+            return {"error": "No valid restock lines found.", "warnings": warnings}
+
+        async with async_session_scope() as db:
+            try:
+                rows = (await db.execute(restock_statement(quantities))).all()
+                await db.commit()
+                invalidate_books([row.isbn for row in rows])
+                return self._format(quantities, rows, warnings)
+            except Exception as e:
+                await db.rollback()
+                return {"error": str(e)}
@@ -0,0 +1,73 @@
+from langchain.tools import BaseTool
+from pydantic import BaseModel, Field, ValidationError
+from typing import Any, Type
+import json, re
+from server.db import session_scope, async_session_scope
+from server.agent.cache import invalidate_all_books
+from server.services.pricing import BulkPriceRequest, apply_bulk_price, aapply_bulk_price
+
+
+class BulkUpdatePriceInput(BaseModel):
+    """Loose schema so ReAct string payloads get through; BulkPriceRequest validates later."""
+    filter: Any = Field(..., description="{ author?, title?, isbns?, min_stock?, max_stock?, all? } or the whole payload as JSON")
+    operation: Any = Field(None, description="{ op: 'set' | 'percent' | 'delta', value, rounding? }")
+    dry_run: Any = Field(False, description="true to only preview the change")
+
+
+class BulkUpdatePriceTool(BaseTool):
+    name: str = "bulk_update_price"
+    description: str = (
+        "Reprice every book matching a filter in one step; use it when a price change applies "
+        "to many books (by author, title match, stock range or a list of ISBNs). "
+        "Args: { filter: { author?, title?, isbns?, min_stock?, max_stock? }, "
+        "operation: { op: 'set' | 'percent' | 'delta', value, rounding?: 'none' | 'cents' | 'whole' | 'x.99' }, "
+        "dry_run? }. Use dry_run: true first when the user asks what would change."
+    )
+    args_schema: Type[BaseModel] = BulkUpdatePriceInput
+
+    def _parse_request(self, filter: Any, operation: Any = None, **kwargs):
+        """Return a validated BulkPriceRequest or an error dict."""
+        payload = dict(kwargs, filter=filter, operation=operation)
+
+        # ReAct sends the whole payload as one (pseudo-)JSON string
+        if isinstance(filter, str) and operation is None:
+            try:
+                cleaned = re.sub(r"([{,]\s*)(\w+)\s*:", r'\1"\2":', filter.replace("'", '"'))
+                payload = json.loads(cleaned)
+            except Exception as e:
+                return {"error": f"Failed to parse tool input: {e}"}
+
+        try:
+            return BulkPriceRequest.model_validate(payload)
+        except ValidationError as e:
+            return {"error": f"Invalid bulk price request: {e.errors()}"}
+
+    def _run(self, filter: Any, operation: Any = None, **kwargs):
+        request = self._parse_request(filter, operation, **kwargs)
+        if isinstance(request, dict):
+            return request
+
+        with session_scope() as db:
+            try:
+                result = apply_bulk_price(db, request)
+                if not request.dry_run and result.get("affected"):
+                    invalidate_all_books()
+                return result
+            except Exception as e:
+                db.rollback()
+                return {"error": str(e)}
+
+    async def _arun(self, filter: Any, operation: Any = None, **kwargs):
+        request = self._parse_request(filter, operation, **kwargs)
+        if isinstance(request, dict):
+            return request
+
+        async with async_session_scope() as db:
+            try:
+                result = await aapply_bulk_price(db, request)
+                if not request.dry_run and result.get("affected"):
+                    invalidate_all_books()
+                return result
+            except Exception as e:
+                await db.rollback()
+                return {"error": str(e)}
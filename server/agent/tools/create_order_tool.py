@@ -3,8 +3,11 @@ from pydantic import BaseModel, Field
 from datetime import datetime
 from typing import Any, Type
 import json, re
-from server.db import SessionLocal
-from server.models import Book, Order, OrderItem
+from server.db import session_scope, async_session_scope
+from sqlalchemy import insert
+from server.models import Order, OrderItem
+from server.agent.cache import invalidate_books
+from server.services.stock import merge_quantities, lock_books_statement, decrement_stock_statement
 
 
 class CreateOrderInput(BaseModel):
@@ -18,99 +21,196 @@ class CreateOrderTool(BaseTool):
     description: str = "Create a new order for a customer and update book stock."
     args_schema: Type[BaseModel] = CreateOrderInput
 
-    def _run(self, customer_id: Any, items: Any = None):
-        db = SessionLocal()
-        try:
-            # Handle case: LLM sends everything as a single embedded JSON string
-            if isinstance(customer_id, str) and items is None:
-                raw = customer_id.strip()
-                try:
-                    clean = re.sub(r"([{,]\s*)(\w+)\s*:", r'\1"\2":', raw.replace("'", '"'))
-                    parsed = json.loads(clean)
-                    customer_id = int(parsed.get("customer_id"))
-                    items = parsed.get("items", [])
-                except Exception as e:
-                    return {"error": f"Failed to parse tool input: {e}"}
-
-            # If items is still a string, try to parse it as JSON
-            if isinstance(items, str):
-                try:
-                    items = json.loads(items.replace("'", '"'))
-                except Exception as e:
-                    return {"error": f"Invalid 'items' format: {e}"}
-
-            # Handle flat input pattern: {"isbn": ..., "qty": ..., "customer_id": ...}
-            if not items and isinstance(customer_id, dict):
-                if "isbn" in customer_id and ("qty" in customer_id or "quantity" in customer_id):
-                    qty_value = customer_id.get("qty") or customer_id.get("quantity")
-                    items = [{"isbn": customer_id["isbn"], "qty": qty_value}]
-                    customer_id = customer_id.get("customer_id", 1)
-
-            # Handle case where all fields are in stringified JSON
-            if not items and "isbn" in str(customer_id):
-                try:
-                    payload = json.loads(str(customer_id).replace("'", '"'))
-                    customer_id = payload.get("customer_id", customer_id)
-                    items = [{"isbn": payload.get("isbn"), "qty": payload.get("qty") or payload.get("quantity")}]
-                except Exception:
-                    pass
-
-            # Ensure valid customer_id
+    def _normalize_input(self, customer_id: Any, items: Any):
+        """Coerce the LLM payload into (customer_id, items) or return an error dict."""
+        # Handle case: LLM sends everything as a single embedded JSON string
+        if isinstance(customer_id, str) and items is None:
+            raw = customer_id.strip()
+            try:
+                clean = re.sub(r"([{,]\s*)(\w+)\s*:", r'\1"\2":', raw.replace("'", '"'))
+                parsed = json.loads(clean)
+                customer_id = int(parsed.get("customer_id"))
+                items = parsed.get("items", [])
+            except Exception as e:
+                return {"error": f"Failed to parse tool input: {e}"}
+
+        # If items is still a string, try to parse it as JSON
+        if isinstance(items, str):
+            try:
+                items = json.loads(items.replace("'", '"'))
+            except Exception as e:
+                return {"error": f"Invalid 'items' format: {e}"}
+
+        # Handle flat input pattern: {"isbn": ..., "qty": ..., "customer_id": ...}
+        if not items and isinstance(customer_id, dict):
+            if "isbn" in customer_id and ("qty" in customer_id or "quantity" in customer_id):
+                qty_value = customer_id.get("qty") or customer_id.get("quantity")
+                items = [{"isbn": customer_id["isbn"], "qty": qty_value}]
+                customer_id = customer_id.get("customer_id", 1)
+
+        # Handle case where all fields are in stringified JSON
+        if not items and "isbn" in str(customer_id):
             try:
-                customer_id = int(customer_id)
+                payload = json.loads(str(customer_id).replace("'", '"'))
+                customer_id = payload.get("customer_id", customer_id)
+                items = [{"isbn": payload.get("isbn"), "qty": payload.get("qty") or payload.get("quantity")}]
             except Exception:
-                return {"error": f"Invalid customer_id: {customer_id}"}
-
-            if not isinstance(items, list):
-                return {"error": f"Expected a list for 'items', got {type(items)}"}
-
-            # --- Create order ---
-            order = Order(customer_id=customer_id, created_at=datetime.utcnow())
-            db.add(order)
-            db.flush()
-
-            processed, warnings = [], []
-
-            for item in items:
-                isbn = item.get("isbn")
-                # Unified qty extraction (accept both qty or quantity)
-                raw_qty = item.get("qty") or item.get("quantity") or 0
-                try:
-                    qty = int(float(str(raw_qty).strip()))
-                except Exception:
-                    qty = 0
-
-                if not isbn or qty <= 0:
-                    warnings.append(f"Invalid entry: {item}")
-                    continue
-
-                book = db.query(Book).filter_by(isbn=isbn).first()
-                if not book:
-                    warnings.append(f"Book '{isbn}' not found — skipped.")
-                    continue
-                if book.stock < qty:
-                    warnings.append(f"Not enough stock for '{book.title}' — skipped.")
-                    continue
-
-                db.add(OrderItem(order_id=order.id, isbn=isbn, qty=qty))
-                book.stock -= qty
-                db.add(book)
-
-                processed.append({
+                pass
+
+        # Ensure valid customer_id
+        try:
+            customer_id = int(customer_id)
+        except Exception:
+            return {"error": f"Invalid customer_id: {customer_id}"}
+
+        if not isinstance(items, list):
+            return {"error": f"Expected a list for 'items', got {type(items)}"}
+
+        return customer_id, items
+
+    def _parse_item(self, item, warnings):
+        """Return (isbn, qty) for a valid line item, or None after recording a warning."""
+        isbn = item.get("isbn")
+        # Unified qty extraction (accept both qty or quantity)
+        raw_qty = item.get("qty") or item.get("quantity") or 0
+        try:
+            qty = int(float(str(raw_qty).strip()))
+        except Exception:
+            qty = 0
+
+        if not isbn or qty <= 0:
+            warnings.append(f"Invalid entry: {item}")
+            return None
+        return isbn, qty
+
+    def _requested_quantities(self, items, warnings) -> dict:
+        """Validate line items and merge repeated ISBNs into one quantity each."""
+        lines = []
+        for item in items:
+            if not isinstance(item, dict):
+                warnings.append(f"Invalid entry: {item}")
+                continue
+            line = self._parse_item(item, warnings)
+            if line:
+                lines.append(line)
+        return merge_quantities(lines)
+
+    def _plan(self, requested: dict, locked_rows, warnings):
+        """Split requested quantities into those that fit the locked stock and shortfalls."""
+        locked = {row.isbn: row for row in locked_rows}
+        to_decrement, shortfalls = {}, []
+
+        for isbn, qty in requested.items():
+            book = locked.get(isbn)
+            if book is None:
+                warnings.append(f"Book '{isbn}' not found — skipped.")
+            elif book.stock < qty:
+                warnings.append(f"Not enough stock for '{book.title}' — skipped.")
+                shortfalls.append({
+                    "isbn": isbn,
                     "title": book.title,
-                    "isbn": book.isbn,
-                    "ordered_qty": qty,
-                    "remaining_stock": book.stock
+                    "requested": qty,
+                    "available": book.stock,
                 })
+            else:
+                to_decrement[isbn] = qty
+        return to_decrement, shortfalls
+
+    def _processed(self, to_decrement: dict, updated_rows):
+        updated = {row.isbn: row for row in updated_rows}
+        return [
+            {
+                "title": updated[isbn].title,
+                "isbn": isbn,
+                "ordered_qty": qty,
+                "remaining_stock": updated[isbn].stock,
+            }
+            for isbn, qty in to_decrement.items()
+            if isbn in updated
+        ]
+
+    def _no_items(self, warnings, shortfalls):
+        return {"error": "None of the requested items could be ordered.", "warnings": warnings, "shortfalls": shortfalls}
 
-            db.commit()
-            return {"order_id": order.id, "items": processed, "warnings": warnings}
+    def _run(self, customer_id: Any, items: Any = None):
+        normalized = self._normalize_input(customer_id, items)
+        if isinstance(normalized, dict):
+            return normalized
+        customer_id, items = normalized
 
-        except Exception as e:
-            db.rollback()
-            return {"error": str(e)}
-        finally:
-            db.close()
+        warnings = []
+        requested = self._requested_quantities(items, warnings)
+        if not requested:
+            return self._no_items(warnings, [])
 
-    async def _arun(self, *args, **kwargs):
-        raise NotImplementedError("Async version not implemented.")
+        with session_scope() as db:
+            try:
+                # --- Lock every requested book in one query, in ISBN order ---
+                locked_rows = db.execute(lock_books_statement(requested)).all()
+                to_decrement, shortfalls = self._plan(requested, locked_rows, warnings)
+                if not to_decrement:
+                    db.rollback()
+                    return self._no_items(warnings, shortfalls)
+
+                # --- Conditional decrement of all lines in one statement ---
+                updated_rows = db.execute(decrement_stock_statement(to_decrement)).all()
+                processed = self._processed(to_decrement, updated_rows)
+                if not processed:
+                    db.rollback()
+                    return self._no_items(warnings, shortfalls)
+
+                # --- Create order and bulk-insert its lines ---
+                order = Order(customer_id=customer_id, created_at=datetime.utcnow())
+                db.add(order)
+                db.flush()
+                db.execute(insert(OrderItem), [
+                    {"order_id": order.id, "isbn": p["isbn"], "qty": p["ordered_qty"]} for p in processed
+                ])
+
+                db.commit()
+                invalidate_books([p["isbn"] for p in processed])
+                return {"order_id": order.id, "items": processed, "warnings": warnings, "shortfalls": shortfalls}
+
+            except Exception as e:
+                db.rollback()
+                return {"error": str(e)}
+
+    async def _arun(self, customer_id: Any, items: Any = None):
+        normalized = self._normalize_input(customer_id, items)
+        if isinstance(normalized, dict):
+            return normalized
+        customer_id, items = normalized
+
+        warnings = []
+        requested = self._requested_quantities(items, warnings)
+        if not requested:
+            return self._no_items(warnings, [])
+
+        async with async_session_scope() as db:
+            try:
+                locked_rows = (await db.execute(lock_books_statement(requested))).all()
+                to_decrement, shortfalls = self._plan(requested, locked_rows, warnings)
+                if not to_decrement:
+                    await db.rollback()
+                    return self._no_items(warnings, shortfalls)
+
+                updated_rows = (await db.execute(decrement_stock_statement(to_decrement))).all()
+                processed = self._processed(to_decrement, updated_rows)
+                if not processed:
+                    await db.rollback()
+                    return self._no_items(warnings, shortfalls)
+
+                order = Order(customer_id=customer_id, created_at=datetime.utcnow())
+                db.add(order)
+                await db.flush()
+                await db.execute(insert(OrderItem), [
+                    {"order_id": order.id, "isbn": p["isbn"], "qty": p["ordered_qty"]} for p in processed
+                ])
+
+                await db.commit()
+                invalidate_books([p["isbn"] for p in processed])
+                return {"order_id": order.id, "items": processed, "warnings": warnings, "shortfalls": shortfalls}
+
+            except Exception as e:
+                await db.rollback()
+                return {"error": str(e)}
@@ -1,29 +1,34 @@
 from langchain.tools import BaseTool
 from pydantic import BaseModel, Field
-from sqlalchemy import or_, func
-from server.db import SessionLocal
-from server.models import Book
+from typing import Optional
+from server.db import session_scope, async_session_scope
+from server.agent.cache import cached_search, store_search
+from server.services.search import DEFAULT_LIMIT, MAX_LIMIT, normalize_text, build_search_query
+from server.services.pagination import encode_cursor
 import json
-import unicodedata
+import logging
 import re
 
+logger = logging.getLogger(__name__)
+
 
 class FindBooksInput(BaseModel):
     q: str = Field(..., description="Search text for book title or author")
-    by: str = Field("title", description="Field to search: 'title' or 'author'")
+    by: str = Field("title", description="Field to search: 'title', 'author' or 'any'")
+    limit: int = Field(DEFAULT_LIMIT, description=f"Maximum results to return (up to {MAX_LIMIT})")
+    cursor: Optional[str] = Field(None, description="next_cursor from a previous call, to get the next page")
 
 
 class FindBooksTool(BaseTool):
     name: str = "find_books"
-    description: str = "Find books by title or author. Args: { q, by }"
+    description: str = (
+        "Find books by title or author, best matches first. "
+        "Args: { q, by, limit?, cursor? }. Pass next_cursor back as cursor for more results."
+    )
     args_schema: type[BaseModel] = FindBooksInput
 
     def normalize_text(self, text: str) -> str:
-        if not text:
-            return ""
-        text = unicodedata.normalize("NFKD", text)
-        text = text.replace("’", "'").replace("“", '"').replace("”", '"')
-        return text.strip().lower()
+        return normalize_text(text)
 
     def safe_parse(self, data):
         """Parse input robustly whether it's dict, JSON, or pseudo-JSON."""
@@ -47,30 +52,30 @@ class FindBooksTool(BaseTool):
 
         return {"q": str(data), "by": "title"}
 
-    def _run(self, data):
+    def _build_query(self, data):
         parsed = self.safe_parse(data)
         q = self.normalize_text(parsed.get("q", ""))
-        by = parsed.get("by", "title").lower()
-
-        db = SessionLocal()
+        by = str(parsed.get("by", "title")).lower()
         try:
-            query = db.query(Book)
-
-            if by == "author":
-                results = query.filter(func.lower(Book.author).ilike(f"%{q}%")).all()
-            elif by == "title":
-                results = query.filter(func.lower(Book.title).ilike(f"%{q}%")).all()
-            else:
-                results = query.filter(
-                    or_(
-                        func.lower(Book.title).ilike(f"%{q}%"),
-                        func.lower(Book.author).ilike(f"%{q}%"),
-                    )
-                ).all()
-
-            print(f"[DEBUG] Searching for '{q}' by '{by}' → {len(results)} results")
-
-            return [
+            limit = min(max(int(parsed.get("limit") or DEFAULT_LIMIT), 1), MAX_LIMIT)
+        except (TypeError, ValueError):
+            limit = DEFAULT_LIMIT
+
+        cursor = parsed.get("cursor")
+        stmt = build_search_query(q, by, limit, cursor)
+        return (q, by, limit, cursor), stmt
+
+    def _format(self, q, by, limit, rows):
+        page = rows[:limit]
+        next_cursor = None
+        if len(rows) > limit:
+            last_book, last_score = page[-1]
+            next_cursor = encode_cursor([last_score, last_book.isbn])
+
+        return {
+            "query": q,
+            "by": by,
+            "results": [
                 {
                     "isbn": b.isbn,
                     "title": b.title,
@@ -78,7 +83,36 @@ class FindBooksTool(BaseTool):
                     "price": b.price,
                     "stock": b.stock,
                 }
-                for b in results
-            ]
-        finally:
-            db.close()
+                for b, _score in page
+            ],
+            "next_cursor": next_cursor,
+        }
+
+    def _run(self, data=None, **kwargs):
+        # ReAct passes one string; structured tool calls pass the schema fields
+        key, stmt = self._build_query(data if data is not None else kwargs)
+        q, by, limit, _cursor = key
+        cached, generation = cached_search(key)
+        if cached is not None:
+            return cached
+
+        with session_scope() as db:
+            rows = db.execute(stmt).all()
+            logger.debug("Searching for '%s' by '%s' → %d results", q, by, len(rows))
+            result = self._format(q, by, limit, rows)
+            store_search(key, result, generation)
+            return result
+
+    async def _arun(self, data=None, **kwargs):
+        key, stmt = self._build_query(data if data is not None else kwargs)
+        q, by, limit, _cursor = key
+        cached, generation = cached_search(key)
+        if cached is not None:
+            return cached
+
+        async with async_session_scope() as db:
+            rows = (await db.execute(stmt)).all()
+            logger.debug("Searching for '%s' by '%s' → %d results", q, by, len(rows))
+            result = self._format(q, by, limit, rows)
+            store_search(key, result, generation)
+            return result
@@ -2,8 +2,11 @@ from langchain.tools import BaseTool
 from pydantic import BaseModel, Field
 from typing import Any, Type
 import json, re
-from server.db import SessionLocal
-from server.models import Book
+from server.db import session_scope, async_session_scope
+from server.services.inventory import (
+    DEFAULT_LIMIT, MAX_LIMIT, SORT_ORDERS, low_stock_aggregates_statement, low_stock_page_statement,
+)
+from server.services.pagination import encode_cursor
 
 
 class InventorySummaryInput(BaseModel):
@@ -12,50 +15,98 @@ class InventorySummaryInput(BaseModel):
         5,
         description="Optional stock threshold (int). Defaults to 5 if not provided."
     )
+    limit: Any = Field(DEFAULT_LIMIT, description=f"How many low-stock books to list (up to {MAX_LIMIT})")
+    sort: Any = Field("asc", description="'asc' lists the lowest stock first, 'desc' the highest")
+    cursor: Any = Field(None, description="next_cursor from a previous call, to list more books")
 
 
 class InventorySummaryTool(BaseTool):
     name: str = "inventory_summary"
-    description: str = "List all books that are low in stock."
+    description: str = (
+        "Summarize books that are low in stock: totals for the whole low-stock set "
+        "plus the first `limit` books, sorted by stock ('asc' or 'desc'). "
+        "Args: { threshold?, limit?, sort?, cursor? }. Pass next_cursor back as cursor "
+        "only if the user asks to see more."
+    )
     args_schema: Type[BaseModel] = InventorySummaryInput
 
-    def _run(self, threshold: Any = 5):
-        db = SessionLocal()
-        try:
-            # --- Normalize the threshold argument ---
-            if isinstance(threshold, str):
-                try:
-                    cleaned = re.sub(r"([{,]\s*)(\w+)\s*:", r'\1"\2":', threshold.replace("'", '"'))
-                    parsed = json.loads(cleaned)
-                    threshold = parsed.get("threshold", threshold)
-                except Exception:
-                    pass
-
+    def _parse_input(self, threshold: Any, limit: Any, sort: Any, cursor: Any):
+        # --- Normalize the threshold argument ---
+        if isinstance(threshold, str):
             try:
-                threshold = int(threshold)
+                cleaned = re.sub(r"([{,]\s*)(\w+)\s*:", r'\1"\2":', threshold.replace("'", '"'))
+                parsed = json.loads(cleaned)
+                if isinstance(parsed, dict):
+                    threshold = parsed.get("threshold", 5)
+                    limit = parsed.get("limit", limit)
+                    sort = parsed.get("sort", sort)
+                    cursor = parsed.get("cursor", cursor)
+                else:
+                    threshold = parsed
             except Exception:
-                threshold = 5  # fallback to default
+                pass
+
+        try:
+            threshold = int(threshold)
+        except Exception:
+            threshold = 5  # fallback to default
+
+        try:
+            limit = min(max(int(limit), 1), MAX_LIMIT)
+        except Exception:
+            limit = DEFAULT_LIMIT
 
-            # --- Query books ---
-            books = db.query(Book).filter(Book.stock <= threshold).all()
+        sort = str(sort).lower() if str(sort).lower() in SORT_ORDERS else "asc"
+        return threshold, limit, sort, cursor
 
-            if not books:
-                return {"message": f"No books found below stock threshold ({threshold})."}
+    def _format(self, threshold: int, limit: int, sort: str, totals, rows):
+        if not totals.count:
+            return {"message": f"No books found below stock threshold ({threshold})."}
 
-            return {
-                "threshold": threshold,
-                "low_stock_books": [
-                    {"title": b.title, "isbn": b.isbn, "stock": b.stock}
-                    for b in books
-                ]
-            }
+        page = rows[:limit]
+        next_cursor = None
+        if len(rows) > limit:
+            next_cursor = encode_cursor([page[-1].stock, page[-1].isbn])
 
-        except Exception as e:
-            db.rollback()
-            return {"error": str(e)}
+        return {
+            "threshold": threshold,
+            "totals": {
+                "low_stock_titles": totals.count,
+                "low_stock_units": int(totals.units),
+                "low_stock_value": round(float(totals.value), 2),
+                "out_of_stock_titles": totals.out_of_stock,
+            },
+            "sort": sort,
+            "low_stock_books": [
+                {"title": b.title, "isbn": b.isbn, "stock": b.stock}
+                for b in page
+            ],
+            "next_cursor": next_cursor,
+        }
 
-        finally:
-            db.close()
+    def _run(self, threshold: Any = 5, limit: Any = DEFAULT_LIMIT, sort: Any = "asc", cursor: Any = None):
+        threshold, limit, sort, cursor = self._parse_input(threshold, limit, sort, cursor)
+
+        with session_scope() as db:
+            try:
+                # --- Aggregates and one bounded page, both from the stock index ---
+                totals = db.execute(low_stock_aggregates_statement(threshold)).one()
+                rows = db.execute(low_stock_page_statement(threshold, limit, sort, cursor)).all()
+                return self._format(threshold, limit, sort, totals, rows)
+
+            except Exception as e:
+                db.rollback()
+                return {"error": str(e)}
+
+    async def _arun(self, threshold: Any = 5, limit: Any = DEFAULT_LIMIT, sort: Any = "asc", cursor: Any = None):
+        threshold, limit, sort, cursor = self._parse_input(threshold, limit, sort, cursor)
+
+        async with async_session_scope() as db:
+            try:
+                totals = (await db.execute(low_stock_aggregates_statement(threshold))).one()
+                rows = (await db.execute(low_stock_page_statement(threshold, limit, sort, cursor))).all()
+                return self._format(threshold, limit, sort, totals, rows)
 
-    async def _arun(self, *args, **kwargs):
-        raise NotImplementedError("Async version not implemented.")
+            except Exception as e:
+                await db.rollback()
+                return {"error": str(e)}
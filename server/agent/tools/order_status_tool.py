@@ -2,8 +2,10 @@ from langchain.tools import BaseTool
 from pydantic import BaseModel, Field
 from typing import Any, Type
 import json, re
-from server.db import SessionLocal
-from server.models import Order, OrderItem, Book
+from sqlalchemy import select
+from server.db import session_scope, async_session_scope
+from server.models import Order, OrderItem
+from server.agent.cache import get_books, aget_books
 
 
 class OrderStatusInput(BaseModel):
@@ -16,55 +18,74 @@ class OrderStatusTool(BaseTool):
     description: str = "Retrieve details and status of a specific order."
     args_schema: Type[BaseModel] = OrderStatusInput
 
-    def _run(self, order_id: Any):
-        db = SessionLocal()
+    def _parse_order_id(self, order_id: Any):
+        """Return the order id as int, or an error dict."""
+        # --- Normalize the incoming value ---
+        if isinstance(order_id, str):
+            try:
+                # Handle embedded JSON or loose dict-like input
+                cleaned = re.sub(r"([{,]\s*)(\w+)\s*:", r'\1"\2":', order_id.replace("'", '"'))
+                parsed = json.loads(cleaned)
+                order_id = parsed.get("order_id", order_id)
+            except Exception:
+                pass
+
         try:
-            # --- Normalize the incoming value ---
-            if isinstance(order_id, str):
-                try:
-                    # Handle embedded JSON or loose dict-like input
-                    cleaned = re.sub(r"([{,]\s*)(\w+)\s*:", r'\1"\2":', order_id.replace("'", '"'))
-                    parsed = json.loads(cleaned)
-                    order_id = parsed.get("order_id", order_id)
-                except Exception:
-                    pass
+            return int(order_id)
+        except Exception:
+            return {"error": f"Invalid order_id: {order_id}"}
+
+    def _items_query(self, order_id: int):
+        return select(OrderItem).where(OrderItem.order_id == order_id)
+
+    def _format(self, order, items, books):
+        return {
+            "order_id": order.id,
+            "customer_id": order.customer_id,
+            "created_at": order.created_at.isoformat(),
+            "items": [
+                {"title": books[oi.isbn]["title"], "isbn": oi.isbn, "qty": oi.qty, "price": books[oi.isbn]["price"]}
+                for oi in items
+                if oi.isbn in books
+            ],
+        }
+
+    def _run(self, order_id: Any):
+        order_id = self._parse_order_id(order_id)
+        if isinstance(order_id, dict):
+            return order_id
 
+        with session_scope() as db:
             try:
-                order_id = int(order_id)
-            except Exception:
-                return {"error": f"Invalid order_id: {order_id}"}
-
-            # --- Fetch the order ---
-            order = db.query(Order).filter_by(id=order_id).first()
-            if not order:
-                return {"error": f"Order {order_id} not found."}
-
-            # --- Fetch items with titles ---
-            items = (
-                db.query(OrderItem, Book)
-                .join(Book, Book.isbn == OrderItem.isbn)
-                .filter(OrderItem.order_id == order_id)
-                .all()
-            )
-
-            order_data = {
-                "order_id": order.id,
-                "customer_id": order.customer_id,
-                "created_at": order.created_at.isoformat(),
-                "items": [
-                    {"title": b.title, "isbn": b.isbn, "qty": oi.qty, "price": b.price}
-                    for oi, b in items
-                ],
-            }
-
-            return order_data
-
-        except Exception as e:
-            db.rollback()
-            return {"error": str(e)}
-
-        finally:
-            db.close()
-
-    async def _arun(self, *args, **kwargs):
-        raise NotImplementedError("Async version not implemented.")
+                # --- Fetch the order ---
+                order = db.get(Order, order_id)
+                if not order:
+                    return {"error": f"Order {order_id} not found."}
+
+                # --- Fetch items, titles come from the shared book cache ---
+                items = db.execute(self._items_query(order_id)).scalars().all()
+                books = get_books(db, [oi.isbn for oi in items])
+                return self._format(order, items, books)
+
+            except Exception as e:
+                db.rollback()
+                return {"error": str(e)}
+
+    async def _arun(self, order_id: Any):
+        order_id = self._parse_order_id(order_id)
+        if isinstance(order_id, dict):
+            return order_id
+
+        async with async_session_scope() as db:
+            try:
+                order = await db.get(Order, order_id)
+                if not order:
+                    return {"error": f"Order {order_id} not found."}
+
+                items = (await db.execute(self._items_query(order_id))).scalars().all()
+                books = await aget_books(db, [oi.isbn for oi in items])
+                return self._format(order, items, books)
+
+            except Exception as e:
+                await db.rollback()
+                return {"error": str(e)}
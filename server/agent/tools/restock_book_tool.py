@@ -1,13 +1,24 @@
 from langchain.tools import BaseTool
-from pydantic import BaseModel, Field, ValidationError
-from server.db import SessionLocal
-from server.models import Book
-import json, re
+from pydantic import BaseModel, Field
+from typing import Any, Type
+from server.db import session_scope, async_session_scope
+from server.agent.cache import invalidate_books
+from server.services.stock import restock_statement
+import json, re, logging
+
+logger = logging.getLogger(__name__)
+
+
+class RestockBookInput(BaseModel):
+    """Accepts flexible payloads (whole input may arrive embedded in isbn)."""
+    isbn: Any = Field(..., description="Book ISBN (string or embedded JSON)")
+    qty: Any = Field(None, description="Number of copies to add")
 
 
 class RestockBookTool(BaseTool):
     name: str = "restock_book"
     description: str = "Increase the stock quantity for a book. Args: { isbn, qty }"
+    args_schema: Type[BaseModel] = RestockBookInput
 
     def safe_parse(self, data):
         """Robustly parse LangChain input (dict, JSON, pseudo-JSON, or nested malformed dict)."""
@@ -38,10 +49,12 @@ class RestockBookTool(BaseTool):
 
         return {"isbn": str(data), "qty": 1}
 
-    def _run(self, data):
-        """Safely restock a book by ISBN."""
+    def _parse_input(self, data):
+        """Return (isbn, qty) or an error dict; qty must be a positive whole number, as in bulk_restock."""
         parsed = self.safe_parse(data)
-        isbn = parsed.get("isbn")
+        if not isinstance(parsed, dict):
+            return {"error": f"Invalid restock input: {data}"}
+        isbn = str(parsed.get("isbn") or "").strip()
         qty = parsed.get("qty")
 
         # Fallback: if qty still missing, try to extract from raw text
@@ -52,16 +65,51 @@ class RestockBookTool(BaseTool):
             else:
                 qty = 1
 
-        print(f"[DEBUG] Parsed restock input → {parsed}")
-
-        db = SessionLocal()
+        logger.debug("Parsed restock input → %s", parsed)
         try:
-            book = db.query(Book).filter_by(isbn=isbn).first()
-            if not book:
-                return {"error": f"Book with ISBN {isbn} not found."}
-
-            book.stock += int(qty)
-            db.commit()
-            return {"isbn": isbn, "new_stock": book.stock}
-        finally:
-            db.close()
+            qty = int(float(str(qty).strip()))
+        except (ValueError, OverflowError):
+            qty = 0
+        if not isbn or qty <= 0:
+            return {"error": f"Invalid restock entry: {parsed}. qty must be a positive whole number."}
+        return isbn, qty
+
+    def _format(self, isbn, row):
+        if row is None:
+            return {"error": f"Book with ISBN {isbn} not found."}
+        return {"isbn": row.isbn, "new_stock": row.stock}
+
+    def _run(self, isbn: Any, qty: Any = None):
+        """Safely restock a book by ISBN with a single atomic UPDATE."""
+        parsed = self._parse_input(isbn if qty is None else {"isbn": isbn, "qty": qty})
+        if isinstance(parsed, dict):
+            return parsed
+        isbn, qty = parsed
+
+        with session_scope() as db:
+            try:
+                row = db.execute(restock_statement({isbn: qty})).first()
+                db.commit()
+                if row is not None:
+                    invalidate_books([isbn])
+                return self._format(isbn, row)
+            except Exception as e:
+                db.rollback()
+                return {"error": str(e)}
+
+    async def _arun(self, isbn: Any, qty: Any = None):
+        parsed = self._parse_input(isbn if qty is None else {"isbn": isbn, "qty": qty})
+        if isinstance(parsed, dict):
+            return parsed
+        isbn, qty = parsed
+
+        async with async_session_scope() as db:
+            try:
+                row = (await db.execute(restock_statement({isbn: qty}))).first()
+                await db.commit()
+                if row is not None:
+                    invalidate_books([isbn])
+                return self._format(isbn, row)
+            except Exception as e:
+                await db.rollback()
+                return {"error": str(e)}
@@ -2,8 +2,9 @@ from langchain.tools import BaseTool
 from pydantic import BaseModel, Field
 from typing import Any, Type
 import json, re
-from server.db import SessionLocal
+from server.db import session_scope, async_session_scope
 from server.models import Book
+from server.agent.cache import invalidate_books
 
 
 class UpdatePriceInput(BaseModel):
@@ -17,47 +18,74 @@ class UpdatePriceTool(BaseTool):
     description: str = "Update the price of a book in the inventory."
     args_schema: Type[BaseModel] = UpdatePriceInput
 
-    def _run(self, isbn: Any, price: Any = None):
-        db = SessionLocal()
-        try:
-            # Handle entire input embedded as JSON string
-            if isinstance(isbn, str) and price is None:
-                try:
-                    cleaned = re.sub(r"([{,]\s*)(\w+)\s*:", r'\1"\2":', isbn.replace("'", '"'))
-                    parsed = json.loads(cleaned)
-                    isbn = parsed.get("isbn")
-                    price = parsed.get("price") or parsed.get("qty")
-                except Exception:
-                    pass
-
-            # If price still missing, default to 0 or error
-            if price is None:
-                return {"error": "Missing 'price' or 'qty' field."}
-
-            # Ensure correct types
+    def _parse_input(self, isbn: Any, price: Any):
+        """Return (isbn, price) or an error dict."""
+        # Handle entire input embedded as JSON string
+        if isinstance(isbn, str) and price is None:
             try:
-                price = float(price)
+                cleaned = re.sub(r"([{,]\s*)(\w+)\s*:", r'\1"\2":', isbn.replace("'", '"'))
+                parsed = json.loads(cleaned)
+                isbn = parsed.get("isbn")
+                price = parsed.get("price") or parsed.get("qty")
             except Exception:
-                return {"error": f"Invalid price format: {price}"}
+                pass
+
+        # If price still missing, default to 0 or error
+        if price is None:
+            return {"error": "Missing 'price' or 'qty' field."}
+
+        # Ensure correct types
+        try:
+            price = float(price)
+        except Exception:
+            return {"error": f"Invalid price format: {price}"}
+
+        if not isinstance(isbn, str):
+            return {"error": f"Invalid ISBN format: {isbn}"}
+
+        return isbn, price
 
-            if not isinstance(isbn, str):
-                return {"error": f"Invalid ISBN format: {isbn}"}
+    def _run(self, isbn: Any, price: Any = None):
+        parsed = self._parse_input(isbn, price)
+        if isinstance(parsed, dict):
+            return parsed
+        isbn, price = parsed
+
+        with session_scope() as db:
+            try:
+                # Update DB record
+                book = db.get(Book, isbn)
+                if not book:
+                    return {"error": f"Book with ISBN {isbn} not found."}
+
+                book.price = price
+                db.commit()
+                invalidate_books([isbn])
 
-            # Update DB record
-            book = db.query(Book).filter_by(isbn=isbn).first()
-            if not book:
-                return {"error": f"Book with ISBN {isbn} not found."}
+                return {"isbn": isbn, "updated_price": price}
 
-            book.price = price
-            db.commit()
+            except Exception as e:
+                db.rollback()
+                return {"error": str(e)}
+
+    async def _arun(self, isbn: Any, price: Any = None):
+        parsed = self._parse_input(isbn, price)
+        if isinstance(parsed, dict):
+            return parsed
+        isbn, price = parsed
+
+        async with async_session_scope() as db:
+            try:
+                book = await db.get(Book, isbn)
+                if not book:
+                    return {"error": f"Book with ISBN {isbn} not found."}
 
-            return {"isbn": isbn, "updated_price": price}
+                book.price = price
+                await db.commit()
+                invalidate_books([isbn])
 
-        except Exception as e:
-            db.rollback()
-            return {"error": str(e)}
-        finally:
-            db.close()
+                return {"isbn": isbn, "updated_price": price}
 
-    async def _arun(self, *args, **kwargs):
-        raise NotImplementedError("Async version not implemented.")
+            except Exception as e:
+                await db.rollback()
+                return {"error": str(e)}
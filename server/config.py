@@ -15,6 +15,69 @@ class Settings(BaseSettings):
 
     API_URL: str
 
+    # Database connection pools (one sync, one async)
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT_SECONDS: float = 30
+    DB_POOL_RECYCLE_SECONDS: int = 1800
+    DB_POOL_PRE_PING: bool = True
+    # Server-side limit per statement; 0 disables it
+    DB_STATEMENT_TIMEOUT_MS: int = 15000
+    # Behind PgBouncer (transaction pooling): no prepared statements or startup options
+    DB_PGBOUNCER: bool = False
+
+    # Agent worker pool
+    AGENT_MAX_WORKERS: int = 4
+    AGENT_QUEUE_SIZE: int = 16
+    AGENT_RETRY_AFTER_SECONDS: int = 5
+    # Run /chat with agent.ainvoke and async tools instead of the thread pool
+    AGENT_ASYNC: bool = False
+    # "react" (text ReAct prompt) or "tools" (structured tool calling, parallel tool calls)
+    AGENT_MODE: str = "react"
+    # Threads running the tool calls of one model turn concurrently in "tools" mode
+    AGENT_PARALLEL_TOOLS: int = 8
+
+    # Audit log writer ("async" = write-behind batches, "sync" = write immediately)
+    LOG_WRITE_MODE: str = "async"
+    LOG_BATCH_SIZE: int = 100
+    LOG_FLUSH_INTERVAL_MS: int = 200
+    LOG_QUEUE_MAX: int = 10000
+
+    # Chat summaries: "template", "hybrid" (LLM only for unknown shapes) or "llm"
+    SUMMARY_MODE: str = "hybrid"
+
+    # Answer fully structured commands ("order status 42") without the LLM
+    ROUTER_ENABLED: bool = True
+
+    # Conversation history given to the agent: newest turns within a token budget,
+    # older turns folded into a rolling per-session summary. 0 disables history.
+    HISTORY_TOKEN_BUDGET: int = 1500
+    HISTORY_MAX_MESSAGES: int = 40
+    HISTORY_MESSAGE_MAX_TOKENS: int = 300
+    HISTORY_SUMMARY_MAX_TOKENS: int = 250
+
+    # Logging and tracing: DEBUG also prints tool calls and the agent's reasoning.
+    # Each request is traced (LLM, tool and SQL spans) into the /metrics histograms;
+    # set TRACE_EXPORT_PATH to also append every trace to that file as one JSON line.
+    LOG_LEVEL: str = "INFO"
+    TRACE_EXPORT_PATH: str = ""
+
+    # messages and tool_calls are partitioned by month. Partitions entirely older than
+    # RETENTION_DAYS are exported to ARCHIVE_DIR as gzipped NDJSON and dropped by
+    # `python -m server.retention maintain`; 0 keeps everything.
+    RETENTION_DAYS: int = 365
+    ARCHIVE_DIR: str = "archive"
+    PARTITION_MONTHS_AHEAD: int = 2
+
+    # In-process book and search caches shared by the tools
+    BOOK_CACHE_SIZE: int = 10000
+    SEARCH_CACHE_SIZE: int = 1000
+    BOOK_CACHE_TTL_SECONDS: float = 60
+    # Whole agent responses to read-only questions, keyed by query and catalog version
+    RESPONSE_CACHE_ENABLED: bool = True
+    RESPONSE_CACHE_SIZE: int = 500
+    RESPONSE_CACHE_TTL_SECONDS: float = 300
+
     class Config:
         env_file = ".env"
 
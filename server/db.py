@@ -1,5 +1,12 @@
-from sqlalchemy import create_engine
+import threading
+import time
+import uuid
+from contextlib import contextmanager, asynccontextmanager
+from contextvars import ContextVar
+from sqlalchemy import create_engine, event, exc
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.pool import NullPool, QueuePool, AsyncAdaptedQueuePool
 from server.config import get_settings
 
 settings = get_settings()
@@ -10,13 +17,221 @@ DATABASE_URL = (
     f"@{settings.POSTGRES_DB_URL}/{settings.POSTGRES_DB_NAME}"
 )
 
-engine = create_engine(DATABASE_URL)
+ASYNC_DATABASE_URL = (
+    f"postgresql+asyncpg://{settings.POSTGRES_DB_USER}:{settings.POSTGRES_DB_PASSWORD}"
+    f"@{settings.POSTGRES_DB_URL}/{settings.POSTGRES_DB_NAME}"
+)
+
+
+# --- Pool instrumentation ---
+class _TimedPoolMixin:
+    """Records how long callers wait for a connection and how often they time out."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._stats_lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            with self._stats_lock:
+                self.timeouts += 1
+            raise
+        finally:
+            waited = time.perf_counter() - started
+            with self._stats_lock:
+                self.checkouts += 1
+                self.total_wait += waited
+                self.max_wait = max(self.max_wait, waited)
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            avg_wait = self.total_wait / self.checkouts if self.checkouts else 0.0
+            return {
+                "size": self.size(),
+                "checked_in": self.checkedin(),
+                "checked_out": self.checkedout(),
+                "overflow": self.overflow(),
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "avg_wait_ms": round(avg_wait * 1000, 2),
+                "max_wait_ms": round(self.max_wait * 1000, 2),
+            }
+
+
+class InstrumentedQueuePool(_TimedPoolMixin, QueuePool):
+    pass
+
+
+class InstrumentedAsyncQueuePool(_TimedPoolMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+def _pool_options(poolclass) -> dict:
+    return {
+        "poolclass": poolclass,
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT_SECONDS,
+        "pool_recycle": settings.DB_POOL_RECYCLE_SECONDS,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+    }
+
+
+def _sync_connect_args() -> dict:
+    # PgBouncer rejects startup options, so the timeout is set per transaction instead
+    if settings.DB_STATEMENT_TIMEOUT_MS and not settings.DB_PGBOUNCER:
+        return {"options": f"-c statement_timeout={settings.DB_STATEMENT_TIMEOUT_MS}"}
+    return {}
+
+
+def _async_connect_args() -> dict:
+    args = {}
+    if settings.DB_PGBOUNCER:
+        # Transaction pooling cannot keep server-side prepared statements between queries
+        args["statement_cache_size"] = 0
+        args["prepared_statement_name_func"] = lambda: f"__asyncpg_{uuid.uuid4()}__"
+    elif settings.DB_STATEMENT_TIMEOUT_MS:
+        args["server_settings"] = {"statement_timeout": str(settings.DB_STATEMENT_TIMEOUT_MS)}
+    return args
+
+
+def _set_local_timeout(conn):
+    conn.exec_driver_sql(f"SET LOCAL statement_timeout = {int(settings.DB_STATEMENT_TIMEOUT_MS)}")
+
+
+engine = create_engine(
+    DATABASE_URL,
+    connect_args=_sync_connect_args(),
+    **_pool_options(InstrumentedQueuePool),
+)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+# Async counterpart used by the tools' _arun implementations
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL + ("?prepared_statement_cache_size=0" if settings.DB_PGBOUNCER else ""),
+    connect_args=_async_connect_args(),
+    **_pool_options(InstrumentedAsyncQueuePool),
+)
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+
+if settings.DB_PGBOUNCER and settings.DB_STATEMENT_TIMEOUT_MS:
+    event.listen(engine, "begin", _set_local_timeout)
+    event.listen(async_engine.sync_engine, "begin", _set_local_timeout)
+
+# Migrations, backfills, bulk loads and archiving legitimately run for minutes;
+# they use this unpooled engine, which has no statement timeout
+maintenance_engine = create_engine(DATABASE_URL, poolclass=NullPool)
+
 Base = declarative_base()
 
+
+def pool_stats() -> dict:
+    return {"sync": engine.pool.stats(), "async": async_engine.pool.stats()}
+
+
+# --- Request-scoped sessions ---
+# Set by the agent runner so every tool and sync-mode log write of one request
+# shares a single session pinned to one pooled connection. A session serves one
+# caller at a time: tools running concurrently (parallel tool calls) get their
+# own short-lived session instead.
+class _SharedSession:
+    def __init__(self, db):
+        self.db = db
+        self.busy = False
+        self._lock = threading.Lock()
+
+    def claim(self) -> bool:
+        """Mark the session busy for the caller; False if another tool holds it."""
+        with self._lock:
+            if self.busy:
+                return False
+            self.busy = True
+            return True
+
+
+_request_session: ContextVar = ContextVar("request_session", default=None)
+_async_request_session: ContextVar = ContextVar("async_request_session", default=None)
+
+
+@contextmanager
+def request_session():
+    """Check out one connection and bind the current request's session to it."""
+    with engine.connect() as conn:
+        db = SessionLocal(bind=conn)
+        token = _request_session.set(_SharedSession(db))
+        try:
+            yield db
+        finally:
+            _request_session.reset(token)
+            db.close()
+
+
+@contextmanager
+def session_scope():
+    """Yield the current request's session, or a short-lived one outside a request or while it is busy."""
+    shared = _request_session.get()
+    # Parallel tools share the context (and so this session); only one may use it at a time
+    if shared is None or not shared.claim():
+        db = SessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
+        return
+
+    try:
+        yield shared.db
+    finally:
+        # Writers commit themselves; this ends read-only transactions so the
+        # pinned connection does not sit idle in transaction between tools.
+        shared.db.rollback()
+        shared.busy = False
+
+
+@asynccontextmanager
+async def async_request_session():
+    """Async counterpart of request_session."""
+    async with async_engine.connect() as conn:
+        async with AsyncSessionLocal(bind=conn) as db:
+            token = _async_request_session.set(_SharedSession(db))
+            try:
+                yield db
+            finally:
+                _async_request_session.reset(token)
+
+
+@asynccontextmanager
+async def async_session_scope():
+    """Async counterpart of session_scope."""
+    shared = _async_request_session.get()
+    if shared is None or shared.busy:
+        async with AsyncSessionLocal() as db:
+            yield db
+        return
+
+    shared.busy = True
+    try:
+        yield shared.db
+    finally:
+        await shared.db.rollback()
+        shared.busy = False
+
+
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
         db.close()
+
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
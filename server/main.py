@@ -1,16 +1,31 @@
 import os
+import logging
 import threading
 import time
 import subprocess
+from contextlib import suppress
 from fastapi import FastAPI, Depends
-from server.db import Base, engine, SessionLocal
+from sqlalchemy.exc import OperationalError
+from server.db import Base, engine, maintenance_engine, async_engine, SessionLocal
 from server.models import *
 from server.routes.base import router as base_router
 from server.routes.chat import router as chat_router
 from server.routes.session_routes import router as session_router 
 from server.routes.message_routes import router as message_router
-
-
+from server.routes.stats_routes import router as stats_router
+from server.routes.pricing_routes import router as pricing_router
+from server.routes.metrics_routes import router as metrics_router
+from server.routes.tool_call_routes import router as tool_call_router
+from server.agent.pool import shutdown_agent_pool
+from server.agent.log_writer import log_writer
+from server.migrations import run_migrations, verify_schema
+from server.config import get_settings
+
+logging.basicConfig(
+    level=get_settings().LOG_LEVEL.upper(),
+    format="%(asctime)s %(levelname)s %(name)s: %(message)s",
+)
+logger = logging.getLogger(__name__)
 
 
 app = FastAPI(title="Library Desk Agent API")
@@ -18,22 +33,34 @@ app = FastAPI(title="Library Desk Agent API")
 @app.on_event("startup")
 def startup_db_client():
     try:
-        print("Loaded tables:", Base.metadata.tables.keys())
+        logger.debug("Loaded tables: %s", list(Base.metadata.tables.keys()))
         Base.metadata.create_all(bind=engine)
-        print("Connected to the PostgreSQL database!")
-    except Exception as e:
-        print(f"Failed to connect to PostgreSQL: {e}")
+        run_migrations(maintenance_engine)
+        logger.info("Connected to the PostgreSQL database!")
+    except OperationalError as e:
+        # Unreachable database, or a migration cancelled by a lock or timeout
+        logger.error("Failed to connect to PostgreSQL: %s", e)
+    # Every chat request logs to these tables; refuse to serve without their columns
+    with suppress(OperationalError):
+        verify_schema(engine)
 
 @app.on_event("shutdown")
-def shutdown_db_client():
+async def shutdown_db_client():
+    shutdown_agent_pool()
+    log_writer.close()
     SessionLocal.close_all()
-    print("Database connection closed.")
+    await async_engine.dispose()
+    logger.info("Database connection closed.")
 
 # Register routes
 app.include_router(base_router)
 app.include_router(chat_router)
 app.include_router(session_router)
 app.include_router(message_router)
+app.include_router(stats_router)
+app.include_router(pricing_router)
+app.include_router(metrics_router)
+app.include_router(tool_call_router)
 
 
 
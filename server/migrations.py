@@ -0,0 +1,316 @@
+import argparse
+from sqlalchemy import text
+from server.db import maintenance_engine
+from server.config import get_settings
+from server.models.message import Message
+from server.models.tool_call import ToolCall
+from server.partitions import ensure_partitions, is_partitioned, list_partitions
+
+BACKFILL_BATCH_SIZE = 5000
+
+
+class SchemaError(RuntimeError):
+    """The database lacks columns the application writes to."""
+
+
+# Idempotent DDL that create_all() cannot express, applied on every startup.
+# Only cheap statements belong here; indexes on large tables go in INDEXES.
+MIGRATIONS = [
+    # --- Catalog search (find_books) ---
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE EXTENSION IF NOT EXISTS unaccent",
+    # unaccent() is only STABLE; an IMMUTABLE wrapper is required to index it
+    """
+    CREATE OR REPLACE FUNCTION f_unaccent(text) RETURNS text
+    LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT
+    AS $$ SELECT public.unaccent('public.unaccent'::regdictionary, $1) $$
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_books_title_trgm ON books USING gin (lower(f_unaccent(title)) gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_books_author_trgm ON books USING gin (lower(f_unaccent(author)) gin_trgm_ops)",
+    # --- Inventory summary (existing databases predate the model index) ---
+    "CREATE INDEX IF NOT EXISTS ix_books_stock_isbn ON books (stock, isbn)",
+    # --- Message history pagination ---
+    "CREATE INDEX IF NOT EXISTS ix_messages_session_created_id ON messages (session_id, created_at, id)",
+    # --- Conversation memory (columns added after the sessions table shipped) ---
+    "ALTER TABLE sessions ADD COLUMN IF NOT EXISTS summary text",
+    "ALTER TABLE sessions ADD COLUMN IF NOT EXISTS summarized_until_id integer",
+    # --- Tool call timings (columns added after the tool_calls table shipped) ---
+    "ALTER TABLE tool_calls ADD COLUMN IF NOT EXISTS run_id varchar",
+    "ALTER TABLE tool_calls ADD COLUMN IF NOT EXISTS parent_run_id varchar",
+    "ALTER TABLE tool_calls ADD COLUMN IF NOT EXISTS request_id varchar",
+    "ALTER TABLE tool_calls ADD COLUMN IF NOT EXISTS started_at timestamptz",
+    "ALTER TABLE tool_calls ADD COLUMN IF NOT EXISTS ended_at timestamptz",
+    "ALTER TABLE tool_calls ADD COLUMN IF NOT EXISTS duration_ms double precision",
+    "ALTER TABLE tool_calls ADD COLUMN IF NOT EXISTS is_error boolean NOT NULL DEFAULT false",
+    "ALTER TABLE tool_calls ADD COLUMN IF NOT EXISTS llm_step integer",
+    "ALTER TABLE tool_calls ADD COLUMN IF NOT EXISTS prompt_tokens integer",
+    "ALTER TABLE tool_calls ADD COLUMN IF NOT EXISTS completion_tokens integer",
+    "CREATE INDEX IF NOT EXISTS ix_tool_calls_run_id ON tool_calls (run_id)",
+    "CREATE INDEX IF NOT EXISTS ix_tool_calls_request_id ON tool_calls (request_id)",
+    "CREATE INDEX IF NOT EXISTS ix_tool_calls_created_at_name ON tool_calls (created_at, name) WHERE run_id IS NOT NULL",
+    # --- Tool call payloads as JSONB ---
+    # New rows write args/result; rows from before keep their double-encoded
+    # args_json/result_json until `python -m server.migrations --backfill-tool-calls`
+    # decodes them in batches and drops the legacy columns. Their indexes are in INDEXES.
+    "ALTER TABLE tool_calls ADD COLUMN IF NOT EXISTS args jsonb",
+    "ALTER TABLE tool_calls ADD COLUMN IF NOT EXISTS result jsonb",
+    """
+    DO $$
+    BEGIN
+        IF EXISTS (SELECT 1 FROM information_schema.columns
+                   WHERE table_name = 'tool_calls' AND column_name = 'args_json') THEN
+            ALTER TABLE tool_calls ALTER COLUMN args_json DROP NOT NULL;
+            ALTER TABLE tool_calls ALTER COLUMN result_json DROP NOT NULL;
+        END IF;
+    END $$
+    """,
+    # A legacy payload is a JSON string holding the JSON text; unparsable text is kept under "text"
+    """
+    CREATE OR REPLACE FUNCTION f_decode_payload(payload json) RETURNS jsonb
+    LANGUAGE plpgsql IMMUTABLE PARALLEL SAFE AS $$
+    BEGIN
+        IF payload IS NULL THEN
+            RETURN '{}'::jsonb;
+        ELSIF json_typeof(payload) = 'string' THEN
+            RETURN (payload #>> '{}')::jsonb;
+        END IF;
+        RETURN payload::jsonb;
+    EXCEPTION WHEN others THEN
+        RETURN jsonb_build_object('text', payload #>> '{}');
+    END $$
+    """,
+    # Every "isbn" value anywhere in a call's args or result, normalized like user input
+    r"""
+    CREATE OR REPLACE FUNCTION f_tool_call_isbns(args jsonb, result jsonb) RETURNS text[]
+    LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+        SELECT coalesce(array_agg(DISTINCT upper(regexp_replace(v #>> '{}', '[-\s]', '', 'g'))), '{}')
+        FROM (
+            SELECT jsonb_path_query(coalesce(args, '{}'), 'strict $.**.isbn', '{}', true) AS v
+            UNION ALL
+            SELECT jsonb_path_query(coalesce(result, '{}'), 'strict $.**.isbn', '{}', true)
+        ) found
+        WHERE jsonb_typeof(v) IN ('string', 'number')
+    $$
+    """,
+    # --- One-time data backfills run by the CLI record their completion here ---
+    """
+    CREATE TABLE IF NOT EXISTS schema_backfills (
+        name varchar PRIMARY KEY,
+        completed_at timestamptz NOT NULL DEFAULT now()
+    )
+    """,
+]
+
+
+# Indexes on tables that may already be large: (name, table, definition). Built by
+# `python -m server.migrations` with CREATE INDEX CONCURRENTLY, never at startup, so
+# writes keep flowing; new databases get most of them from the models already.
+INDEXES = [
+    ("ix_tool_calls_name_created_at", "tool_calls", "(name, created_at)"),
+    ("ix_tool_calls_args_gin", "tool_calls", "USING gin (args jsonb_path_ops)"),
+    ("ix_tool_calls_result_gin", "tool_calls", "USING gin (result jsonb_path_ops)"),
+    ("ix_tool_calls_isbns", "tool_calls", "USING gin (f_tool_call_isbns(args, result))"),
+    (
+        "ix_tool_calls_order_id", "tool_calls",
+        "((coalesce(result ->> 'order_id', args ->> 'order_id'))) "
+        "WHERE coalesce(result ->> 'order_id', args ->> 'order_id') IS NOT NULL",
+    ),
+]
+
+_INDEX_VALID = text("SELECT indisvalid FROM pg_index WHERE indexrelid = to_regclass(:name)")
+
+
+def run_migrations(bind=maintenance_engine):
+    """Apply every statement in MIGRATIONS and create upcoming partitions, in one transaction."""
+    with bind.begin() as conn:
+        for statement in MIGRATIONS:
+            conn.execute(text(statement))
+        ensure_partitions(conn, get_settings().PARTITION_MONTHS_AHEAD)
+
+
+def verify_schema(bind=maintenance_engine):
+    """Raise SchemaError unless messages and tool_calls have every column their models write."""
+    missing = []
+    with bind.connect() as conn:
+        for model in (Message, ToolCall):
+            table = model.__tablename__
+            present = set(conn.execute(
+                text("SELECT column_name FROM information_schema.columns WHERE table_name = :table"),
+                {"table": table},
+            ).scalars())
+            missing += [f"{table}.{c.name}" for c in model.__table__.columns if c.name not in present]
+    if missing:
+        raise SchemaError(
+            f"Missing columns {', '.join(missing)}; run `python -m server.migrations` and check its output"
+        )
+
+
+# --- Concurrent index builds ---
+
+def _build_index(conn, name: str, table: str, definition: str) -> bool:
+    """
+    CREATE INDEX CONCURRENTLY `name`, replacing an invalid leftover of a failed build.
+
+    `conn` must be in autocommit mode. Returns False if a valid index already existed.
+    """
+    valid = conn.execute(_INDEX_VALID, {"name": name}).scalar()
+    if valid:
+        return False
+    if valid is not None:
+        conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+    conn.execute(text(f"CREATE INDEX CONCURRENTLY {name} ON {table} {definition}"))
+    return True
+
+
+def build_index(conn, name: str, table: str, definition: str) -> bool:
+    """
+    Build one index without blocking writes.
+
+    Partitioned tables do not support CONCURRENTLY, so the index is created
+    on the parent only, built concurrently on every partition and attached;
+    the parent index turns valid once all partitions are attached, and later
+    partitions get it on creation.
+    """
+    if not is_partitioned(conn, table):
+        return _build_index(conn, name, table, definition)
+    if conn.execute(_INDEX_VALID, {"name": name}).scalar():
+        return False
+    conn.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON ONLY {table} {definition}"))
+    for partition, _month in list_partitions(conn, table):
+        child = f"{name}_{partition[len(table) + 1:]}"
+        _build_index(conn, child, partition, definition)
+        conn.execute(text(f"ALTER INDEX {name} ATTACH PARTITION {child}"))
+    return True
+
+
+def build_indexes(bind=maintenance_engine, indexes=INDEXES) -> list:
+    """Build every missing index of `indexes` concurrently; returns the names built."""
+    built = []
+    with bind.connect() as conn:
+        conn = conn.execution_options(isolation_level="AUTOCOMMIT")
+        conn.execute(text("SET statement_timeout = 0"))
+        for name, table, definition in indexes:
+            if build_index(conn, name, table, definition):
+                built.append(name)
+    return built
+
+
+# --- Sessions backfill ---
+
+_BACKFILL_DONE = text("SELECT 1 FROM schema_backfills WHERE name = :name")
+_MARK_BACKFILL_DONE = text("INSERT INTO schema_backfills (name) VALUES (:name) ON CONFLICT (name) DO NOTHING")
+
+# Recomputes every session from its messages, so rows the log writer created
+# before the backfill get their full counts rather than being skipped
+_BACKFILL_SESSIONS = text("""
+    INSERT INTO sessions (id, title, message_count, created_at, last_activity)
+    SELECT
+        session_id,
+        (array_agg(left(content, 80) ORDER BY created_at, id) FILTER (WHERE role = 'user'))[1],
+        count(*),
+        min(created_at),
+        max(created_at)
+    FROM messages
+    WHERE session_id IS NOT NULL
+    GROUP BY session_id
+    ON CONFLICT (id) DO UPDATE SET
+        title = coalesce(EXCLUDED.title, sessions.title),
+        message_count = EXCLUDED.message_count,
+        created_at = least(sessions.created_at, EXCLUDED.created_at),
+        last_activity = greatest(sessions.last_activity, EXCLUDED.last_activity)
+""")
+
+
+def backfill_sessions(bind=maintenance_engine) -> int:
+    """
+    Build the sessions table from existing messages, once.
+
+    Session writes are locked out for the duration (the log writer's rollups
+    wait), so no message is counted twice or missed. Completion is recorded in
+    schema_backfills; returns the number of sessions written, or 0 if done before.
+    """
+    with bind.begin() as conn:
+        if conn.execute(_BACKFILL_DONE, {"name": "sessions"}).first() is not None:
+            return 0
+        conn.execute(text("LOCK TABLE sessions IN EXCLUSIVE MODE"))
+        written = conn.execute(_BACKFILL_SESSIONS).rowcount
+        conn.execute(_MARK_BACKFILL_DONE, {"name": "sessions"})
+    return written
+
+
+# --- Tool call payload backfill ---
+
+_LEGACY_COLUMNS = text("""
+    SELECT count(*) FROM information_schema.columns
+    WHERE table_name = 'tool_calls' AND column_name IN ('args_json', 'result_json')
+""")
+
+# One short transaction per batch; SKIP LOCKED lets two backfills run side by side
+_BACKFILL_BATCH = text("""
+    WITH batch AS (
+        SELECT id FROM tool_calls WHERE args IS NULL
+        ORDER BY id LIMIT :batch_size
+        FOR UPDATE SKIP LOCKED
+    )
+    UPDATE tool_calls t
+    SET args = f_decode_payload(t.args_json), result = f_decode_payload(t.result_json)
+    FROM batch
+    WHERE t.id = batch.id
+""")
+
+_FINISH_BACKFILL = [
+    "ALTER TABLE tool_calls ALTER COLUMN args SET NOT NULL",
+    "ALTER TABLE tool_calls ALTER COLUMN result SET NOT NULL",
+    "DROP INDEX IF EXISTS ix_tool_calls_backfill_pending",
+    "ALTER TABLE tool_calls DROP COLUMN args_json, DROP COLUMN result_json",
+]
+
+
+def backfill_tool_call_payloads(bind=maintenance_engine, batch_size: int = BACKFILL_BATCH_SIZE) -> int:
+    """
+    Decode legacy args_json/result_json strings into the JSONB args/result columns.
+
+    Rows are converted `batch_size` at a time, each batch committed on its own
+    so the table is never locked for long. Once no legacy row is left the old
+    columns are dropped. Returns the number of rows converted.
+    """
+    with bind.connect() as conn:
+        if conn.execute(_LEGACY_COLUMNS).scalar_one() < 2:
+            return 0
+    build_indexes(bind, [("ix_tool_calls_backfill_pending", "tool_calls", "(id) WHERE args IS NULL")])
+
+    converted = 0
+    while True:
+        with bind.begin() as conn:
+            rows = conn.execute(_BACKFILL_BATCH, {"batch_size": batch_size}).rowcount
+        converted += rows
+        if rows:
+            print(f"Backfilled {converted} tool calls...")
+        if rows < batch_size:
+            break
+
+    with bind.begin() as conn:
+        # Rows still locked by a concurrent backfill are finished by that run
+        if conn.execute(text("SELECT 1 FROM tool_calls WHERE args IS NULL LIMIT 1")).first() is None:
+            for statement in _FINISH_BACKFILL:
+                conn.execute(text(statement))
+    return converted
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Apply schema migrations.")
+    parser.add_argument("--backfill-tool-calls", action="store_true",
+                        help="Convert legacy tool call payloads to JSONB in batches, then drop the old columns")
+    parser.add_argument("--batch-size", type=int, default=BACKFILL_BATCH_SIZE)
+    parser.add_argument("--backfill-sessions", action="store_true",
+                        help="Build the sessions table from existing messages (once; locks session writes meanwhile)")
+    args = parser.parse_args()
+
+    run_migrations()
+    print("Migrations applied.")
+    built = build_indexes()
+    print(f"Built indexes: {', '.join(built)}." if built else "All indexes present.")
+    if args.backfill_sessions:
+        print(f"Backfilled {backfill_sessions()} sessions.")
+    if args.backfill_tool_calls:
+        print(f"Converted {backfill_tool_call_payloads(batch_size=args.batch_size)} tool calls to JSONB.")
@@ -4,3 +4,4 @@ from .order import Order
 from .order_item import OrderItem
 from .message import Message
 from .tool_call import ToolCall
+from .chat_session import ChatSession
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Integer, Float
+from sqlalchemy import Column, String, Integer, Float, Index
 from server.db import Base
 
 class Book(Base):
@@ -9,3 +9,6 @@ class Book(Base):
     author = Column(String, nullable=False)
     price = Column(Float, nullable=False)
     stock = Column(Integer, default=0)
+
+    # Serves the low-stock filter and its (stock, isbn) keyset pagination
+    __table_args__ = (Index("ix_books_stock_isbn", "stock", "isbn"),)
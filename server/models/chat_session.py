@@ -0,0 +1,19 @@
+from sqlalchemy import Column, Integer, String, Text, DateTime, Index, func
+from server.db import Base
+
+# One row per chat session, kept current by the log writer as messages are written
+class ChatSession(Base):
+    __tablename__ = "sessions"
+
+    id = Column(String, primary_key=True)
+    title = Column(String, nullable=True)  # first user message, truncated
+    message_count = Column(Integer, nullable=False, default=0, server_default="0")
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    last_activity = Column(DateTime(timezone=True), server_default=func.now())
+
+    # Rolling summary of the turns that no longer fit the agent's history budget
+    summary = Column(Text, nullable=True)
+    summarized_until_id = Column(Integer, nullable=True)  # last message id folded into summary
+
+    # Most-recent-first keyset pagination of /sessions
+    __table_args__ = (Index("ix_sessions_last_activity_id", "last_activity", "id"),)
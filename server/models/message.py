@@ -1,11 +1,18 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, func
+from sqlalchemy import Column, Integer, String, Text, DateTime, Index, func
 from server.db import Base
 
 class Message(Base):
     __tablename__ = "messages"
 
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     session_id = Column(String, index=True)
     role = Column(String, nullable=False)  # "user" | "assistant" | "tool"
     content = Column(Text, nullable=False)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # Partition key (monthly partitions, see server/partitions.py), hence part of the primary key
+    created_at = Column(DateTime(timezone=True), primary_key=True, server_default=func.now())
+
+    __table_args__ = (
+        # Keyset pagination of a session's history: WHERE session_id = ? ORDER BY created_at, id
+        Index("ix_messages_session_created_id", "session_id", "created_at", "id"),
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
@@ -1,13 +1,42 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, func
+from sqlalchemy import Column, Integer, String, Text, DateTime, Float, Boolean, Index, func, text
 from server.db import Base
-from sqlalchemy.dialects.postgresql import JSON
+from sqlalchemy.dialects.postgresql import JSONB
 
 class ToolCall(Base):
     __tablename__ = "tool_calls"
 
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     session_id = Column(String, index=True)
     name = Column(String, nullable=False)
-    args_json = Column(JSON, nullable=False)
-    result_json = Column(JSON, nullable=False)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # Native JSON objects (the legacy args_json/result_json held double-encoded strings)
+    args = Column(JSONB, nullable=False)
+    result = Column(JSONB, nullable=False)
+    # Partition key (monthly partitions, see server/partitions.py), hence part of the primary key
+    created_at = Column(DateTime(timezone=True), primary_key=True, server_default=func.now())
+
+    # One row per tool invocation, keyed by the LangChain run id (NULL on agent_summary rows)
+    run_id = Column(String)
+    parent_run_id = Column(String)
+    request_id = Column(String, index=True)  # trace id of the chat request
+    started_at = Column(DateTime(timezone=True))
+    ended_at = Column(DateTime(timezone=True))
+    duration_ms = Column(Float)
+    is_error = Column(Boolean, nullable=False, server_default=text("false"))
+    # Tokens of the LLM step that asked for this tool (shared by the parallel calls of
+    # that step); on agent_summary rows, the totals of the whole request
+    llm_step = Column(Integer)
+    prompt_tokens = Column(Integer)
+    completion_tokens = Column(Integer)
+
+    __table_args__ = (
+        # Not unique: a unique index on a partitioned table must include created_at
+        Index("ix_tool_calls_run_id", "run_id"),
+        # Time-window latency stats (/stats/tools)
+        Index("ix_tool_calls_created_at_name", "created_at", "name", postgresql_where=text("run_id IS NOT NULL")),
+        Index("ix_tool_calls_name_created_at", "name", "created_at"),
+        # Payload containment lookups (args @> '{"customer_id": 2}'); the ISBN and
+        # order_id expression indexes need SQL functions and live in migrations.py
+        Index("ix_tool_calls_args_gin", "args", postgresql_using="gin", postgresql_ops={"args": "jsonb_path_ops"}),
+        Index("ix_tool_calls_result_gin", "result", postgresql_using="gin", postgresql_ops={"result": "jsonb_path_ops"}),
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
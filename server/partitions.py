@@ -0,0 +1,89 @@
+import logging
+import re
+from datetime import date, datetime, timezone
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+
+logger = logging.getLogger(__name__)
+
+# Audit tables range-partitioned by month on created_at
+PARTITIONED_TABLES = ("messages", "tool_calls")
+
+_PARTITION_NAME = re.compile(r"^(?P<table>\w+)_p(?P<year>\d{4})_(?P<month>\d{2})$")
+
+_IS_PARTITIONED = text("""
+    SELECT c.relkind = 'p' FROM pg_class c
+    WHERE c.oid = to_regclass(:table)
+""")
+
+_PARTITIONS = text("""
+    SELECT child.relname
+    FROM pg_inherits i
+    JOIN pg_class parent ON parent.oid = i.inhparent
+    JOIN pg_class child ON child.oid = i.inhrelid
+    WHERE parent.relname = :table
+    ORDER BY child.relname
+""")
+
+
+def month_start(day: date) -> date:
+    return date(day.year, day.month, 1)
+
+
+def add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(table: str, month: date) -> str:
+    return f"{table}_p{month.year:04d}_{month.month:02d}"
+
+
+def partition_month(name: str):
+    """Month a partition covers, from its name; None for the default partition."""
+    m = _PARTITION_NAME.match(name)
+    return date(int(m.group("year")), int(m.group("month")), 1) if m else None
+
+
+def is_partitioned(conn, table: str) -> bool:
+    return bool(conn.execute(_IS_PARTITIONED, {"table": table}).scalar())
+
+
+def list_partitions(conn, table: str):
+    """[(partition name, first day of its month or None for the default partition)], oldest first."""
+    names = conn.execute(_PARTITIONS, {"table": table}).scalars().all()
+    return sorted(((n, partition_month(n)) for n in names), key=lambda p: (p[1] is not None, p[1] or date.min))
+
+
+def create_month_partition(conn, table: str, month: date):
+    """Create the partition holding `month` (UTC month bounds) unless it exists."""
+    upper = add_months(month, 1)
+    conn.execute(text(
+        f"CREATE TABLE IF NOT EXISTS {partition_name(table, month)} PARTITION OF {table} "
+        f"FOR VALUES FROM ('{month.isoformat()} 00:00:00+00') TO ('{upper.isoformat()} 00:00:00+00')"
+    ))
+
+
+def ensure_partitions(conn, months_ahead: int = 2, tables=PARTITIONED_TABLES):
+    """
+    Make sure every partitioned audit table has its default partition and a
+    partition for the current month and the next `months_ahead` months.
+
+    Runs on every startup (from run_migrations) and from the retention
+    command; tables that are not partitioned yet are skipped. Rows that fall
+    outside every month partition, such as restored archives, land in the
+    default partition.
+    """
+    current = month_start(datetime.now(timezone.utc).date())
+    for table in tables:
+        if not is_partitioned(conn, table):
+            continue
+        conn.execute(text(f"CREATE TABLE IF NOT EXISTS {table}_default PARTITION OF {table} DEFAULT"))
+        for offset in range(months_ahead + 1):
+            month = add_months(current, offset)
+            try:
+                with conn.begin_nested():
+                    create_month_partition(conn, table, month)
+            except DBAPIError as e:
+                # The default partition already holds rows of that month; they stay there
+                logger.warning("Could not create %s: %s", partition_name(table, month), e.orig)
@@ -0,0 +1,324 @@
+"""
+Partition maintenance, retention and archives of the audit tables (messages, tool_calls).
+
+    python -m server.retention partition          # one-off: convert existing tables
+    python -m server.retention maintain           # daily: create partitions, archive + drop expired ones
+    python -m server.retention restore <session>  # load an archived session back
+    python -m server.retention list
+"""
+import argparse
+import glob
+import gzip
+import json
+import os
+from datetime import date, datetime, timedelta, timezone
+from sqlalchemy import text
+from sqlalchemy.dialects.postgresql import insert
+from server.db import maintenance_engine
+from server.config import get_settings
+from server.models.message import Message
+from server.models.tool_call import ToolCall
+from server.migrations import run_migrations, build_indexes, backfill_tool_call_payloads
+from server.partitions import (
+    PARTITIONED_TABLES, add_months, month_start, create_month_partition,
+    ensure_partitions, is_partitioned, list_partitions,
+)
+
+MODELS = {"messages": Message, "tool_calls": ToolCall}
+DATETIME_COLUMNS = ("created_at", "started_at", "ended_at")
+BATCH_SIZE = 1000
+
+_TABLE_INDEXES = text("""
+    SELECT i.relname AS index_name, con.conname AS constraint_name
+    FROM pg_index x
+    JOIN pg_class i ON i.oid = x.indexrelid
+    LEFT JOIN pg_constraint con ON con.conindid = x.indexrelid AND con.conrelid = x.indrelid
+    WHERE x.indrelid = to_regclass(:table)
+""")
+
+
+# --- Converting existing tables ---
+
+def convert_to_partitioned(table: str, months_ahead: int) -> int:
+    """
+    Replace an unpartitioned audit table by a partitioned one holding the same rows.
+
+    Runs in one transaction holding an exclusive lock on the table, so log
+    writes wait until it is done. The new table, its partitions and its
+    indexes come from the model; ids keep counting from the old sequence.
+    Returns the number of rows moved (0 if the table was already partitioned).
+    """
+    model_table = MODELS[table].__table__
+    legacy = f"{table}_unpartitioned"
+    with maintenance_engine.begin() as conn:
+        if is_partitioned(conn, table):
+            return 0
+        conn.execute(text(f"LOCK TABLE {table} IN ACCESS EXCLUSIVE MODE"))
+        conn.execute(text(f"ALTER TABLE {table} RENAME TO {legacy}"))
+        # Index and constraint names are per schema; free them for the new table
+        for index_name, constraint_name in conn.execute(_TABLE_INDEXES, {"table": legacy}).all():
+            if constraint_name:
+                conn.execute(text(f"ALTER TABLE {legacy} DROP CONSTRAINT {constraint_name}"))
+            else:
+                conn.execute(text(f"DROP INDEX {index_name}"))
+
+        model_table.create(conn)
+        oldest, newest = conn.execute(text(f"SELECT min(created_at), max(created_at) FROM {legacy}")).one()
+        if oldest is not None:
+            month = month_start(oldest.astimezone(timezone.utc).date())
+            while month <= month_start(newest.astimezone(timezone.utc).date()):
+                create_month_partition(conn, table, month)
+                month = add_months(month, 1)
+        ensure_partitions(conn, months_ahead, tables=(table,))
+
+        columns = [c.name for c in model_table.columns]
+        selected = ["coalesce(created_at, now())" if c == "created_at" else c for c in columns]
+        moved = conn.execute(text(
+            f"INSERT INTO {table} ({', '.join(columns)}) SELECT {', '.join(selected)} FROM {legacy}"
+        )).rowcount
+        conn.execute(text(
+            f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), "
+            f"(SELECT coalesce(max(id), 0) + 1 FROM {table}), false)"
+        ))
+        conn.execute(text(f"DROP TABLE {legacy}"))
+    return moved
+
+
+def partition_tables(months_ahead: int) -> dict:
+    """Convert both audit tables, then re-apply the migrations and build the expression indexes."""
+    # Legacy tool call payloads must be decoded first; the new table has no columns for them
+    backfill_tool_call_payloads()
+    moved = {table: convert_to_partitioned(table, months_ahead) for table in PARTITIONED_TABLES}
+    run_migrations()
+    build_indexes()
+    return moved
+
+
+# --- Archiving expired partitions ---
+
+def retention_bound(retention_days: int) -> date:
+    """First day of the oldest month still inside the retention window; older months expire."""
+    return month_start((datetime.now(timezone.utc) - timedelta(days=retention_days)).date())
+
+
+def _bound_timestamp(bound: date) -> datetime:
+    return datetime(bound.year, bound.month, 1, tzinfo=timezone.utc)
+
+
+def expired_partitions(conn, table: str, retention_days: int):
+    """Month partitions whose whole month is older than the retention window."""
+    bound = retention_bound(retention_days)
+    return [
+        (name, month) for name, month in list_partitions(conn, table)
+        if month is not None and month < bound
+    ]
+
+
+def expired_default_rows(conn, table: str, retention_days: int) -> int:
+    """Rows of the default partition (restored sessions, months without a partition) past retention."""
+    return conn.execute(
+        text(f"SELECT count(*) FROM {table}_default WHERE created_at < :bound"),
+        {"bound": _bound_timestamp(retention_bound(retention_days))},
+    ).scalar_one()
+
+
+def _export_rows(conn, query: str, params: dict, table: str, label: str, directory: str,
+                 keep_empty: bool = True) -> int:
+    """
+    Write the (session_id, row json) results of `query` to `<label>.ndjson.gz`.
+
+    A `<label>.sessions.json` sidecar, written once the archive is complete,
+    lists its sessions so a restore only opens the files it needs. Returns the
+    number of rows written.
+    """
+    path = os.path.join(directory, f"{label}.ndjson.gz")
+    rows, sessions = 0, set()
+    result = conn.execution_options(stream_results=True, yield_per=BATCH_SIZE).execute(text(query), params)
+    with gzip.open(path + ".tmp", "wt", encoding="utf-8") as f:
+        for session_id, line in result:
+            f.write(line + "\n")
+            rows += 1
+            if session_id:
+                sessions.add(session_id)
+
+    if not rows and not keep_empty:
+        os.remove(path + ".tmp")
+        return 0
+    os.replace(path + ".tmp", path)
+    with open(os.path.join(directory, f"{label}.sessions.json"), "w", encoding="utf-8") as f:
+        json.dump({"table": table, "partition": label, "rows": rows, "sessions": sorted(sessions)}, f)
+    return rows
+
+
+def archive_partition(table: str, name: str, archive_dir: str) -> dict:
+    """
+    Export one partition to `<archive_dir>/<table>/<partition>.ndjson.gz`, then drop it.
+
+    A `<partition>.sessions.json` sidecar, written once the archive is
+    complete, lists its sessions so a restore only opens the files it needs.
+    The partition is dropped only after both are on disk, and not at all if
+    its row count changed during the export.
+    """
+    directory = os.path.join(archive_dir, table)
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{name}.ndjson.gz")
+
+    with maintenance_engine.connect() as conn:
+        rows = _export_rows(conn, f"SELECT session_id, row_to_json(t)::text FROM {name} t ORDER BY id", {},
+                            table, name, directory)
+
+    with maintenance_engine.begin() as conn:
+        current = conn.execute(text(f"SELECT count(*) FROM {name}")).scalar_one()
+        if current != rows:
+            return {"partition": name, "path": path, "rows": rows, "dropped": False}
+        conn.execute(text(f"DROP TABLE {name}"))
+    return {"partition": name, "path": path, "rows": rows, "dropped": True}
+
+
+def archive_default_rows(table: str, retention_days: int, archive_dir: str) -> dict:
+    """
+    Export the default partition's rows past retention to an archive file, then delete them.
+
+    Export and delete run in one repeatable-read transaction, so exactly the
+    exported rows are deleted; rows written meanwhile stay for the next run.
+    Restored sessions therefore expire again like any other row.
+    """
+    bound = retention_bound(retention_days)
+    name = f"{table}_default"
+    label = f"{name}_before_{bound.year:04d}_{bound.month:02d}_{datetime.now(timezone.utc):%Y%m%dT%H%M%S}"
+    directory = os.path.join(archive_dir, table)
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{label}.ndjson.gz")
+    params = {"bound": _bound_timestamp(bound)}
+
+    with maintenance_engine.connect() as conn:
+        conn = conn.execution_options(isolation_level="REPEATABLE READ")
+        with conn.begin():
+            rows = _export_rows(
+                conn, f"SELECT session_id, row_to_json(t)::text FROM {name} t WHERE created_at < :bound ORDER BY id",
+                params, table, label, directory, keep_empty=False,
+            )
+            try:
+                if rows:
+                    conn.execute(text(f"DELETE FROM {name} WHERE created_at < :bound"), params)
+            except Exception:
+                # The rows stay in the table; drop the archive that would duplicate them
+                for leftover in (path, os.path.join(directory, f"{label}.sessions.json")):
+                    if os.path.exists(leftover):
+                        os.remove(leftover)
+                raise
+    return {"partition": name, "path": path, "rows": rows, "dropped": True}
+
+
+def maintain(retention_days: int, archive_dir: str, months_ahead: int, dry_run: bool = False) -> list:
+    """
+    Create upcoming partitions, then archive and drop those past the retention window.
+
+    Expired rows of the default partition (restored sessions, or months that
+    never got their own partition) are archived and deleted as well.
+    """
+    with maintenance_engine.begin() as conn:
+        ensure_partitions(conn, months_ahead)
+    if retention_days <= 0:
+        return []
+
+    archived = []
+    for table in PARTITIONED_TABLES:
+        with maintenance_engine.connect() as conn:
+            if not is_partitioned(conn, table):
+                continue
+            expired = expired_partitions(conn, table, retention_days)
+            default_rows = expired_default_rows(conn, table, retention_days)
+        for name, _month in expired:
+            if dry_run:
+                archived.append({"partition": name, "dropped": False})
+            else:
+                archived.append(archive_partition(table, name, archive_dir))
+        if default_rows:
+            if dry_run:
+                archived.append({"partition": f"{table}_default", "rows": default_rows, "dropped": False})
+            else:
+                archived.append(archive_default_rows(table, retention_days, archive_dir))
+    return archived
+
+
+# --- Restoring a session ---
+
+def _read_archive(path: str, session_id: str):
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            row = json.loads(line)
+            if row.get("session_id") == session_id:
+                yield row
+
+
+def _to_model_row(row: dict, columns) -> dict:
+    values = {k: v for k, v in row.items() if k in columns}
+    for key in DATETIME_COLUMNS:
+        if isinstance(values.get(key), str):
+            values[key] = datetime.fromisoformat(values[key])
+    return values
+
+
+def restore_session(session_id: str, archive_dir: str) -> dict:
+    """
+    Insert the archived messages and tool calls of one session back into the live tables.
+
+    Their months no longer have partitions, so the rows go to the default
+    partition, where the next `maintain` archives them again. Rows already
+    present are skipped, so restoring twice is harmless.
+    """
+    restored = {}
+    for table, model in MODELS.items():
+        columns = set(model.__table__.columns.keys())
+        count = 0
+        for sidecar in sorted(glob.glob(os.path.join(archive_dir, table, "*.sessions.json"))):
+            with open(sidecar, "r", encoding="utf-8") as f:
+                if session_id not in json.load(f)["sessions"]:
+                    continue
+            rows = [_to_model_row(r, columns) for r in _read_archive(sidecar.replace(".sessions.json", ".ndjson.gz"), session_id)]
+            with maintenance_engine.begin() as conn:
+                for start in range(0, len(rows), BATCH_SIZE):
+                    batch = rows[start:start + BATCH_SIZE]
+                    count += conn.execute(insert(model).values(batch).on_conflict_do_nothing()).rowcount
+        restored[table] = count
+    return restored
+
+
+if __name__ == "__main__":
+    settings = get_settings()
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("partition", help="Convert existing messages/tool_calls tables to monthly partitions")
+    maintain_parser = sub.add_parser("maintain", help="Create upcoming partitions, archive and drop expired ones")
+    maintain_parser.add_argument("--retention-days", type=int, default=settings.RETENTION_DAYS)
+    maintain_parser.add_argument("--dry-run", action="store_true", help="Only list the partitions that would be archived")
+    restore_parser = sub.add_parser("restore", help="Load an archived session back into the live tables")
+    restore_parser.add_argument("session_id")
+    sub.add_parser("list", help="List partitions and archive files")
+    args = parser.parse_args()
+
+    if args.command == "partition":
+        for table, moved in partition_tables(settings.PARTITION_MONTHS_AHEAD).items():
+            print(f"{table}: {moved} rows moved" if moved else f"{table}: already partitioned")
+    elif args.command == "maintain":
+        for entry in maintain(args.retention_days, settings.ARCHIVE_DIR, settings.PARTITION_MONTHS_AHEAD, args.dry_run):
+            if args.dry_run:
+                rows = f" ({entry['rows']} expired rows)" if "rows" in entry else ""
+                print(f"would archive {entry['partition']}{rows}")
+            else:
+                state = "dropped" if entry["dropped"] else "kept (rows changed during export)"
+                print(f"{entry['partition']}: {entry['rows']} rows → {entry['path']}, {state}")
+    elif args.command == "restore":
+        for table, count in restore_session(args.session_id, settings.ARCHIVE_DIR).items():
+            print(f"{table}: {count} rows restored")
+    else:
+        with maintenance_engine.connect() as conn:
+            for table in PARTITIONED_TABLES:
+                if not is_partitioned(conn, table):
+                    print(f"{table}: not partitioned (run `python -m server.retention partition`)")
+                    continue
+                for name, _month in list_partitions(conn, table):
+                    print(f"{table}: {name}")
+        for path in sorted(glob.glob(os.path.join(settings.ARCHIVE_DIR, "*", "*.ndjson.gz"))):
+            print(f"archive: {path}")
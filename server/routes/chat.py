@@ -1,11 +1,126 @@
-from fastapi import APIRouter, Body
-from server.agent.runner import run_agent_query
+import asyncio
+import threading
+import uuid
+from fastapi import APIRouter, Body, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from server.agent.runner import run_agent_query, arun_agent_query
+from server.agent.registry import current_settings
+from server.agent.pool import get_agent_pool, PoolSaturated
+from server.agent.streaming import StreamEventHandler, FINAL_ANSWER_MARKER, format_sse
 
 router = APIRouter()
 
+# How often the stream checks whether the client is still connected
+DISCONNECT_POLL_SECONDS = 1.0
+
+
+class _StreamResponse(StreamingResponse):
+    """StreamingResponse that runs `on_close` when it ends, even if the body was never iterated."""
+
+    def __init__(self, content, on_close, **kwargs):
+        super().__init__(content, **kwargs)
+        self._on_close = on_close
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self._on_close()
+
+
+def _busy(e: PoolSaturated) -> HTTPException:
+    return HTTPException(
+        status_code=503,
+        detail="The assistant is busy, please retry shortly.",
+        headers={"Retry-After": str(e.retry_after)},
+    )
+
+
 @router.post("/chat")
 async def chat_endpoint(payload: dict = Body(...)):
     query = payload.get("query")
     session_id = payload.get("session_id")  # optional
-    result = run_agent_query(query, session_id)
-    return result
\ No newline at end of file
+    try:
+        if current_settings().AGENT_ASYNC:
+            # Native async tools: many conversations share the event loop
+            result = await get_agent_pool().run_async(arun_agent_query, query, session_id)
+        else:
+            # Agent runs are blocking; keep them off the event loop
+            result = await get_agent_pool().run(run_agent_query, query, session_id)
+    except PoolSaturated as e:
+        raise _busy(e)
+    return result
+
+
+@router.post("/chat/stream")
+async def chat_stream_endpoint(request: Request, payload: dict = Body(...)):
+    """Run the agent and stream tool steps, answer tokens and the summary as SSE."""
+    query = payload.get("query")
+    session_id = payload.get("session_id") or str(uuid.uuid4())
+
+    loop = asyncio.get_running_loop()
+    events = asyncio.Queue()
+    cancelled = threading.Event()
+
+    def emit(event, data):
+        loop.call_soon_threadsafe(events.put_nowait, (event, data))
+
+    # Tool-calling agents have no "Final Answer:" marker; all content tokens are the answer
+    marker = None if current_settings().AGENT_MODE == "tools" else FINAL_ANSWER_MARKER
+
+    def run():
+        # The client left while the run was queued: do not start an LLM run for nobody
+        if cancelled.is_set():
+            return
+        try:
+            result = run_agent_query(
+                query, session_id,
+                callbacks=[StreamEventHandler(emit, cancelled, answer_marker=marker)],
+                streaming=True,
+            )
+            emit("result", result)
+        except Exception as e:
+            emit("result", {"session_id": session_id, "error": str(e)})
+
+    try:
+        # Admission happens here so a full pool still answers 503, not an empty stream
+        future = get_agent_pool().submit(run)
+    except PoolSaturated as e:
+        raise _busy(e)
+
+    def stop():
+        # Stops the chain at its next step; a run still queued gives back its pool slot
+        cancelled.set()
+        future.cancel()
+
+    async def event_stream():
+        try:
+            yield format_sse("start", {"session_id": session_id})
+            while True:
+                try:
+                    event, data = await asyncio.wait_for(events.get(), DISCONNECT_POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        return
+                    continue
+
+                if event != "result":
+                    yield format_sse(event, data)
+                    continue
+
+                if "error" in data:
+                    yield format_sse("error", {"error": data["error"]})
+                else:
+                    yield format_sse("summary", {"summary": data.get("summary")})
+                yield format_sse("done", data)
+                return
+        finally:
+            # Client gone or stream finished
+            stop()
+
+    return _StreamResponse(
+        event_stream(),
+        on_close=stop,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -1,23 +1,37 @@
-from fastapi import APIRouter
+from datetime import datetime
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Query
 from server.db import SessionLocal
-from server.models.message import Message
+from server.services.history import (
+    DEFAULT_LIMIT, MAX_LIMIT, message_page_statement, parse_message_cursor, format_page,
+)
 
 router = APIRouter(prefix="/messages", tags=["Messages"])
 
 @router.get("/{session_id}")
-def get_messages(session_id: str):
-    """Return structured messages for a session."""
+def get_messages(
+    session_id: str,
+    limit: int = Query(DEFAULT_LIMIT, ge=1, le=MAX_LIMIT),
+    before: Optional[str] = Query(None, description="prev_cursor of a page: older messages"),
+    after: Optional[str] = Query(None, description="next_cursor of a page: newer messages"),
+    since: Optional[datetime] = Query(None, description="Only messages created after this timestamp"),
+):
+    """Return one page of a session's messages, oldest first (the newest page by default)."""
+    if sum(v is not None for v in (before, after, since)) > 1:
+        raise HTTPException(status_code=400, detail="Use only one of before, after or since.")
+
+    positions = {}
+    for name, cursor in (("before", before), ("after", after)):
+        if cursor is not None:
+            positions[name] = parse_message_cursor(cursor)
+            if positions[name] is None:
+                raise HTTPException(status_code=400, detail=f"Invalid {name} cursor.")
+
     db = SessionLocal()
     try:
-        messages = (
-            db.query(Message)
-            .filter(Message.session_id == session_id)
-            .order_by(Message.created_at.asc())
-            .all()
-        )
-        return [
-            {"role": m.role, "content": m.content, "created_at": m.created_at.isoformat()}
-            for m in messages
-        ]
+        stmt = message_page_statement(session_id, limit, since=since, **positions)
+        rows = db.execute(stmt).scalars().all()
+        forward = after is not None or since is not None
+        return format_page(session_id, rows, limit, forward, after_cursor=after)
     finally:
         db.close()
@@ -0,0 +1,11 @@
+from fastapi import APIRouter, Response
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+import server.tracing  # noqa: F401  registers the metrics and SQL listeners
+
+router = APIRouter(tags=["Metrics"])
+
+
+@router.get("/metrics")
+def metrics():
+    """Prometheus exposition: request, LLM, tool and SQL latency histograms and token counters."""
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
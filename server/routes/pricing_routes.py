@@ -0,0 +1,21 @@
+from fastapi import APIRouter, HTTPException
+from server.db import SessionLocal
+from server.agent.cache import invalidate_all_books
+from server.services.pricing import BulkPriceRequest, apply_bulk_price
+
+router = APIRouter(prefix="/pricing", tags=["Pricing"])
+
+
+@router.post("/bulk")
+def bulk_update_prices(request: BulkPriceRequest):
+    """Preview (dry_run) or apply a filter-based price change in one statement."""
+    db = SessionLocal()
+    try:
+        result = apply_bulk_price(db, request)
+        if "error" in result:
+            raise HTTPException(status_code=400, detail=result["error"])
+        if not request.dry_run and result["affected"]:
+            invalidate_all_books()
+        return result
+    finally:
+        db.close()
@@ -1,34 +1,22 @@
-from fastapi import APIRouter
-from sqlalchemy import func
+from typing import Optional
+from fastapi import APIRouter, Query
 from server.db import SessionLocal
-from server.models.message import Message
+from server.services.sessions import (
+    DEFAULT_LIMIT, MAX_LIMIT, session_page_statement, format_session_page,
+)
 
 router = APIRouter(prefix="/sessions", tags=["Sessions"])
 
 
 @router.get("/")
-def list_sessions():
-    """List all chat sessions, sorted by most recent message timestamp."""
+def list_sessions(
+    limit: int = Query(DEFAULT_LIMIT, ge=1, le=MAX_LIMIT),
+    cursor: Optional[str] = Query(None, description="next_cursor of the previous page"),
+):
+    """List chat sessions from the sessions table, most recent activity first."""
     db = SessionLocal()
     try:
-        # Aggregate latest message per session
-        sessions = (
-            db.query(
-                Message.session_id,
-                func.max(Message.created_at).label("last_activity"),
-            )
-            .group_by(Message.session_id)
-            .order_by(func.max(Message.created_at).desc())
-            .all()
-        )
-
-        # Return structured results
-        return [
-            {
-                "session_id": s.session_id,
-                "last_activity": s.last_activity.isoformat() if s.last_activity else None,
-            }
-            for s in sessions
-        ]
+        rows = db.execute(session_page_statement(limit, cursor)).scalars().all()
+        return format_session_page(rows, limit)
     finally:
         db.close()
@@ -0,0 +1,54 @@
+from datetime import datetime, timedelta, timezone
+from fastapi import APIRouter, Query
+from server.agent.pool import get_agent_pool
+from server.agent.log_writer import log_writer
+from server.agent.cache import cache_stats
+from server.db import pool_stats, SessionLocal
+from server.services.tool_stats import (
+    DEFAULT_WINDOW_MINUTES, MAX_WINDOW_MINUTES, tool_latency_statement, format_tool_stats,
+)
+from server.agent.router import fast_path_router
+
+router = APIRouter(prefix="/stats", tags=["Stats"])
+
+
+@router.get("/agent-pool")
+def agent_pool_stats():
+    """Return in-flight runs, queue depth and wait times of the agent pool."""
+    return get_agent_pool().stats()
+
+
+@router.get("/log-writer")
+def log_writer_stats():
+    """Return pending and written row counts of the write-behind audit log."""
+    return log_writer.stats()
+
+
+@router.get("/cache")
+def book_cache_stats():
+    """Return size, hits and misses of the shared book and search caches."""
+    return cache_stats()
+
+
+@router.get("/db-pool")
+def db_pool_stats():
+    """Return checked-out connections, overflow and checkout wait times of both engines."""
+    return pool_stats()
+
+
+@router.get("/router")
+def router_stats():
+    """Return how many chat queries the fast-path router answered without the agent."""
+    return fast_path_router.stats()
+
+
+@router.get("/tools")
+def tool_stats(minutes: int = Query(DEFAULT_WINDOW_MINUTES, ge=1, le=MAX_WINDOW_MINUTES)):
+    """Return per-tool call count, p50/p95 latency and error rate over the last `minutes`."""
+    since = datetime.now(timezone.utc) - timedelta(minutes=minutes)
+    db = SessionLocal()
+    try:
+        rows = db.execute(tool_latency_statement(since)).all()
+        return format_tool_stats(rows, since, minutes)
+    finally:
+        db.close()
@@ -0,0 +1,24 @@
+from typing import Optional
+from fastapi import APIRouter, Query
+from server.db import SessionLocal
+from server.services.tool_calls import (
+    DEFAULT_LIMIT, MAX_LIMIT, tool_call_lookup_statement, format_tool_call,
+)
+
+router = APIRouter(prefix="/tool-calls", tags=["Tool Calls"])
+
+
+@router.get("/")
+def list_tool_calls(
+    isbn: Optional[str] = Query(None, description="Calls whose arguments or result mention this ISBN"),
+    order_id: Optional[int] = Query(None, description="Calls that created or looked up this order"),
+    name: Optional[str] = Query(None, description="Tool name, e.g. restock_book"),
+    limit: int = Query(DEFAULT_LIMIT, ge=1, le=MAX_LIMIT),
+):
+    """Return the newest tool calls matching every given filter, from the payload indexes."""
+    db = SessionLocal()
+    try:
+        rows = db.execute(tool_call_lookup_statement(isbn, order_id, name, limit)).scalars().all()
+        return {"tool_calls": [format_tool_call(r) for r in rows]}
+    finally:
+        db.close()
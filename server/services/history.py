@@ -0,0 +1,74 @@
+from datetime import datetime
+from sqlalchemy import select, and_, or_
+from server.models.message import Message
+from server.services.pagination import encode_cursor, decode_cursor
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 200
+
+
+def message_cursor(message) -> str:
+    return encode_cursor([message.created_at.isoformat(), message.id])
+
+
+def parse_message_cursor(cursor: str):
+    """Return (created_at, id) from a message cursor, or None if it is invalid."""
+    values = decode_cursor(cursor, 2)
+    if values is None:
+        return None
+    try:
+        return datetime.fromisoformat(values[0]), int(values[1])
+    except (TypeError, ValueError):
+        return None
+
+
+def message_page_statement(session_id: str, limit: int, before=None, after=None, since=None):
+    """
+    One page of a session's messages, served by ix_messages_session_created_id.
+
+    `before` walks back from a (created_at, id) position, `after` and `since`
+    walk forward from a position or a timestamp; with none of them the newest
+    messages are returned. Rows come back in walking order and `limit + 1` are
+    fetched so the caller can tell whether the page is the last one.
+    """
+    stmt = select(Message).where(Message.session_id == session_id)
+    key = (Message.created_at, Message.id)
+
+    if after is not None:
+        created_at, message_id = after
+        stmt = stmt.where(or_(key[0] > created_at, and_(key[0] == created_at, key[1] > message_id)))
+    elif since is not None:
+        stmt = stmt.where(Message.created_at > since)
+
+    if after is not None or since is not None:
+        return stmt.order_by(key[0].asc(), key[1].asc()).limit(limit + 1)
+
+    if before is not None:
+        created_at, message_id = before
+        stmt = stmt.where(or_(key[0] < created_at, and_(key[0] == created_at, key[1] < message_id)))
+    return stmt.order_by(key[0].desc(), key[1].desc()).limit(limit + 1)
+
+
+def format_page(session_id: str, rows, limit: int, forward: bool, after_cursor=None) -> dict:
+    """
+    Shape a page oldest-first with cursors for both directions.
+
+    `prev_cursor` (pass as `before`) is set while older messages may exist;
+    `next_cursor` (pass as `after`) is the position to poll from for new ones.
+    """
+    has_more = len(rows) > limit
+    page = rows[:limit]
+    if not forward:
+        page.reverse()
+
+    older = bool(page) if forward else has_more
+    return {
+        "session_id": session_id,
+        "messages": [
+            {"id": m.id, "role": m.role, "content": m.content, "created_at": m.created_at.isoformat()}
+            for m in page
+        ],
+        "prev_cursor": message_cursor(page[0]) if page and older else None,
+        "next_cursor": message_cursor(page[-1]) if page else after_cursor,
+        "has_more": has_more if forward else False,
+    }
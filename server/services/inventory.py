@@ -0,0 +1,40 @@
+from sqlalchemy import select, func, and_, or_
+from server.models import Book
+from server.services.pagination import decode_cursor
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+SORT_ORDERS = ("asc", "desc")
+
+
+def low_stock_aggregates_statement(threshold: int):
+    """Counts, units and value of every book at or below `threshold`, computed in SQL."""
+    return select(
+        func.count().label("count"),
+        func.coalesce(func.sum(Book.stock), 0).label("units"),
+        func.coalesce(func.sum(Book.price * Book.stock), 0).label("value"),
+        func.count().filter(Book.stock <= 0).label("out_of_stock"),
+    ).where(Book.stock <= threshold)
+
+
+def low_stock_page_statement(threshold: int, limit: int, sort: str = "asc", cursor=None):
+    """
+    One page of low-stock books ordered by (stock, isbn), served by ix_books_stock_isbn.
+
+    Fetches `limit + 1` rows so the caller can tell whether another page exists.
+    """
+    stmt = select(Book.isbn, Book.title, Book.stock, Book.price).where(Book.stock <= threshold)
+
+    position = decode_cursor(cursor, 2) if cursor else None
+    if position and isinstance(position[0], int):
+        last_stock, last_isbn = position[0], str(position[1])
+        if sort == "desc":
+            stmt = stmt.where(or_(Book.stock < last_stock, and_(Book.stock == last_stock, Book.isbn < last_isbn)))
+        else:
+            stmt = stmt.where(or_(Book.stock > last_stock, and_(Book.stock == last_stock, Book.isbn > last_isbn)))
+
+    if sort == "desc":
+        stmt = stmt.order_by(Book.stock.desc(), Book.isbn.desc())
+    else:
+        stmt = stmt.order_by(Book.stock.asc(), Book.isbn.asc())
+    return stmt.limit(limit + 1)
@@ -0,0 +1,19 @@
+import base64
+import json
+
+
+def encode_cursor(values) -> str:
+    """Opaque keyset cursor for the last row of a page."""
+    raw = json.dumps(list(values), default=str).encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def decode_cursor(cursor: str, size: int):
+    """Return the `size` keyset values stored in `cursor`, or None if it is invalid."""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except Exception:
+        return None
+    if not isinstance(values, list) or len(values) != size:
+        return None
+    return values
@@ -0,0 +1,161 @@
+import json
+from typing import List, Literal, Optional
+from pydantic import BaseModel, Field
+from sqlalchemy import select, update, func, cast, literal, Float, Numeric
+from server.models import Book
+from server.services.search import normalize_text, search_expression
+
+
+class PriceFilter(BaseModel):
+    """Which books to reprice. Criteria are combined with AND."""
+    author: Optional[str] = Field(None, description="Accent-insensitive substring of the author")
+    title: Optional[str] = Field(None, description="Accent-insensitive substring of the title")
+    isbns: Optional[List[str]] = Field(None, description="Explicit list of ISBNs")
+    min_stock: Optional[int] = Field(None, description="Only books with stock >= min_stock")
+    max_stock: Optional[int] = Field(None, description="Only books with stock <= max_stock")
+    all: bool = Field(False, description="Must be true to reprice the whole catalog without other criteria")
+
+
+class PriceOperation(BaseModel):
+    """How to compute the new price from the old one."""
+    op: Literal["set", "percent", "delta"] = Field(..., description="set to value, change by value %, or add value")
+    value: float
+    rounding: Literal["none", "cents", "whole", "x.99"] = Field("cents", description="Rounding applied to the result")
+
+
+class BulkPriceRequest(BaseModel):
+    filter: PriceFilter
+    operation: PriceOperation
+    dry_run: bool = Field(False, description="Only report what would change")
+    sample_size: int = Field(5, ge=0, le=50, description="How many changed rows to include in the diff")
+
+
+def price_conditions(f: PriceFilter) -> list:
+    conditions = []
+    if f.author:
+        conditions.append(search_expression(Book.author).contains(normalize_text(f.author), autoescape=True))
+    if f.title:
+        conditions.append(search_expression(Book.title).contains(normalize_text(f.title), autoescape=True))
+    if f.isbns:
+        conditions.append(Book.isbn.in_(f.isbns))
+    if f.min_stock is not None:
+        conditions.append(Book.stock >= f.min_stock)
+    if f.max_stock is not None:
+        conditions.append(Book.stock <= f.max_stock)
+    return conditions
+
+
+def new_price_expression(old_price, operation: PriceOperation):
+    """SQL expression for the new price; never below zero."""
+    if operation.op == "set":
+        price = literal(operation.value, Float)
+    elif operation.op == "percent":
+        price = old_price * (1 + operation.value / 100)
+    else:
+        price = old_price + operation.value
+
+    price = cast(func.greatest(price, 0), Numeric)
+    if operation.rounding == "cents":
+        price = func.round(price, 2)
+    elif operation.rounding == "whole":
+        price = func.round(price, 0)
+    elif operation.rounding == "x.99":
+        price = func.greatest(func.ceil(price) - 0.01, 0.99)
+    return cast(price, Float)
+
+
+def _changed_rows(request: BulkPriceRequest, conditions):
+    """CTE of (isbn, old_price, new_price): a plain SELECT for dry runs, UPDATE ... RETURNING otherwise."""
+    if request.dry_run:
+        return (
+            select(
+                Book.isbn,
+                Book.price.label("old_price"),
+                new_price_expression(Book.price, request.operation).label("new_price"),
+            )
+            .where(*conditions)
+            .cte("changed")
+        )
+
+    old = select(Book.isbn, Book.price.label("old_price")).where(*conditions).subquery("old")
+    return (
+        update(Book.__table__)
+        .where(Book.isbn == old.c.isbn)
+        .values(price=new_price_expression(old.c.old_price, request.operation))
+        .returning(Book.isbn, old.c.old_price, Book.price.label("new_price"))
+        .cte("changed")
+    )
+
+
+def bulk_price_statement(request: BulkPriceRequest, conditions):
+    """
+    One statement that (optionally) applies the change and returns a compact diff:
+    affected count, total and price ranges, plus the first `sample_size` rows.
+    """
+    changed = _changed_rows(request, conditions)
+    sample = (
+        select(changed.c.isbn, changed.c.old_price, changed.c.new_price)
+        .order_by(changed.c.isbn)
+        .limit(request.sample_size)
+        .subquery("sample")
+    )
+    return select(
+        func.count().label("affected"),
+        func.coalesce(func.sum(changed.c.new_price - changed.c.old_price), 0).label("total_change"),
+        func.min(changed.c.old_price).label("old_min"),
+        func.max(changed.c.old_price).label("old_max"),
+        func.min(changed.c.new_price).label("new_min"),
+        func.max(changed.c.new_price).label("new_max"),
+        select(func.json_agg(sample.table_valued())).scalar_subquery().label("sample"),
+    ).select_from(changed)
+
+
+def validate_request(request: BulkPriceRequest):
+    """Return the filter conditions, or an error dict if the request is unsafe."""
+    conditions = price_conditions(request.filter)
+    if not conditions and not request.filter.all:
+        return {"error": "Refusing to reprice every book: add a filter or set filter.all = true."}
+    return conditions
+
+
+def format_result(request: BulkPriceRequest, row) -> dict:
+    sample = row.sample or []
+    if isinstance(sample, str):
+        # asyncpg hands json back as text
+        sample = json.loads(sample)
+    return {
+        "dry_run": request.dry_run,
+        "affected": row.affected,
+        "total_change": round(row.total_change or 0, 2),
+        "old_price_range": [row.old_min, row.old_max],
+        "new_price_range": [row.new_min, row.new_max],
+        "sample": sample,
+    }
+
+
+def apply_bulk_price(db, request: BulkPriceRequest) -> dict:
+    """Preview or apply a bulk price change with one set-based statement."""
+    conditions = validate_request(request)
+    if isinstance(conditions, dict):
+        return conditions
+
+    row = db.execute(bulk_price_statement(request, conditions)).one()
+    if request.dry_run:
+        db.rollback()
+    else:
+        db.commit()
+    return format_result(request, row)
+
+
+async def aapply_bulk_price(db, request: BulkPriceRequest) -> dict:
+    """Async variant of apply_bulk_price."""
+    conditions = validate_request(request)
+    if isinstance(conditions, dict):
+        return conditions
+
+    row = (await db.execute(bulk_price_statement(request, conditions))).one()
+    if request.dry_run:
+        await db.rollback()
+    else:
+        await db.commit()
+    return format_result(request, row)
@@ -0,0 +1,65 @@
+import unicodedata
+from typing import Optional
+from sqlalchemy import Float, or_, and_, cast, func, select
+from server.models import Book
+from server.services.pagination import decode_cursor
+
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 50
+
+# Letters that unaccent() expands but NFKD leaves alone
+_UNACCENT_EXTRA = str.maketrans({"ß": "ss", "æ": "ae", "œ": "oe", "ø": "o", "ł": "l", "đ": "d"})
+
+
+def normalize_text(text: str) -> str:
+    """Lowercase and strip accents the same way as lower(f_unaccent(col)) in SQL."""
+    if not text:
+        return ""
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    text = text.replace("’", "'").replace("“", '"').replace("”", '"')
+    return text.strip().lower().translate(_UNACCENT_EXTRA)
+
+
+def search_expression(column):
+    """SQL side of normalize_text; matches the trigram indexes on books."""
+    return func.lower(func.f_unaccent(column))
+
+
+def _escape_like(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def build_search_query(q: str, by: str = "title", limit: int = DEFAULT_LIMIT, cursor: Optional[str] = None):
+    """
+    Ranked catalog search.
+
+    Substring matches on the normalized title/author (served by the pg_trgm GIN
+    indexes), ordered by trigram similarity and then ISBN. Fetches `limit + 1`
+    rows so the caller can tell whether another page exists.
+    """
+    q = normalize_text(q)
+    if by == "author":
+        fields = [search_expression(Book.author)]
+    elif by == "title":
+        fields = [search_expression(Book.title)]
+    else:
+        fields = [search_expression(Book.title), search_expression(Book.author)]
+
+    pattern = f"%{_escape_like(q)}%"
+    condition = or_(*(f.like(pattern) for f in fields))
+    score = func.similarity(fields[0], q) if len(fields) == 1 else func.greatest(
+        *(func.similarity(f, q) for f in fields)
+    )
+    # similarity() is real; as double precision the score survives the cursor
+    # round trip exactly, so rows tied with the last one of a page are not skipped
+    score = cast(score, Float)
+
+    stmt = select(Book, score.label("score")).where(condition)
+
+    position = decode_cursor(cursor, 2) if cursor else None
+    if position and isinstance(position[0], (int, float)):
+        last_score, last_isbn = float(position[0]), str(position[1])
+        stmt = stmt.where(or_(score < last_score, and_(score == last_score, Book.isbn > last_isbn)))
+
+    return stmt.order_by(score.desc(), Book.isbn).limit(limit + 1)
@@ -0,0 +1,86 @@
+from datetime import datetime
+from sqlalchemy import select, func, and_, or_
+from sqlalchemy.dialects.postgresql import insert
+from server.models.chat_session import ChatSession
+from server.services.pagination import encode_cursor, decode_cursor
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+TITLE_LENGTH = 80
+
+
+def session_rollup_statement(message_rows: list):
+    """
+    Upsert the `sessions` rows touched by a batch of message rows.
+
+    The batch is folded per session in Python first, so each session costs one
+    row of a single INSERT ... ON CONFLICT regardless of how many messages it got.
+    """
+    sessions = {}
+    for row in message_rows:
+        session_id = row.get("session_id")
+        if not session_id:
+            continue
+        s = sessions.setdefault(session_id, {
+            "id": session_id, "title": None, "message_count": 0,
+            "created_at": row["created_at"], "last_activity": row["created_at"],
+        })
+        s["message_count"] += 1
+        s["created_at"] = min(s["created_at"], row["created_at"])
+        s["last_activity"] = max(s["last_activity"], row["created_at"])
+        if s["title"] is None and row.get("role") == "user":
+            s["title"] = row["content"][:TITLE_LENGTH]
+
+    if not sessions:
+        return None
+
+    # Sorted so concurrent writers lock session rows in the same order
+    stmt = insert(ChatSession).values([sessions[k] for k in sorted(sessions)])
+    table = ChatSession.__table__
+    return stmt.on_conflict_do_update(
+        index_elements=[table.c.id],
+        set_={
+            "message_count": table.c.message_count + stmt.excluded.message_count,
+            "last_activity": func.greatest(table.c.last_activity, stmt.excluded.last_activity),
+            "title": func.coalesce(table.c.title, stmt.excluded.title),
+        },
+    )
+
+
+def session_page_statement(limit: int, cursor=None):
+    """One page of sessions, most recent activity first, served by ix_sessions_last_activity_id."""
+    stmt = select(ChatSession)
+
+    position = decode_cursor(cursor, 2) if cursor else None
+    if position:
+        try:
+            last_activity, last_id = datetime.fromisoformat(position[0]), str(position[1])
+        except (TypeError, ValueError):
+            last_activity = None
+        if last_activity is not None:
+            stmt = stmt.where(or_(
+                ChatSession.last_activity < last_activity,
+                and_(ChatSession.last_activity == last_activity, ChatSession.id < last_id),
+            ))
+
+    return stmt.order_by(ChatSession.last_activity.desc(), ChatSession.id.desc()).limit(limit + 1)
+
+
+def format_session_page(rows, limit: int) -> dict:
+    page = rows[:limit]
+    next_cursor = None
+    if len(rows) > limit:
+        next_cursor = encode_cursor([page[-1].last_activity.isoformat(), page[-1].id])
+    return {
+        "sessions": [
+            {
+                "session_id": s.id,
+                "title": s.title,
+                "message_count": s.message_count,
+                "created_at": s.created_at.isoformat() if s.created_at else None,
+                "last_activity": s.last_activity.isoformat() if s.last_activity else None,
+            }
+            for s in page
+        ],
+        "next_cursor": next_cursor,
+    }
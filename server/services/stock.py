@@ -0,0 +1,105 @@
+import csv
+import io
+import json
+from sqlalchemy import update, select, values, column, String, Integer
+from server.models import Book
+
+
+def merge_quantities(lines) -> dict:
+    """Sum quantities per ISBN, keeping the order in which ISBNs first appear."""
+    merged = {}
+    for isbn, qty in lines:
+        merged[isbn] = merged.get(isbn, 0) + qty
+    return merged
+
+
+def _quantities_table(quantities: dict, name: str):
+    return values(
+        column("isbn", String), column("qty", Integer), name=name
+    ).data(list(quantities.items()))
+
+
+def lock_books_statement(isbns):
+    """
+    SELECT ... FOR UPDATE of the given books in ISBN order.
+
+    A fixed lock order keeps concurrent multi-title orders from deadlocking.
+    """
+    return (
+        select(Book.isbn, Book.title, Book.stock)
+        .where(Book.isbn.in_(list(isbns)))
+        .order_by(Book.isbn)
+        .with_for_update()
+    )
+
+
+def decrement_stock_statement(quantities: dict):
+    """
+    Subtract every quantity in one UPDATE ... FROM (VALUES ...).
+
+    Rows only change where `stock >= qty`, so stock can never go negative even
+    under concurrent orders. RETURNING lists the rows that were decremented.
+    """
+    requested = _quantities_table(quantities, "requested")
+    return (
+        update(Book)
+        .where(Book.isbn == requested.c.isbn, Book.stock >= requested.c.qty)
+        .values(stock=Book.stock - requested.c.qty)
+        .returning(Book.isbn, Book.title, Book.stock)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def restock_statement(quantities: dict):
+    """
+    Add every quantity in one atomic UPDATE ... FROM (VALUES ...) RETURNING.
+
+    The increment happens in SQL, so concurrent restocks never lose updates.
+    """
+    added = _quantities_table(quantities, "added")
+    return (
+        update(Book)
+        .where(Book.isbn == added.c.isbn)
+        .values(stock=Book.stock + added.c.qty)
+        .returning(Book.isbn, Book.stock)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def parse_restock_lines(payload, warnings) -> list:
+    """
+    Turn a bulk restock payload into (isbn, qty) pairs.
+
+    Accepts a list of {"isbn", "qty"} dicts or CSV-style text with one
+    "isbn,qty" per line (an optional header row is skipped). Invalid lines are
+    reported in `warnings` and left out.
+    """
+    if isinstance(payload, str):
+        text = payload.strip()
+        try:
+            payload = json.loads(text)
+        except json.JSONDecodeError:
+            payload = [
+                {"isbn": row[0], "qty": row[1] if len(row) > 1 else None}
+                for row in csv.reader(io.StringIO(text))
+                if row and row[0].strip().lower() != "isbn"
+            ]
+
+    if isinstance(payload, dict):
+        payload = payload.get("items", [payload])
+
+    lines = []
+    for item in payload if isinstance(payload, list) else []:
+        if not isinstance(item, dict):
+            warnings.append(f"Invalid entry: {item}")
+            continue
+        isbn = str(item.get("isbn") or "").strip()
+        try:
+            qty = int(float(str(item.get("qty") or item.get("quantity") or 0).strip()))
+        except ValueError:
+            qty = 0
+        if not isbn or qty <= 0:
+            warnings.append(f"Invalid entry: {item}")
+            continue
+        lines.append((isbn, qty))
+    return lines
@@ -0,0 +1,54 @@
+import re
+from typing import Optional
+from sqlalchemy import select, func, literal_column, Text
+from sqlalchemy.dialects.postgresql import ARRAY
+from server.models.tool_call import ToolCall
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 200
+
+
+def _text_key(column, key: str):
+    # The key is rendered inline, not bound, so the expression matches the index definition
+    return column.op("->>")(literal_column(f"'{key}'"))
+
+
+def payload_isbns():
+    """Every ISBN in a call's args or result (GIN index ix_tool_calls_isbns)."""
+    return func.f_tool_call_isbns(ToolCall.args, ToolCall.result, type_=ARRAY(Text))
+
+
+def payload_order_id():
+    """The order a call created or looked up (index ix_tool_calls_order_id)."""
+    return func.coalesce(_text_key(ToolCall.result, "order_id"), _text_key(ToolCall.args, "order_id"))
+
+
+def normalize_isbn(isbn: str) -> str:
+    return re.sub(r"[-\s]", "", isbn).upper()
+
+
+def tool_call_lookup_statement(isbn: Optional[str] = None, order_id: Optional[int] = None,
+                               name: Optional[str] = None, limit: int = DEFAULT_LIMIT):
+    """Newest tool calls that touched `isbn`, concern `order_id` and/or ran tool `name`."""
+    stmt = select(ToolCall)
+    if isbn:
+        stmt = stmt.where(payload_isbns().contains([normalize_isbn(isbn)]))
+    if order_id is not None:
+        stmt = stmt.where(payload_order_id() == str(order_id))
+    if name:
+        stmt = stmt.where(ToolCall.name == name)
+    return stmt.order_by(ToolCall.created_at.desc(), ToolCall.id.desc()).limit(limit)
+
+
+def format_tool_call(row: ToolCall) -> dict:
+    return {
+        "id": row.id,
+        "session_id": row.session_id,
+        "request_id": row.request_id,
+        "name": row.name,
+        "args": row.args,
+        "result": row.result,
+        "is_error": row.is_error,
+        "duration_ms": row.duration_ms,
+        "created_at": row.created_at.isoformat() if row.created_at else None,
+    }
@@ -0,0 +1,48 @@
+from datetime import datetime
+from sqlalchemy import select, func, cast, Integer
+from server.models.tool_call import ToolCall
+
+DEFAULT_WINDOW_MINUTES = 60
+MAX_WINDOW_MINUTES = 60 * 24 * 30
+
+
+def tool_latency_statement(since: datetime):
+    """
+    Per-tool call count, latency percentiles and error rate since `since`.
+
+    Only rows written per invocation (with a run id) are counted, which leaves
+    out agent_summary rows and the start/result rows logged before timings
+    existed. Served by the partial (created_at, name) index.
+    """
+    return (
+        select(
+            ToolCall.name,
+            func.count().label("calls"),
+            func.sum(cast(ToolCall.is_error, Integer)).label("errors"),
+            func.percentile_cont(0.5).within_group(ToolCall.duration_ms).label("p50_ms"),
+            func.percentile_cont(0.95).within_group(ToolCall.duration_ms).label("p95_ms"),
+            func.max(ToolCall.duration_ms).label("max_ms"),
+        )
+        .where(ToolCall.run_id.isnot(None), ToolCall.created_at >= since)
+        .group_by(ToolCall.name)
+        .order_by(ToolCall.name)
+    )
+
+
+def format_tool_stats(rows, since: datetime, window_minutes: int) -> dict:
+    return {
+        "window_minutes": window_minutes,
+        "since": since.isoformat(),
+        "tools": [
+            {
+                "name": r.name,
+                "calls": r.calls,
+                "errors": r.errors or 0,
+                "error_rate": round((r.errors or 0) / r.calls, 4) if r.calls else 0.0,
+                "p50_ms": round(r.p50_ms, 2) if r.p50_ms is not None else None,
+                "p95_ms": round(r.p95_ms, 2) if r.p95_ms is not None else None,
+                "max_ms": round(r.max_ms, 2) if r.max_ms is not None else None,
+            }
+            for r in rows
+        ],
+    }
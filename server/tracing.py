@@ -0,0 +1,268 @@
+import json
+import logging
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+from prometheus_client import Counter, Histogram
+from sqlalchemy import event
+from langchain.callbacks.base import BaseCallbackHandler
+from server.db import engine, async_engine
+from server.agent.registry import current_settings
+
+logger = logging.getLogger(__name__)
+
+# --- Prometheus metrics (served on /metrics) ---
+
+REQUEST_SECONDS = Histogram(
+    "desk_request_duration_seconds", "Chat request latency", ["path", "outcome"],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2, 4, 8, 15, 30, 60),
+)
+LLM_SECONDS = Histogram(
+    "desk_llm_call_duration_seconds", "Latency of one LLM call", ["model"],
+    buckets=(0.1, 0.25, 0.5, 1, 2, 4, 8, 15, 30),
+)
+LLM_TOKENS = Counter("desk_llm_tokens_total", "LLM tokens used", ["model", "kind"])
+TOOL_SECONDS = Histogram(
+    "desk_tool_duration_seconds", "Latency of one tool run", ["tool", "outcome"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+)
+SQL_SECONDS = Histogram(
+    "desk_sql_duration_seconds", "Latency of one SQL statement", ["operation"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1),
+)
+
+# Statement text kept on SQL spans
+SQL_SPAN_CHARS = 300
+
+
+# --- Spans ---
+
+class Span:
+    """One timed unit of work in a request trace; children are added from any thread."""
+
+    def __init__(self, name: str, kind: str, parent: "Span" = None, **attrs):
+        self.name = name
+        self.kind = kind
+        self.attrs = attrs
+        self.span_id = uuid.uuid4().hex[:16]
+        self.trace_id = parent.trace_id if parent else uuid.uuid4().hex
+        self.parent_id = parent.span_id if parent else None
+        self.started_at = time.time()
+        self.duration_ms = None
+        self.children = []
+        self._started = time.perf_counter()
+        self._lock = threading.Lock()
+        if parent is not None:
+            parent.add_child(self)
+
+    def add_child(self, span: "Span"):
+        with self._lock:
+            self.children.append(span)
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def finish(self, duration_ms: float = None, **attrs):
+        self.attrs.update(attrs)
+        if duration_ms is None:
+            duration_ms = (time.perf_counter() - self._started) * 1000
+        self.duration_ms = round(duration_ms, 3)
+
+    def walk(self):
+        yield self
+        for child in list(self.children):
+            yield from child.walk()
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "kind": self.kind,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "started_at": self.started_at,
+            "duration_ms": self.duration_ms,
+            "attrs": self.attrs,
+            "children": [c.to_dict() for c in list(self.children)],
+        }
+
+
+# Innermost open span of the running request (tool span while a tool runs)
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+_export_lock = threading.Lock()
+
+
+def breakdown(root: Span) -> dict:
+    """Time spent in LLM calls, tools and SQL (sums; parallel tools can exceed the total)."""
+    totals = {"llm": 0.0, "tool": 0.0, "sql": 0.0}
+    counts = {"llm": 0, "tool": 0, "sql": 0}
+    for span in root.walk():
+        if span.kind in totals and span.duration_ms is not None:
+            totals[span.kind] += span.duration_ms
+            counts[span.kind] += 1
+    return {
+        "total_ms": root.duration_ms,
+        **{f"{k}_ms": round(v, 3) for k, v in totals.items()},
+        **{f"{k}_calls": v for k, v in counts.items()},
+    }
+
+
+def _export(root: Span):
+    path = current_settings().TRACE_EXPORT_PATH
+    if not path:
+        return
+    line = json.dumps(root.to_dict(), ensure_ascii=False, default=str)
+    try:
+        with _export_lock, open(path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+    except OSError as e:
+        logger.error("Failed to export trace %s to %s: %s", root.trace_id, path, e)
+
+
+@contextmanager
+def trace_request(session_id: str, query: str):
+    """
+    Root span of one chat request.
+
+    On exit the request histogram is observed, a one-line breakdown is logged
+    at DEBUG and, when TRACE_EXPORT_PATH is set, the whole trace is appended
+    to that file as one JSON line.
+    """
+    root = Span("chat_request", "request", session_id=session_id, query=(query or "")[:200])
+    token = _current_span.set(root)
+    try:
+        yield root
+    except Exception:
+        root.set(outcome="exception")
+        raise
+    finally:
+        _current_span.reset(token)
+        root.finish()
+        root.set(breakdown=breakdown(root))
+        REQUEST_SECONDS.labels(root.attrs.get("path", "agent"), root.attrs.get("outcome", "ok")).observe(
+            root.duration_ms / 1000
+        )
+        logger.debug("Trace %s %s", root.trace_id, root.attrs["breakdown"])
+        _export(root)
+
+
+# --- LangChain callbacks: LLM and tool spans ---
+
+def _model_name(serialized, kwargs) -> str:
+    params = kwargs.get("invocation_params") or {}
+    return str(params.get("model_name") or params.get("model") or (serialized or {}).get("name") or "unknown")
+
+
+def token_usage(response):
+    """(prompt, completion) tokens from the provider's llm_output or the message usage metadata."""
+    usage = (response.llm_output or {}).get("token_usage") or {}
+    if usage:
+        return usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0)
+    for generations in response.generations:
+        for generation in generations:
+            metadata = getattr(getattr(generation, "message", None), "usage_metadata", None)
+            if metadata:
+                return metadata.get("input_tokens", 0), metadata.get("output_tokens", 0)
+    return None, None
+
+
+class TraceHandler(BaseCallbackHandler):
+    """
+    Open a child span of the request for every LLM call and tool run.
+
+    While a tool runs its span is the current span of the thread (or task)
+    running it, so the SQL it issues nests under the tool.
+    """
+
+    # Called in the thread or task doing the work, so the context var follows the tool
+    run_inline = True
+
+    def __init__(self, root: Span):
+        self.root = root
+        self._spans = {}
+        self._tokens = {}
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        self._spans[run_id] = Span("llm", "llm", parent=self.root, model=_model_name(serialized, kwargs))
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        span = self._spans.pop(run_id, None)
+        if span is None:
+            return
+        prompt_tokens, completion_tokens = token_usage(response)
+        span.finish(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+        model = span.attrs["model"]
+        LLM_SECONDS.labels(model).observe(span.duration_ms / 1000)
+        if prompt_tokens is not None:
+            LLM_TOKENS.labels(model, "prompt").inc(prompt_tokens)
+            LLM_TOKENS.labels(model, "completion").inc(completion_tokens)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        span = self._spans.pop(run_id, None)
+        if span is not None:
+            span.finish(error=str(error))
+            LLM_SECONDS.labels(span.attrs["model"]).observe(span.duration_ms / 1000)
+
+    def on_tool_start(self, serialized, input_str, *, run_id, **kwargs):
+        span = Span("tool", "tool", parent=self.root, tool=serialized.get("name", "unknown"))
+        self._spans[run_id] = span
+        self._tokens[run_id] = _current_span.set(span)
+
+    def on_tool_end(self, output, *, run_id, **kwargs):
+        # Tools report failures as {"error": ...} results rather than raising
+        content = getattr(output, "content", output)
+        failed = isinstance(content, dict) and "error" in content
+        self._end_tool(run_id, "error" if failed else "ok")
+
+    def on_tool_error(self, error, *, run_id, **kwargs):
+        self._end_tool(run_id, "exception", error=str(error))
+
+    def _end_tool(self, run_id, outcome: str, **attrs):
+        token = self._tokens.pop(run_id, None)
+        if token is not None:
+            try:
+                _current_span.reset(token)
+            except ValueError:
+                # Ended in another context than it started; nothing to restore there
+                pass
+        span = self._spans.pop(run_id, None)
+        if span is not None:
+            span.finish(outcome=outcome, **attrs)
+            TOOL_SECONDS.labels(span.attrs["tool"], outcome).observe(span.duration_ms / 1000)
+
+
+# --- SQLAlchemy events: SQL spans ---
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("trace_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get("trace_started")
+    if not started:
+        return
+    elapsed = time.perf_counter() - started.pop()
+    operation = (statement.split(None, 1) or ["OTHER"])[0].upper()
+    SQL_SECONDS.labels(operation).observe(elapsed)
+
+    parent = _current_span.get()
+    if parent is not None:
+        span = Span("sql", "sql", parent=parent, operation=operation,
+                    statement=statement[:SQL_SPAN_CHARS], executemany=executemany)
+        span.finish(duration_ms=elapsed * 1000)
+
+
+def _handle_error(exception_context):
+    # A failed statement never reaches after_cursor_execute
+    started = exception_context.connection.info.get("trace_started") if exception_context.connection else None
+    if started:
+        started.pop()
+
+
+for _engine in (engine, async_engine.sync_engine):
+    event.listen(_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(_engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(_engine, "handle_error", _handle_error)
@@ -0,0 +1,79 @@
+"""
+Parallel orders against one low-stock book must never oversell.
+
+Needs a configured PostgreSQL database (the same .env as the app); skipped otherwise.
+A throwaway customer and book are created and deleted again.
+"""
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+pytest.importorskip("langchain")
+pytest.importorskip("psycopg2")
+
+try:
+    from sqlalchemy import delete
+    from sqlalchemy.exc import OperationalError
+    from server.db import Base, SessionLocal, engine
+    from server.models import Book, Customer, Order, OrderItem
+    from server.agent.tools.create_order_tool import CreateOrderTool
+except Exception as e:  # missing .env settings
+    pytest.skip(f"Database not configured: {e}", allow_module_level=True)
+
+try:
+    with engine.connect():
+        pass
+except OperationalError as e:
+    pytest.skip(f"Database not reachable: {e}", allow_module_level=True)
+
+STOCK = 5
+ORDERS = 25
+
+
+@pytest.fixture
+def low_stock_book():
+    Base.metadata.create_all(bind=engine)
+    isbn = f"TEST-{uuid.uuid4().hex[:12]}"
+    db = SessionLocal()
+    customer = Customer(name="Concurrency Test", email=f"{isbn.lower()}@test.invalid")
+    db.add_all([customer, Book(isbn=isbn, title="Concurrency Test", author="Test", price=1.0, stock=STOCK)])
+    db.commit()
+    customer_id = customer.id
+    db.close()
+
+    yield customer_id, isbn
+
+    db = SessionLocal()
+    order_ids = [o.id for o in db.query(Order.id).filter(Order.customer_id == customer_id)]
+    db.execute(delete(OrderItem).where(OrderItem.order_id.in_(order_ids)))
+    db.execute(delete(Order).where(Order.customer_id == customer_id))
+    db.execute(delete(Book).where(Book.isbn == isbn))
+    db.execute(delete(Customer).where(Customer.id == customer_id))
+    db.commit()
+    db.close()
+
+
+def test_parallel_orders_do_not_oversell(low_stock_book):
+    customer_id, isbn = low_stock_book
+    tool = CreateOrderTool()
+
+    with ThreadPoolExecutor(max_workers=10) as pool:
+        results = list(pool.map(
+            lambda _: tool._run(customer_id=customer_id, items=[{"isbn": isbn, "qty": 1}]),
+            range(ORDERS),
+        ))
+
+    succeeded = [r for r in results if "order_id" in r]
+    rejected = [r for r in results if "order_id" not in r]
+    assert len(succeeded) == STOCK
+
+    db = SessionLocal()
+    try:
+        assert db.get(Book, isbn).stock == 0
+    finally:
+        db.close()
+
+    assert len(rejected) == ORDERS - STOCK
+    for result in rejected:
+        assert [s["isbn"] for s in result["shortfalls"]] == [isbn], result